@@ -1,11 +1,20 @@
 import streamlit as st
 import json
 import traceback
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import os
 
 from bedrock_client import BedrockClient
-from parsing import DocumentParser
+from parsing import DocumentParser, prefetch_pages
+from parse_cache import ParseCache
+from response_cache import ResponseCache
+from model_router import ModelRouter
+from rate_limiter import AdaptiveRateLimiter
+from region_pool import RegionPool
+from token_budget import OutputBudget
+from hedging import RequestHedger
+from circuit_breaker import CircuitBreaker
+from single_flight import SingleFlight
 from template_inference import TemplateInferenceEngine
 
 def main():
@@ -23,25 +32,150 @@ def main():
         st.session_state.generated_template = None
     if 'processing_logs' not in st.session_state:
         st.session_state.processing_logs = []
+    if 'run_metrics' not in st.session_state:
+        st.session_state.run_metrics = None
     
     # Sidebar configuration
     with st.sidebar:
         st.header("Configuration")
         
         # AWS Region (optional override)
+        aws_regions = ["eu-west-1", "us-east-1", "us-west-2"]
         aws_region = st.selectbox(
             "AWS Region",
-            ["eu-west-1", "us-east-1", "us-west-2"],
+            aws_regions,
             index=0
         )
+        extra_regions = st.multiselect(
+            "Spread requests over more regions",
+            [region for region in aws_regions if region != aws_region],
+            default=[],
+            help="Send page requests to these regions too, each with its own concurrency limit; "
+                 "regions that throttle or fail get less traffic"
+        )
         
         # Model configuration
         st.info("Using Claude Sonnet 4.5 on AWS Bedrock")
         
+        max_concurrency = st.slider(
+            "Concurrent page requests",
+            min_value=1,
+            max_value=16,
+            value=4,
+            help="Number of pages analyzed by Claude at the same time"
+        )
+        
+        route_models = st.checkbox(
+            "Route simple pages to a faster model",
+            value=False,
+            help="Score each page's complexity locally; simple pages use Claude Haiku 4.5 and "
+                 "are escalated to Sonnet if the answer fails validation"
+        )
+        
+        subset_catalog = st.checkbox(
+            "Offer each page only its likely catalog elements",
+            value=False,
+            help="Pre-select candidate catalog elements per page locally instead of sending the whole catalog"
+        )
+        catalog_top_k = st.number_input(
+            "Candidate elements per page",
+            min_value=4,
+            max_value=100,
+            value=24,
+            disabled=not subset_catalog,
+            help="Best matching catalog elements offered in addition to the always-on core"
+        )
+        
+        size_output_budget = st.checkbox(
+            "Size the output budget per page",
+            value=False,
+            help="Reserve max_tokens predicted from each page's text and tables, learned from earlier "
+                 "answers, instead of a fixed 4000; truncated answers get more room"
+        )
+        
+        hedge_requests = st.checkbox(
+            "Hedge slow page requests",
+            value=False,
+            help="Send a duplicate of page requests slower than 95% of recent ones and keep the first "
+                 "answer; at most 10% extra requests"
+        )
+        
+        prepass_contacts = st.checkbox(
+            "Find contact details with patterns first",
+            value=False,
+            help="Detect emails, phone numbers, URLs, addresses and dates locally; pages with nothing else "
+                 "skip Claude, and on other pages Claude does not have to generate them"
+        )
+        
+        fail_fast = st.checkbox(
+            "Fall back to local extraction when Bedrock fails",
+            value=True,
+            help="After 5 failed or timed-out calls in a row, stop calling Bedrock for 30 seconds and "
+                 "extract pages with simple rules instead, so a degraded template is still produced"
+        )
+        
+        stream_responses = st.checkbox(
+            "Stream model responses",
+            value=False,
+            help="Read each page's elements as Claude generates them and stop early on malformed output"
+        )
+        
+        pack_pages = st.checkbox(
+            "Pack short pages into one request",
+            value=False,
+            help="Analyze several consecutive short pages in a single Claude call"
+        )
+        pack_token_budget = st.number_input(
+            "Page tokens per packed request",
+            min_value=500,
+            max_value=20000,
+            value=3000,
+            step=500,
+            disabled=not pack_pages,
+            help="Pages are added to a request until their estimated tokens reach this budget"
+        )
+        
+        # Parsing configuration
+        pdf_workers = st.number_input(
+            "PDF parsing workers",
+            min_value=0,
+            max_value=os.cpu_count() or 1,
+            value=1,
+            help="Extract PDF pages in parallel worker processes (0 = one per CPU core)"
+        )
+        
+        use_parse_cache = st.checkbox(
+            "Cache parsed documents",
+            value=True,
+            help="Reuse extracted pages when the same file is uploaded again"
+        )
+        if st.button("Clear Parse Cache"):
+            removed = ParseCache().invalidate()
+            st.success(f"Removed {removed} cached document(s)")
+        
+        use_response_cache = st.checkbox(
+            "Cache model responses",
+            value=True,
+            help="Reuse Claude responses for identical page prompts"
+        )
+        bypass_response_cache = st.checkbox(
+            "Refresh cached responses",
+            value=False,
+            disabled=not use_response_cache,
+            help="Always call Claude, but store the new responses in the cache"
+        )
+        coalesce_pages = st.checkbox(
+            "Share analyses of identical pages",
+            value=True,
+            help="Pages identical to one being analyzed right now, in this or another session, wait for "
+                 "that analysis instead of calling Claude again"
+        )
+        
         # Clear results button
         if st.button("Clear Results"):
             st.session_state.generated_template = None
             st.session_state.processing_logs = []
+            st.session_state.run_metrics = None
             st.rerun()
     
     # Main content area
@@ -76,7 +210,21 @@ def main():
         log_container = st.container()
         
         if generate_button and uploaded_files:
-            process_documents(uploaded_files, aws_region, log_container)
+            process_documents(uploaded_files, aws_region, log_container, pdf_workers=pdf_workers,
+                              use_parse_cache=use_parse_cache,
+                              use_response_cache=use_response_cache,
+                              bypass_response_cache=bypass_response_cache,
+                              max_concurrency=max_concurrency,
+                              pack_token_budget=pack_token_budget if pack_pages else None,
+                              stream_responses=stream_responses,
+                              route_models=route_models,
+                              catalog_top_k=catalog_top_k if subset_catalog else None,
+                              size_output_budget=size_output_budget,
+                              hedge_requests=hedge_requests,
+                              extra_regions=extra_regions,
+                              fail_fast=fail_fast,
+                              coalesce_pages=coalesce_pages,
+                              prepass_contacts=prepass_contacts)
     
     # Results section
     if st.session_state.generated_template:
@@ -101,6 +249,68 @@ def main():
             coverage = catalog_integration.get('coverage_analysis', {}).get('coverage_percentage', 0)
             st.metric("Catalog Coverage", f"{coverage}%")
         
+        # Bedrock usage for the run that produced this template
+        if st.session_state.run_metrics:
+            st.subheader("💰 Bedrock Usage & Cost")
+            run_metrics = st.session_state.run_metrics
+            report = run_metrics['report']
+            
+            col1, col2, col3, col4, col5 = st.columns(5)
+            
+            with col1:
+                st.metric("Model Calls", report['calls'])
+            with col2:
+                st.metric("Estimated Cost", f"${report['estimated_cost_usd']:.4f}")
+            with col3:
+                st.metric("Latency p50", f"{report['latency_p50'] or 0:.2f}s")
+            with col4:
+                st.metric("Latency p95", f"{report['latency_p95'] or 0:.2f}s")
+            with col5:
+                st.metric("Latency p99", f"{report['latency_p99'] or 0:.2f}s")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.write("**Tokens:**")
+                st.write(f"• **Input:** {report['input_tokens']:,}")
+                st.write(f"• **Output:** {report['output_tokens']:,}")
+                st.write(f"• **Cache read / write:** {report['cache_read_input_tokens']:,} / "
+                         f"{report['cache_creation_input_tokens']:,}")
+                st.write(f"• **Retries:** {report['retries']} • **Served from cache:** {report['cached_calls']} "
+                         f"• **Failed:** {report['failed_calls']}")
+            
+                routing = report.get('routing')
+                if routing:
+                    st.write(f"• **Model routing:** {routing['pages_simple']} simple, {routing['pages_strong']} strong, "
+                             f"{routing['pages_escalated']} escalated")
+                    if routing['estimated_latency_saved_seconds'] is not None:
+                        st.write(f"• **Latency saved:** ~{routing['estimated_latency_saved_seconds']:.1f}s")
+                    if routing['estimated_cost_saved_usd'] is not None:
+                        st.write(f"• **Cost saved:** ~${routing['estimated_cost_saved_usd']:.4f}")
+            
+            with col2:
+                st.write("**Costliest Pages:**")
+                for page in report['costliest_pages']:
+                    st.write(f"• {page['doc_id']} page {page['page_index']}: ${page['cost_usd']:.4f} "
+                             f"({page['output_tokens']:,} output tokens, {page['latency_seconds']:.2f}s)")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.download_button(
+                    label="📥 Download Run Report (JSON)",
+                    data=run_metrics['json'],
+                    file_name="bedrock_run_report.json",
+                    mime="application/json"
+                )
+            with col2:
+                st.download_button(
+                    label="📥 Download Call Log (CSV)",
+                    data=run_metrics['csv'],
+                    file_name="bedrock_calls.csv",
+                    mime="text/csv"
+                )
+        
         # Catalog Integration Summary
         if 'catalog_integration' in template:
             st.subheader("📋 Master Catalog Integration")
@@ -304,13 +514,71 @@ def main():
             help="Download the comprehensive template with full analysis"
         )
 
-def process_documents(uploaded_files: List, aws_region: str, log_container):
+@st.cache_resource
+def get_shared_rate_limiter(aws_region: str) -> AdaptiveRateLimiter:
+    """One limiter per region, shared by every session so they back off together"""
+    return AdaptiveRateLimiter(initial_window=4, max_window=32)
+
+@st.cache_resource
+def get_shared_region_pool(regions: tuple, max_concurrency: int, endpoint_url: Optional[str] = None) -> RegionPool:
+    """One pool per region set and endpoint, shared by every session so region health carries over"""
+    return RegionPool([{'region': region, 'endpoint_url': endpoint_url} for region in regions],
+                      max_concurrency=max_concurrency)
+
+@st.cache_resource
+def get_shared_output_budget() -> OutputBudget:
+    """One output budget for every session, so its calibration carries over between runs"""
+    return OutputBudget()
+
+@st.cache_resource
+def get_shared_hedger(aws_region: str) -> RequestHedger:
+    """One hedger per region, so its latency history and hedge budget span every session"""
+    return RequestHedger()
+
+@st.cache_resource
+def get_shared_single_flight() -> SingleFlight:
+    """One single-flight group for every session, so identical uploads share their calls"""
+    return SingleFlight()
+
+def process_documents(uploaded_files: List, aws_region: str, log_container, pdf_workers: int = 1,
+                      use_parse_cache: bool = False, use_response_cache: bool = False,
+                      bypass_response_cache: bool = False, max_concurrency: int = 4,
+                      pack_token_budget: Optional[int] = None, stream_responses: bool = False,
+                      route_models: bool = False, catalog_top_k: Optional[int] = None,
+                      size_output_budget: bool = False, hedge_requests: bool = False,
+                      extra_regions: Optional[List[str]] = None, fail_fast: bool = False,
+                      coalesce_pages: bool = False, prepass_contacts: bool = False):
     """Process uploaded documents and generate master template"""
     
     try:
         # Initialize components
-        bedrock_client = BedrockClient(region=aws_region)
-        parser = DocumentParser()
+        response_cache = ResponseCache(bypass=bypass_response_cache) if use_response_cache else None
+        # e.g. a local bedrock_standin.py server for offline load tests
+        endpoint_url = os.environ.get('BEDROCK_ENDPOINT_URL')
+        region_pool = None
+        if extra_regions:
+            region_pool = get_shared_region_pool((aws_region, *extra_regions), int(max_concurrency), endpoint_url)
+            max_concurrency = region_pool.max_concurrency
+        bedrock_client = BedrockClient(
+            region=aws_region,
+            response_cache=response_cache,
+            max_concurrency=int(max_concurrency),
+            rate_limiter=get_shared_rate_limiter(aws_region),
+            streaming=stream_responses,
+            router=ModelRouter() if route_models else None,
+            catalog_top_k=int(catalog_top_k) if catalog_top_k else None,
+            output_budget=get_shared_output_budget() if size_output_budget else None,
+            hedger=get_shared_hedger(aws_region) if hedge_requests else None,
+            region_pool=region_pool,
+            circuit_breaker=CircuitBreaker() if fail_fast else None,
+            single_flight=get_shared_single_flight() if coalesce_pages else None,
+            contact_prepass=prepass_contacts,
+            endpoint_url=endpoint_url
+        )
+        parser = DocumentParser(
+            pdf_workers=int(pdf_workers),
+            cache=ParseCache() if use_parse_cache else None
+        )
         inference_engine = TemplateInferenceEngine(bedrock_client)
         
         with log_container:
@@ -320,32 +588,45 @@ def process_documents(uploaded_files: List, aws_region: str, log_container):
             # Step 1: Parse documents
             status_text.text("📖 Parsing documents...")
             all_page_data = []
+            failed_pages = []
             
-            for i, file in enumerate(uploaded_files):
-                try:
-                    status_text.text(f"📖 Parsing {file.name}...")
-                    
-                    # Parse document
-                    pages = parser.parse_document(file)
-                    
-                    # Extract structured data for each page
-                    for page_idx, page_content in enumerate(pages):
-                        status_text.text(f"🔍 Analyzing {file.name} - Page {page_idx + 1}")
+            def iter_all_pages():
+                for i, file in enumerate(uploaded_files):
+                    try:
+                        status_text.text(f"📖 Parsing {file.name}...")
                         
-                        page_json = bedrock_client.extract_page_structure(
-                            page_content, 
-                            doc_id=f"doc_{i+1}", 
-                            page_index=page_idx + 1
-                        )
+                        # Stream pages from the parser; later pages keep being
+                        # extracted in the background while earlier ones are analyzed
+                        pages = prefetch_pages(parser.iter_pages(file))
                         
-                        if page_json:
-                            all_page_data.append(page_json)
-                    
-                    progress_bar.progress((i + 1) / len(uploaded_files) * 0.7)
-                    
-                except Exception as e:
-                    st.error(f"Error processing {file.name}: {str(e)}")
-                    continue
+                        for page_idx, page_content in enumerate(pages):
+                            yield page_content, f"doc_{i+1}", page_idx + 1
+                        
+                        progress_bar.progress((i + 1) / len(uploaded_files) * 0.7)
+                        
+                    except Exception as e:
+                        st.error(f"Error processing {file.name}: {str(e)}")
+                        continue
+            
+            def on_page_done(result):
+                status_text.text(f"🔍 Analyzed {result['doc_id']} - Page {result['page_index']}")
+                if result['page_json']:
+                    all_page_data.append(result['page_json'])
+                else:
+                    failed_pages.append(result)
+            
+            # Extract structured data for each page, several pages at a time
+            bedrock_client.extract_pages(
+                iter_all_pages(),
+                max_concurrency=int(max_concurrency),
+                on_page_done=on_page_done,
+                pack_token_budget=int(pack_token_budget) if pack_token_budget else None
+            )
+            
+            if failed_pages:
+                st.warning(f"{len(failed_pages)} page(s) could not be analyzed:")
+                for result in failed_pages:
+                    st.write(f"• {result['doc_id']} page {result['page_index']}: {result['error']}")
             
             # Step 2: Generate master template
             if all_page_data:
@@ -359,9 +640,91 @@ def process_documents(uploaded_files: List, aws_region: str, log_container):
                 
                 # Store in session state
                 st.session_state.generated_template = master_template
+                st.session_state.run_metrics = {
+                    'report': bedrock_client.get_run_report(),
+                    'json': bedrock_client.call_metrics.to_json(),
+                    'csv': bedrock_client.call_metrics.to_csv()
+                }
                 
                 st.success(f"Successfully processed {len(uploaded_files)} documents with {len(all_page_data)} pages total")
                 
+                usage = bedrock_client.get_usage_summary()
+                if usage['calls']:
+                    st.info(f"Prompt cache: {usage['cache_read_input_tokens']:,} tokens read from cache, "
+                            f"{usage['cache_creation_input_tokens']:,} written "
+                            f"({usage['prompt_cache_hit_rate']}% of prompt tokens cached)")
+                
+                streaming = bedrock_client.get_streaming_metrics()
+                if streaming['streamed_pages']:
+                    st.info(f"Streaming: first element after {streaming['avg_time_to_first_element']}s on average "
+                            f"(full response {streaming['avg_response_time']}s); "
+                            f"{streaming['aborted_streams']} malformed response(s) aborted early")
+                
+                subset = bedrock_client.get_catalog_subset_metrics()
+                if subset['pages']:
+                    st.info(f"Catalog subsetting: {subset['avg_candidates']} of {subset['catalog_elements']} elements "
+                            f"offered per page ({subset['token_reduction']}% fewer catalog tokens)")
+                
+                budget = bedrock_client.get_output_budget_metrics()
+                if budget and budget['budgets']:
+                    st.info(f"Output budget: {budget['avg_max_tokens']} max_tokens per page on average "
+                            f"({budget['reserved_tokens_saved']:,} fewer tokens reserved than a fixed 4000); "
+                            f"{budget['escalations']} escalation(s) after truncation")
+                
+                regions = bedrock_client.get_region_metrics()
+                if regions:
+                    st.info("Regions: " + "; ".join(
+                        f"{region['region']} {region['calls']} call(s), {region['throttles']} throttled, "
+                        f"{region['errors']} failed" + (" (cooling down)" if region['cooling_down'] else "")
+                        for region in regions
+                    ))
+                
+                # The hedger is shared by every session, so this run's hedges come from its own call records
+                run_report = st.session_state.run_metrics['report']
+                if run_report['hedge_calls']:
+                    hedging = bedrock_client.get_hedging_metrics()
+                    st.info(f"Hedging: {run_report['hedge_calls']} of {run_report['calls']} call(s) were hedges "
+                            f"of slow page requests, costing ${run_report['hedge_cost_usd']}; requests are "
+                            f"hedged after {hedging['delay_seconds']}s")
+                
+                prepass = bedrock_client.get_prepass_metrics()
+                if prepass and prepass['contacts']:
+                    st.info(f"Contact pre-pass: {prepass['contacts']} contact detail(s) found; "
+                            f"{prepass['covered_pages']} page(s) needed no model call, "
+                            f"{prepass['hinted_pages']} were sent with the findings as hints")
+                
+                breaker = bedrock_client.get_circuit_breaker_metrics()
+                if breaker and breaker['heuristic_pages']:
+                    st.warning(f"Bedrock was failing: the circuit breaker tripped {breaker['trips']} time(s) and "
+                               f"{breaker['heuristic_pages']} page(s) were extracted locally with simple rules; "
+                               f"their structure is less detailed")
+                
+                recovery = bedrock_client.get_recovery_metrics()
+                if recovery['truncated_responses'] or recovery['salvaged_pages']:
+                    st.info(f"Recovered answers: {recovery['continued_pages']} truncated page(s) continued with "
+                            f"{recovery['continuations']} extra call(s); {recovery['salvaged_pages']} page(s) salvaged "
+                            f"from broken JSON ({recovery['salvaged_elements']} elements kept)")
+
+                packing = bedrock_client.get_packing_stats()
+                if packing['packed_requests']:
+                    st.info(f"Packed {packing['packed_pages']} page(s) into {packing['packed_requests']} request(s); "
+                            f"{packing['fallback_pages']} page(s) fell back to single-page calls")
+                
+                limiter_metrics = bedrock_client.get_rate_limiter_metrics()
+                if limiter_metrics['throttles']:
+                    st.info(f"Bedrock throttled {limiter_metrics['throttles']} call(s); "
+                            f"{limiter_metrics['retries']} retried, concurrency window now {limiter_metrics['window']}")
+                
+                single_flight = bedrock_client.get_single_flight_metrics()
+                if single_flight and single_flight['coalesced']:
+                    st.info(f"Identical pages: {single_flight['coalesced']} page request(s) across all sessions "
+                            f"shared an analysis already in flight ({single_flight['coalesce_rate']}%)")
+                
+                if response_cache is not None:
+                    cache_stats = response_cache.get_stats()
+                    st.info(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                            f"({cache_stats['hit_rate']}% hit rate)")
+                
             else:
                 st.error("No page data could be extracted from the uploaded documents")
                 
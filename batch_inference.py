@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Batch Inference Module for Master Template System
+Offline page analysis through Bedrock batch inference jobs
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+import boto3
+
+from bedrock_client import BedrockClient, response_output_text
+from contact_prepass import merge_contact_elements
+
+# Job states as reported by GetModelInvocationJob
+COMPLETED_STATUSES = {'Completed', 'PartiallyCompleted'}
+FAILED_STATUSES = {'Failed', 'Stopped', 'Expired'}
+
+DEFAULT_WORK_DIR = os.environ.get("BATCH_WORK_DIR", ".batch_jobs")
+
+
+class BatchInferenceError(Exception):
+    """A batch job failed, or its output could not be read"""
+
+
+class BatchBackend:
+    """Submits batch job files and reports on them; subclasses talk to a concrete service"""
+
+    def submit(self, job_name: str, input_path: str, model_id: str) -> str:
+        """Start a job over the JSONL records in input_path; returns the job id"""
+        raise NotImplementedError
+
+    def get_status(self, job_id: str) -> str:
+        """Current job state, one of the GetModelInvocationJob statuses"""
+        raise NotImplementedError
+
+    def download_output(self, job_id: str, input_path: str, dest_dir: str) -> str:
+        """Copy the job's output JSONL into dest_dir; returns its local path"""
+        raise NotImplementedError
+
+
+class BedrockBatchBackend(BatchBackend):
+    def __init__(self, region: str, role_arn: str, input_s3_uri: str, output_s3_uri: str):
+        """Run jobs with CreateModelInvocationJob, staging files under the given S3 prefixes
+
+        role_arn must allow Bedrock to read input_s3_uri and write output_s3_uri.
+        """
+        self.role_arn = role_arn
+        self.input_s3_uri = input_s3_uri.rstrip('/')
+        self.output_s3_uri = output_s3_uri.rstrip('/')
+        self.bedrock = boto3.client(service_name='bedrock', region_name=region)
+        self.s3 = boto3.client(service_name='s3', region_name=region)
+
+    @staticmethod
+    def _split_s3_uri(uri: str) -> Tuple[str, str]:
+        bucket, _, key = uri[len('s3://'):].partition('/')
+        return bucket, key
+
+    def submit(self, job_name: str, input_path: str, model_id: str) -> str:
+        input_uri = f"{self.input_s3_uri}/{os.path.basename(input_path)}"
+        self.s3.upload_file(input_path, *self._split_s3_uri(input_uri))
+
+        response = self.bedrock.create_model_invocation_job(
+            jobName=job_name,
+            roleArn=self.role_arn,
+            modelId=model_id,
+            inputDataConfig={'s3InputDataConfig': {'s3Uri': input_uri, 's3InputFormat': 'JSONL'}},
+            outputDataConfig={'s3OutputDataConfig': {'s3Uri': self.output_s3_uri + '/'}}
+        )
+        return response['jobArn']
+
+    def get_status(self, job_id: str) -> str:
+        return self.bedrock.get_model_invocation_job(jobIdentifier=job_id)['status']
+
+    def download_output(self, job_id: str, input_path: str, dest_dir: str) -> str:
+        # Bedrock writes <output prefix>/<job id>/<input file name>.out
+        output_name = os.path.basename(input_path) + '.out'
+        bucket, key = self._split_s3_uri(f"{self.output_s3_uri}/{job_id.split('/')[-1]}/{output_name}")
+        local_path = os.path.join(dest_dir, output_name)
+        self.s3.download_file(bucket, key, local_path)
+        return local_path
+
+
+class LocalBatchBackend(BatchBackend):
+    def __init__(self, root_dir: str, runtime):
+        """Stand-in service that runs jobs from a local directory
+
+        runtime is anything with bedrock-runtime's invoke_model; each record is
+        sent to it when the job is first polled, and the output is written in
+        the same record format Bedrock produces.
+        """
+        self.root_dir = root_dir
+        self.runtime = runtime
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root_dir, job_id)
+
+    def submit(self, job_name: str, input_path: str, model_id: str) -> str:
+        job_id = f"{job_name}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(os.path.join(self._job_dir(job_id), 'output'))
+        shutil.copy(input_path, os.path.join(self._job_dir(job_id), os.path.basename(input_path)))
+        with open(os.path.join(self._job_dir(job_id), 'job.json'), 'w') as f:
+            json.dump({'model_id': model_id, 'input_name': os.path.basename(input_path)}, f)
+        return job_id
+
+    def get_status(self, job_id: str) -> str:
+        with open(os.path.join(self._job_dir(job_id), 'job.json')) as f:
+            job = json.load(f)
+        output_path = os.path.join(self._job_dir(job_id), 'output', job['input_name'] + '.out')
+        if not os.path.exists(output_path):
+            self._run(job, os.path.join(self._job_dir(job_id), job['input_name']), output_path)
+        return 'Completed'
+
+    def _run(self, job: Dict[str, Any], input_path: str, output_path: str):
+        """Answer every record in input_path, one output line per record"""
+        with open(input_path) as source, open(output_path + '.tmp', 'w') as out:
+            for line in source:
+                record = json.loads(line)
+                try:
+                    response = self.runtime.invoke_model(
+                        modelId=job['model_id'],
+                        body=json.dumps(record['modelInput'])
+                    )
+                    record['modelOutput'] = json.loads(response['body'].read())
+                except Exception as e:
+                    record['error'] = {'errorCode': 400, 'errorMessage': str(e)}
+                out.write(json.dumps(record) + '\n')
+        os.replace(output_path + '.tmp', output_path)
+
+    def download_output(self, job_id: str, input_path: str, dest_dir: str) -> str:
+        output_name = os.path.basename(input_path) + '.out'
+        local_path = os.path.join(dest_dir, output_name)
+        shutil.copy(os.path.join(self._job_dir(job_id), 'output', output_name), local_path)
+        return local_path
+
+
+class BatchInference:
+    def __init__(self, bedrock_client: BedrockClient, backend: BatchBackend, work_dir: str = DEFAULT_WORK_DIR):
+        """Analyze pages through batch jobs instead of one InvokeModel call per page
+
+        Job files, downloaded output and a manifest mapping record ids back to
+        pages are kept in work_dir, so a job can be collected by a later process.
+        """
+        self.bedrock_client = bedrock_client
+        self.backend = backend
+        self.work_dir = work_dir
+        os.makedirs(work_dir, exist_ok=True)
+
+    def write_job_file(self, pages: Iterable[Tuple[str, str, int]], job_name: str) -> Dict[str, Any]:
+        """Write one batch record per (page_content, doc_id, page_index); returns the job manifest
+
+        With the client's contact_prepass, pages the pre-pass covers get no
+        record; the manifest keeps their structure, and the contacts of the
+        other pages to merge into their answers (see ingest).
+        """
+        input_path = os.path.join(self.work_dir, f"{job_name}.jsonl")
+        records = []
+        prepass = {}
+
+        with open(input_path, 'w') as f:
+            for page_content, doc_id, page_index in pages:
+                record_id = f"{len(records):011d}"
+                records.append([record_id, doc_id, page_index])
+                if self.bedrock_client.contact_prepass:
+                    found = self.bedrock_client._prepass_page(page_content, doc_id, page_index)
+                    prepass[record_id] = found
+                    if found['page_json'] is not None:
+                        continue
+                # Batch jobs have no prompt cache to write to, so send the plain system prompt
+                model_input = self.bedrock_client.build_page_request(page_content, doc_id, page_index)
+                f.write(json.dumps({'recordId': record_id, 'modelInput': model_input}) + '\n')
+
+        return {
+            'job_name': job_name,
+            'job_id': None,
+            'model_id': self.bedrock_client.model_id,
+            'input_path': input_path,
+            'records': records,
+            'prepass': prepass
+        }
+
+    def _manifest_path(self, job_name: str) -> str:
+        return os.path.join(self.work_dir, f"{job_name}.manifest.json")
+
+    def submit(self, pages: Iterable[Tuple[str, str, int]], job_name: Optional[str] = None) -> Dict[str, Any]:
+        """Write the job file, submit it and save the manifest"""
+        job_name = job_name or f"page-structure-{time.strftime('%Y%m%d-%H%M%S')}"
+        job = self.write_job_file(pages, job_name)
+        covered = [found for found in self._prepass_by_record(job).values() if found['page_json'] is not None]
+        if len(covered) < len(job['records']):
+            job['job_id'] = self.backend.submit(job_name, job['input_path'], job['model_id'])
+
+        with open(self._manifest_path(job_name), 'w') as f:
+            json.dump(job, f)
+        return job
+
+    def load_job(self, job_name: str) -> Dict[str, Any]:
+        """Read back the manifest of a previously submitted job"""
+        with open(self._manifest_path(job_name)) as f:
+            return json.load(f)
+
+    def wait(self, job: Dict[str, Any], poll_interval: float = 60.0, timeout: Optional[float] = None) -> str:
+        """Poll until the job finishes; raises BatchInferenceError if it fails or times out"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if job['job_id'] is None:
+            # No page needed Claude (see write_job_file); nothing was submitted
+            return 'Completed'
+
+        while True:
+            status = self.backend.get_status(job['job_id'])
+            if status in COMPLETED_STATUSES:
+                return status
+            if status in FAILED_STATUSES:
+                raise BatchInferenceError(f"Batch job {job['job_name']} ended with status {status}")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise BatchInferenceError(f"Batch job {job['job_name']} still {status} after {timeout}s")
+            time.sleep(poll_interval)
+
+    def ingest(self, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Read the job output into per-page results, in submission order
+
+        Each result has the same shape as BedrockClient.extract_pages returns:
+        doc_id, page_index, page_json (None on failure) and error.
+        """
+        outputs = {}
+        if job['job_id'] is not None:
+            output_path = self.backend.download_output(job['job_id'], job['input_path'], self.work_dir)
+            with open(output_path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        outputs[record.get('recordId')] = record
+
+        prepass = self._prepass_by_record(job)
+        results = []
+        for record_id, doc_id, page_index in job['records']:
+            found = prepass.get(record_id)
+            if found is not None and found['page_json'] is not None:
+                # Answered by the contact pre-pass; no record was submitted
+                results.append({'doc_id': doc_id, 'page_index': page_index, 'page_json': found['page_json'],
+                                'error': None})
+                continue
+
+            page_json, error = None, None
+            record = outputs.get(record_id)
+            try:
+                if record is None:
+                    raise BatchInferenceError(f"No batch output for {doc_id} page {page_index}")
+                if 'error' in record:
+                    raise BatchInferenceError(
+                        f"Batch record for {doc_id} page {page_index} failed: "
+                        f"{record['error'].get('errorMessage', record['error'])}"
+                    )
+
+                model_output = record.get('modelOutput', {})
+                usage = model_output.get('usage', {})
+                self.bedrock_client._record_usage(usage)
+                # Batch records carry no per-call latency
+                self.bedrock_client.call_metrics.record({
+                    'operation': 'batch_page_structure',
+                    'doc_id': doc_id,
+                    'page_index': page_index,
+                    'model_id': job['model_id'],
+                    'stop_reason': model_output.get('stop_reason'),
+                    **usage
+                })
+                output = response_output_text(model_output)
+                if output is None:
+                    raise BatchInferenceError("Unexpected response format from Claude")
+                page_json = self.bedrock_client.parse_page_response(output, doc_id, page_index)
+                if found is not None:
+                    # The prompt asked Claude to leave these out
+                    page_json = merge_contact_elements(page_json, found['contacts'], page_index)
+            except Exception as e:
+                error = str(e)
+
+            results.append({
+                'doc_id': doc_id,
+                'page_index': page_index,
+                'page_json': page_json,
+                'error': error
+            })
+
+        return results
+
+    @staticmethod
+    def _prepass_by_record(job: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Contact pre-pass findings by record id; manifests written without the pre-pass have none"""
+        return job.get('prepass') or {}
+
+    def run(self, pages: Iterable[Tuple[str, str, int]], job_name: Optional[str] = None,
+            poll_interval: float = 60.0, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Submit, wait for and ingest a job in one call"""
+        job = self.submit(pages, job_name)
+        self.wait(job, poll_interval, timeout)
+        return self.ingest(job)
+
+
+def main():
+    """Command line: submit documents as a batch job, or collect a finished job's results"""
+    arg_parser = argparse.ArgumentParser(description="Analyze document pages with Bedrock batch inference")
+    arg_parser.add_argument("--region", default="eu-west-1")
+    arg_parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR)
+    arg_parser.add_argument("--role-arn", required=True, help="Service role Bedrock uses to reach S3")
+    arg_parser.add_argument("--input-s3-uri", required=True, help="S3 prefix job files are uploaded to")
+    arg_parser.add_argument("--output-s3-uri", required=True, help="S3 prefix Bedrock writes output to")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="Parse documents and submit their pages as one job")
+    submit.add_argument("files", nargs="+")
+    submit.add_argument("--job-name")
+    collect = commands.add_parser("collect", help="Wait for a job and write its page structures as JSON")
+    collect.add_argument("job_name")
+    collect.add_argument("--output", default="-", help="Results file (default stdout)")
+    collect.add_argument("--poll-interval", type=float, default=60.0)
+    args = arg_parser.parse_args()
+
+    batch = BatchInference(
+        BedrockClient(region=args.region),
+        BedrockBatchBackend(args.region, args.role_arn, args.input_s3_uri, args.output_s3_uri),
+        args.work_dir
+    )
+
+    if args.command == "submit":
+        from parsing import DocumentParser
+        parser = DocumentParser()
+
+        def iter_all_pages():
+            for i, path in enumerate(args.files):
+                for page_idx, page_content in enumerate(parser.iter_pages(path)):
+                    yield page_content, f"doc_{i+1}", page_idx + 1
+
+        job = batch.submit(iter_all_pages(), args.job_name)
+        print(f"📤 Submitted {len(job['records'])} pages as {job['job_name']} ({job['job_id']})")
+        return 0
+
+    job = batch.load_job(args.job_name)
+    status = batch.wait(job, args.poll_interval)
+    results = batch.ingest(job)
+    failed = sum(1 for r in results if r['error'])
+
+    if args.output == "-":
+        json.dump(results, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(f"📥 Job {status}: {len(results) - failed} pages analyzed, {failed} failed", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,74 +1,54 @@
 import boto3
+import copy
 import json
+import time
 import streamlit as st
-from typing import Dict, Any, Optional, List
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Iterable, Tuple, Callable, Union
 import logging
+import re
+import textwrap
+import threading
+from call_metrics import CallMetrics
+from cassette import Cassette
+from contact_prepass import contact_hints, merge_contact_elements, page_contacts, prepass_page
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED
+from hedging import RequestHedger, HedgeCancelled
+from heuristic_extractor import heuristic_page_structure
 from catalog_integration import CatalogIntegration
+from json_stream import ElementStreamParser, MalformedStreamError, salvage_page_json
+from model_router import ModelRouter, STRONG_MODEL_ID
+from response_cache import ResponseCache
+from single_flight import SingleFlight
+from token_budget import OutputBudget, DEFAULT_MAX_TOKENS
+from rate_limiter import AdaptiveRateLimiter
+from region_pool import RegionPool
 
-class BedrockClient:
-    def __init__(self, region: str = "eu-west-1"):
-        """Initialize Bedrock client for Claude Sonnet 4.5 with catalog integration"""
-        self.region = region
-        self.model_id = "eu.anthropic.claude-sonnet-4-5-20250929-v1:0"
-        
-        # Initialize catalog integration
-        self.catalog = CatalogIntegration()
-        
-        try:
-            self.bedrock_runtime = boto3.client(
-                service_name='bedrock-runtime',
-                region_name=region
-            )
-        except Exception as e:
-            st.error(f"Failed to initialize AWS Bedrock client: {str(e)}")
-            st.error("Please ensure AWS credentials are configured via environment variables")
-            raise
-    
-    def _call_claude(self, system_prompt: str, user_prompt: str, max_tokens: int = 4000) -> Optional[str]:
-        """Call Claude via Bedrock with proper message formatting"""
-        
-        try:
-            # Prepare the request body
-            body = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": max_tokens,
-                "system": system_prompt,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ],
-                "temperature": 0.1,  # Low temperature for consistent structured output
-                "top_p": 0.9
-            }
-            
-            # Call Bedrock
-            response = self.bedrock_runtime.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps(body)
-            )
-            
-            # Parse response
-            response_body = json.loads(response['body'].read())
-            
-            if 'content' in response_body and len(response_body['content']) > 0:
-                return response_body['content'][0]['text']
-            else:
-                st.error("Unexpected response format from Claude")
-                return None
-                
-        except Exception as e:
-            st.error(f"Error calling Claude: {str(e)}")
-            return None
-    
-    def extract_page_structure(self, page_content: str, doc_id: str, page_index: int) -> Optional[Dict[str, Any]]:
-        """Extract comprehensive structured JSON representation using master catalog"""
-        
-        # Get available elements from catalog
-        catalog_elements = self.catalog.get_element_types_for_prompt()
-        
-        system_prompt = f"""You are an expert document structure analyzer using a comprehensive master catalog. Your task is to extract the complete structure of a document page using ONLY elements defined in the master catalog.
+# Error codes that mean "slow down and try again" rather than a bad request
+THROTTLING_ERROR_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException'
+}
+
+# Error codes worth retrying in another region of a RegionPool
+FAILOVER_ERROR_CODES = {
+    'InternalServerException',
+    'ModelTimeoutException',
+    'ModelErrorException',
+    'AccessDeniedException',
+    'ResourceNotFoundException'
+}
+
+# Packed requests answer for several pages at once
+PACKED_MAX_TOKENS = 8000
+MAX_PAGES_PER_PACK = 8
+
+# Page-analysis system prompt; {catalog_elements} is filled from the master catalog
+PAGE_STRUCTURE_SYSTEM_PROMPT = """You are an expert document structure analyzer using a comprehensive master catalog. Your task is to extract the complete structure of a document page using ONLY elements defined in the master catalog.
 
 {catalog_elements}
 
@@ -132,46 +112,34 @@ FIGURE EXAMPLES:
 
 Return ONLY valid JSON with no additional commentary."""
 
-        user_prompt = f"""Analyze this page content and extract its comprehensive structure:
-
-PAGE CONTENT:
-{page_content}
-
-Return a JSON object with this exact structure:
-{{
-  "doc_id": "{doc_id}",
-  "page_index": {page_index},
-  "page_role": "cover|front_matter|introduction|main_content|analysis|recommendations|conclusion|end_matter",
-  "elements": [
-    {{
+# Skeleton of one element object in the page-structure JSON
+PAGE_ELEMENT_SCHEMA = """    {
       "element_id": "e1",
       "type": "title|subtitle|author|organization|version_number|document_id|date_created|last_updated|confidentiality_level|cover_page|preface|acknowledgements|table_of_contents|list_of_figures|list_of_tables|executive_summary|abstract|introduction|purpose|scope|background|problem_statement|audience|assumptions|heading|subheading|paragraph|bullet_list|number_list|definition|case_study|procedure|workflow|diagram|table|chart|screenshot|callout|note|tip|warning|figure|image|flowchart|data_highlight|equation|code_block|footnote|hyperlink|data_analysis|findings|observations|patterns|interpretation|comparison|limitation|key_recommendations|action_plan|roadmap|strategy|best_practices|implementation_steps|summary|final_conclusion|insights|way_forward|closing_statement|glossary|references|bibliography|appendix|index|contact_information",
       "category": "metadata|front_matter|main_body|supporting|analysis|recommendations|conclusion|end_matter",
       "importance": "critical|important|optional|supplementary",
       "text": "text content for text-like elements",
       "items": ["item1", "item2"],
-      "table": {{
+      "table": {
         "headers": ["col1", "col2"],
         "rows": [["val1", "val2"]]
-      }},
-      "chart": {{
+      },
+      "chart": {
         "chart_type": "pie|bar|line|scatter",
         "labels": ["label1", "label2"],
         "values": [10, 20],
         "description": "chart description"
-      }},
-      "metadata": {{
+      },
+      "metadata": {
         "author": "author name if applicable",
         "date": "date if applicable",
         "version": "version if applicable"
-      }},
+      },
       "position_hint": "top|middle|bottom|header|footer",
       "pii_type": "NONE|ORG_NAME|PERSON_NAME|EMAIL|PHONE|ADDRESS|URL|DATE"
-    }}
-  ]
-}}
+    }"""
 
-Guidelines:
+PAGE_STRUCTURE_GUIDELINES = """Guidelines:
 - Identify the page_role based on content (cover, introduction, main_content, etc.)
 - Use comprehensive element types from the provided list
 - Categorize each element (metadata, front_matter, main_body, etc.)
@@ -186,25 +154,1264 @@ Guidelines:
 - Generate meaningful element_id values (e1, e2, etc.)
 - Include ALL visible content elements, no matter how small"""
 
-        response = self._call_claude(system_prompt, user_prompt)
+# Single-page analysis prompt
+PAGE_STRUCTURE_USER_PROMPT = """Analyze this page content and extract its comprehensive structure:
+
+PAGE CONTENT:
+{page_content}
+
+Return a JSON object with this exact structure:
+{{
+  "doc_id": "{doc_id}",
+  "page_index": {page_index},
+  "page_role": "cover|front_matter|introduction|main_content|analysis|recommendations|conclusion|end_matter",
+  "elements": [
+{element_schema}
+  ]
+}}
+
+{guidelines}"""
+
+# Stands in for the catalog list in the system prompt when each page carries its own candidates
+CATALOG_SUBSET_NOTE = """AVAILABLE ELEMENT TYPES FROM MASTER CATALOG:
+The catalog elements that can appear on a page are pre-selected for it and listed at the start of each request as CANDIDATE ELEMENT TYPES FROM MASTER CATALOG; treat that list as the catalog."""
+
+# Single-page prompt when the output schema is sent as a tool instead of in the prompt
+TOOL_PAGE_STRUCTURE_USER_PROMPT = """Analyze this page content and extract its comprehensive structure:
+
+PAGE CONTENT:
+{page_content}
+
+Record the structure of document "{doc_id}", page {page_index}, with the record_page_structure tool.
+
+{guidelines}"""
+
+# Output schema for structured (tool-use) page analysis; mirrors PAGE_ELEMENT_SCHEMA
+PAGE_STRUCTURE_TOOL = {
+    "name": "record_page_structure",
+    "description": "Record the structure of one document page using element types from the master catalog.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "doc_id": {"type": "string"},
+            "page_index": {"type": "integer"},
+            "page_role": {
+                "type": "string",
+                "enum": ["cover", "front_matter", "introduction", "main_content", "analysis",
+                         "recommendations", "conclusion", "end_matter"]
+            },
+            "elements": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "element_id": {"type": "string", "description": "e1, e2, ..."},
+                        "type": {"type": "string", "description": "Element type from the master catalog"},
+                        "category": {
+                            "type": "string",
+                            "enum": ["metadata", "front_matter", "main_body", "supporting", "analysis",
+                                     "recommendations", "conclusion", "end_matter"]
+                        },
+                        "importance": {"type": "string", "enum": ["critical", "important", "optional", "supplementary"]},
+                        "text": {"type": "string"},
+                        "items": {"type": "array", "items": {"type": "string"}},
+                        "table": {
+                            "type": "object",
+                            "properties": {
+                                "headers": {"type": "array", "items": {"type": "string"}},
+                                "rows": {"type": "array", "items": {"type": "array", "items": {"type": "string"}}}
+                            }
+                        },
+                        "chart": {
+                            "type": "object",
+                            "properties": {
+                                "chart_type": {"type": "string", "enum": ["pie", "bar", "line", "scatter"]},
+                                "labels": {"type": "array", "items": {"type": "string"}},
+                                "values": {"type": "array", "items": {"type": "number"}},
+                                "description": {"type": "string"}
+                            }
+                        },
+                        "metadata": {
+                            "type": "object",
+                            "properties": {
+                                "author": {"type": "string"},
+                                "date": {"type": "string"},
+                                "version": {"type": "string"}
+                            }
+                        },
+                        "position_hint": {"type": "string", "enum": ["top", "middle", "bottom", "header", "footer"]},
+                        "pii_type": {
+                            "type": "string",
+                            "enum": ["NONE", "ORG_NAME", "PERSON_NAME", "EMAIL", "PHONE", "ADDRESS", "URL", "DATE"]
+                        }
+                    },
+                    "required": ["element_id", "type", "category", "importance", "pii_type"]
+                }
+            }
+        },
+        "required": ["page_role", "elements"]
+    }
+}
+
+# Several short pages analyzed in one request; the answer is split back per page
+PACKED_PAGES_USER_PROMPT = """Analyze each of the {page_count} pages below and extract the comprehensive structure of every page:
+
+{pages_block}
+
+Return a JSON object with one entry per page, in the same order as the pages above:
+{{
+  "pages": [
+    {{
+      "doc_id": "doc_id from the page header",
+      "page_index": 1,
+      "page_role": "cover|front_matter|introduction|main_content|analysis|recommendations|conclusion|end_matter",
+      "elements": [
+{element_schema}
+      ]
+    }}
+  ]
+}}
+
+{guidelines}
+- Analyze every page on its own; never merge elements across pages
+- Copy doc_id and page_index exactly from each page header
+- Return exactly {page_count} entries in the "pages" array"""
+
+# Stop reasons of complete answers, the only ones worth serving again from the response cache
+CACHEABLE_STOP_REASONS = ('end_turn', 'tool_use')
+
+# Lines the parsers number pages and slides with; repeated pages differ only in these
+_PAGE_NUMBER_MARKER = re.compile(r'^(?:SLIDE \d+:|\[Page \d+ - .*\])\n?', re.MULTILINE)
+
+class BedrockError(Exception):
+    """A Bedrock call succeeded but its response could not be used"""
+
+class PageExtractionError(BedrockError):
+    """Claude's answer for a page was not valid page-structure JSON"""
+    
+    def __init__(self, message: str, raw_response: Optional[str] = None):
+        super().__init__(message)
+        self.raw_response = raw_response
+
+class StreamInterruptedError(BedrockError):
+    """A streamed call failed after part of its output had already been handed to the caller"""
+    
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+
+class BedrockClient:
+    def __init__(self, region: str = "eu-west-1", response_cache: Optional[ResponseCache] = None,
+                 max_concurrency: int = 4, rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 max_retries: int = 8, prompt_caching: bool = True, streaming: bool = False,
+                 call_metrics: Optional[CallMetrics] = None, router: Optional[ModelRouter] = None,
+                 structured_output: bool = True, catalog_top_k: Optional[int] = None,
+                 max_continuations: int = 2, output_budget: Optional[OutputBudget] = None,
+                 hedger: Optional[RequestHedger] = None, region_pool: Optional[RegionPool] = None,
+                 endpoint_url: Optional[str] = None, cassette: Optional[Cassette] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 single_flight: Optional[SingleFlight] = None, contact_prepass: bool = False):
+        """Initialize Bedrock client for Claude Sonnet 4.5 with catalog integration
         
-        if response:
-            try:
-                # Clean response and parse JSON
-                response = response.strip()
-                if response.startswith('```json'):
-                    response = response[7:]
-                if response.endswith('```'):
-                    response = response[:-3]
+        With a response_cache, identical requests (same model, prompts and
+        generation parameters) are answered locally instead of calling Bedrock.
+        max_concurrency is the default number of pages extract_pages analyzes
+        at once; the HTTP connection pool is sized to match. Calls in flight
+        are governed by rate_limiter, which may be shared between clients;
+        throttled calls are retried up to max_retries times. prompt_caching
+        marks the static page-analysis system prompt as a Bedrock cache point.
+        With streaming, page analysis reads the response as it is generated
+        (see stream_page_structure). Every call is logged to call_metrics.
+        A router sends simple pages to a cheaper model (see _analyze_page).
+        structured_output sends the page schema as a forced tool call instead
+        of a JSON skeleton in the prompt; packed requests always use the prompt.
+        With catalog_top_k, each page is offered only the catalog's always-on
+        core plus its catalog_top_k best matching elements.
+        A page answer cut off at max_tokens is continued from where it stopped
+        up to max_continuations times (see _continue_page); answers that still
+        do not parse are salvaged element by element (see parse_page_response).
+        With an output_budget, page calls reserve a max_tokens predicted for
+        the page instead of a fixed 4000, and the budget learns from each call.
+        A hedger sends a duplicate of page analyses that run unusually long
+        and keeps whichever answers first (see _analyze_page).
+        With a region_pool, calls are spread over its regions, each with its
+        own concurrency window, instead of going to region alone.
+        endpoint_url overrides the bedrock-runtime endpoint, e.g. to point
+        the client at a local BedrockStandIn; a region_pool must give it in
+        each region spec too. A cassette in record mode keeps
+        every response with its latency; in replay mode it answers instead of
+        Bedrock, so runs are reproducible offline. A circuit_breaker trips on
+        a burst of failed or timed-out Bedrock calls; while it is open calls
+        fail fast and pages are extracted locally by heuristic_page_structure.
+        With single_flight, identical pages analyzed at the same time, e.g.
+        the same deck uploaded twice or repeated boilerplate slides, share
+        one analysis (see _analyze_page). contact_prepass finds emails, phone
+        numbers, URLs, addresses and dates with regular expressions first: a
+        page holding nothing else is not sent to Claude, and on other pages
+        they are left out of Claude's answer and added back.
+        """
+        self.region = region
+        self.model_id = STRONG_MODEL_ID
+        self.response_cache = response_cache
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(
+            initial_window=self.max_concurrency,
+            max_window=self.max_concurrency
+        )
+        self.max_retries = max_retries
+        self.prompt_caching = prompt_caching
+        self.streaming = streaming
+        self.call_metrics = call_metrics or CallMetrics()
+        self.router = router
+        self.structured_output = structured_output
+        self.catalog_top_k = catalog_top_k
+        self.max_continuations = max_continuations
+        self.output_budget = output_budget
+        self.hedger = hedger
+        self.region_pool = region_pool
+        self.endpoint_url = endpoint_url
+        if (region_pool is not None and endpoint_url is not None
+                and any(region['spec'].get('endpoint_url') != endpoint_url for region in region_pool.regions)):
+            # The pool's own runtimes would otherwise call Bedrock instead of endpoint_url
+            raise ValueError(f"Every region_pool region spec needs endpoint_url {endpoint_url}")
+        self.cassette = cassette
+        self.circuit_breaker = circuit_breaker
+        self.single_flight = single_flight
+        self.contact_prepass = contact_prepass
+        
+        # Token usage reported by Bedrock across all calls of this client
+        self.usage_totals = {
+            'calls': 0,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'cache_read_input_tokens': 0,
+            'cache_creation_input_tokens': 0
+        }
+        self.packing_stats = {'packed_requests': 0, 'packed_pages': 0, 'fallback_pages': 0}
+        self.stream_stats = {
+            'streamed_pages': 0,
+            'aborted_streams': 0,
+            'first_element_seconds': [],
+            'response_seconds': []
+        }
+        self.catalog_subset_stats = {'pages': 0, 'candidates': 0, 'subset_tokens': 0}
+        self.recovery_stats = {
+            'truncated_responses': 0,
+            'continuations': 0,
+            'continued_pages': 0,
+            'salvaged_pages': 0,
+            'salvaged_elements': 0
+        }
+        self.heuristic_pages = 0
+        self.prepass_stats = {'pages': 0, 'covered_pages': 0, 'hinted_pages': 0, 'contacts': 0}
+        self._usage_lock = threading.Lock()
+        
+        # Initialize catalog integration
+        self.catalog = CatalogIntegration()
+        
+        try:
+            self.bedrock_runtime = self._create_runtime_client(self.max_concurrency)
+        except Exception as e:
+            st.error(f"Failed to initialize AWS Bedrock client: {str(e)}")
+            st.error("Please ensure AWS credentials are configured via environment variables")
+            raise
+    
+    def _create_runtime_client(self, pool_size: int):
+        """Create a bedrock-runtime client whose connection pool fits pool_size concurrent calls"""
+        self.pool_size = max(10, pool_size)  # botocore's default pool is 10
+        return boto3.client(
+            service_name='bedrock-runtime',
+            region_name=self.region,
+            endpoint_url=self.endpoint_url,
+            config=Config(
+                max_pool_connections=self.pool_size,
+                # Throttling retries go through the rate limiter instead
+                retries={'mode': 'standard', 'total_max_attempts': 1}
+            )
+        )
+    
+    def _call_claude(self, system_prompt: str, user_prompt: str, max_tokens: int = 4000,
+                     cache_system_prompt: bool = False, tags: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Call Claude via Bedrock with proper message formatting"""
+        
+        try:
+            return self._invoke_claude(system_prompt, user_prompt, max_tokens, cache_system_prompt, tags=tags)
+        except BedrockError as e:
+            st.error(str(e))
+            return None
+        except Exception as e:
+            st.error(f"Error calling Claude: {str(e)}")
+            return None
+    
+    def _invoke_claude(self, system_prompt: str, user_prompt: str, max_tokens: int = 4000,
+                       cache_system_prompt: bool = False,
+                       on_text: Optional[Callable[[str], None]] = None,
+                       tags: Optional[Dict[str, Any]] = None, model_id: Optional[str] = None,
+                       tool: Optional[Dict[str, Any]] = None, prefill: Optional[str] = None,
+                       response_meta: Optional[Dict[str, Any]] = None) -> str:
+        """Call Claude via Bedrock and return the response text, raising on failure
+        
+        With cache_system_prompt the system prompt is sent as a cacheable
+        block, so Bedrock can reuse it across calls instead of reprocessing it.
+        With on_text the response is streamed and on_text receives each text
+        delta as it arrives; an exception from on_text aborts the stream.
+        Every call is logged to call_metrics together with tags (operation,
+        doc_id, page_index). model_id overrides the client's model. With tool,
+        Claude must answer by calling it and the call's input is returned as
+        JSON text. With prefill, Claude's answer starts with that text and only
+        what follows it is returned. response_meta, if given, receives the
+        stop_reason.
+        """
+        
+        body = self._build_request_body(system_prompt, user_prompt, max_tokens, cache_system_prompt, tool,
+                                        prefill)
+        model_id = model_id or self.model_id
+        call = {'operation': 'call', **(tags or {}), 'model_id': model_id, 'retries': 0, 'max_tokens': max_tokens}
+        start = time.monotonic()
+        
+        try:
+            # Serve repeated requests from the local response cache
+            cache_key = None
+            response_body = None
+            if self.response_cache is not None:
+                cache_key = ResponseCache.make_key(model_id, body)
+                response_body = self.response_cache.get(cache_key)
+            
+            if response_body is None and self.cassette is not None and self.cassette.replaying:
+                # Serve the recorded answer instead of calling Bedrock
+                response_body = self.cassette.play(model_id, body)
+                call['replayed'] = True
+            elif response_body is None:
+                # Call Bedrock
+                if on_text is None:
+                    response = self._invoke_with_retries(body, call=call, model_id=model_id)
+                    
+                    # Parse response
+                    response_body = json.loads(response['body'].read())
+                else:
+                    response_body = self._invoke_with_retries(
+                        body, read_stream=lambda response: _read_response_stream(response, on_text),
+                        call=call, model_id=model_id
+                    )
                 
-                return json.loads(response)
-            except json.JSONDecodeError as e:
-                st.error(f"Failed to parse JSON response for {doc_id} page {page_index}: {str(e)}")
-                st.error(f"Raw response: {response[:500]}...")
-                return None
+                # Only finished answers are kept; a truncated one must be asked for again
+                if (cache_key is not None and response_body.get('content')
+                        and response_body.get('stop_reason') in CACHEABLE_STOP_REASONS):
+                    self.response_cache.put(cache_key, model_id, response_body)
+            else:
+                call['cached'] = True
+            
+            if self.cassette is not None and not call.get('replayed'):
+                # Cache hits too, so replaying the cassette without the cache misses no call
+                self.cassette.record(model_id, body, response_body, time.monotonic() - start)
+            
+            if not call.get('cached'):
+                usage = response_body.get('usage', {})
+                self._record_usage(usage)
+                call.update({field: usage.get(field) for field in (
+                    'input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens'
+                )})
+            call['stop_reason'] = response_body.get('stop_reason')
+            
+            output = response_output_text(response_body)
+            if output is None:
+                raise BedrockError("Unexpected response format from Claude")
+            if (call.get('cached') or call.get('replayed')) and on_text is not None:
+                on_text(output)
+            if response_meta is not None:
+                response_meta['stop_reason'] = call['stop_reason']
+            return output
+        except Exception as e:
+            call['error'] = str(e) or e.__class__.__name__
+            raise
+        finally:
+            call['latency_seconds'] = round(time.monotonic() - start, 4)
+            self.call_metrics.record(call)
+            if self.output_budget is not None:
+                self.output_budget.observe(call)
+    
+    def _build_request_body(self, system_prompt: str, user_prompt: str, max_tokens: int = 4000,
+                            cache_system_prompt: bool = False,
+                            tool: Optional[Dict[str, Any]] = None,
+                            prefill: Optional[str] = None) -> Dict[str, Any]:
+        """Anthropic messages request body for InvokeModel, forcing a call to tool or starting the answer with prefill"""
+        
+        system: Union[str, List[Dict[str, Any]]] = system_prompt
+        if cache_system_prompt and self.prompt_caching:
+            system = [{
+                "type": "text",
+                "text": system_prompt,
+                "cache_control": {"type": "ephemeral"}
+            }]
+        
+        body = {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "system": system,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": user_prompt
+                }
+            ],
+            "temperature": 0.1,  # Low temperature for consistent structured output
+            "top_p": 0.9
+        }
+        if prefill is not None:
+            # Bedrock rejects a final assistant turn that ends in whitespace
+            body["messages"].append({"role": "assistant", "content": prefill.rstrip()})
+        if tool is not None:
+            # Tools precede the system prompt, so a system cache point covers the schema too
+            body["tools"] = [tool]
+            body["tool_choice"] = {"type": "tool", "name": tool["name"]}
+        return body
+    
+    def _invoke_with_retries(self, body: Dict[str, Any],
+                             read_stream: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                             call: Optional[Dict[str, Any]] = None, model_id: Optional[str] = None) -> Any:
+        """invoke_model inside the adaptive rate limiter, retrying throttled calls
+        
+        With read_stream the call uses invoke_model_with_response_stream and
+        returns read_stream(response), which consumes the stream while the
+        call still holds its slot; the call only counts as answered once the
+        stream was read. A stream that fails after handing over output is
+        not retried (see StreamInterruptedError). Retries are counted in
+        call['retries'].
+        """
+        
+        if self.region_pool is not None:
+            return self._invoke_in_pool(body, read_stream, call, model_id)
+        
+        for attempt in range(self.max_retries + 1):
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.allow(retry=attempt > 0)
+            with self.rate_limiter.slot():
+                start = time.monotonic()
+                try:
+                    invoke = (self.bedrock_runtime.invoke_model if read_stream is None
+                              else self.bedrock_runtime.invoke_model_with_response_stream)
+                    response = invoke(
+                        modelId=model_id or self.model_id,
+                        body=json.dumps(body)
+                    )
+                    latency = time.monotonic() - start
+                    response = self._read_answer(response, read_stream,
+                                                 lambda: self.rate_limiter.on_success(latency))
+                    self.rate_limiter.on_success(latency)
+                    self._circuit_outcome(failed=False)
+                    return response
+                except StreamInterruptedError as e:
+                    if e.code in THROTTLING_ERROR_CODES:
+                        self.rate_limiter.on_throttle()
+                    self._circuit_outcome(failed=e.code in THROTTLING_ERROR_CODES | FAILOVER_ERROR_CODES)
+                    raise
+                except ClientError as e:
+                    code = e.response.get('Error', {}).get('Code')
+                    if code not in THROTTLING_ERROR_CODES:
+                        self._circuit_outcome(failed=code in FAILOVER_ERROR_CODES)
+                        raise
+                    self.rate_limiter.on_throttle()
+                    if attempt == self.max_retries:
+                        self._circuit_outcome(failed=True)
+                        raise
+                    delay = self.rate_limiter.backoff_delay(attempt, _retry_after_seconds(e))
+                    if call is not None:
+                        call['retries'] += 1
+                except BotoCoreError:
+                    # Connection failures and timeouts
+                    self._circuit_outcome(failed=True)
+                    raise
+            
+            # Back off outside the window so other calls can use the slot
+            time.sleep(delay)
+    
+    def _invoke_in_pool(self, body: Dict[str, Any],
+                        read_stream: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                        call: Optional[Dict[str, Any]] = None, model_id: Optional[str] = None) -> Any:
+        """_invoke_with_retries over the region pool, failing over to another region on throttles and errors
+        
+        A retry goes to a different region when there is one, right away;
+        only once every region has had a try does it back off first. The
+        region that answered is recorded in call['region'].
+        """
+        
+        pool = self.region_pool
+        region = None
+        for attempt in range(self.max_retries + 1):
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.allow(retry=attempt > 0)
+            region = pool.choose(avoid=region)
+            limiter = region['limiter']
+            with limiter.slot():
+                start = time.monotonic()
+                try:
+                    runtime = region['runtime']
+                    invoke = runtime.invoke_model if read_stream is None else runtime.invoke_model_with_response_stream
+                    response = invoke(
+                        modelId=pool.model_id(region, model_id or self.model_id),
+                        body=json.dumps(body)
+                    )
+                    latency = time.monotonic() - start
+                    response = self._read_answer(response, read_stream,
+                                                 lambda: pool.on_success(region, latency))
+                except StreamInterruptedError as e:
+                    if e.code in THROTTLING_ERROR_CODES:
+                        pool.on_throttle(region)
+                    elif e.code in FAILOVER_ERROR_CODES:
+                        pool.on_error(region)
+                    self._circuit_outcome(failed=e.code in THROTTLING_ERROR_CODES | FAILOVER_ERROR_CODES)
+                    raise
+                except ClientError as e:
+                    code = e.response.get('Error', {}).get('Code')
+                    if code in THROTTLING_ERROR_CODES:
+                        pool.on_throttle(region)
+                    elif code in FAILOVER_ERROR_CODES:
+                        pool.on_error(region)
+                        self._circuit_outcome(failed=True)
+                    else:
+                        self._circuit_outcome(failed=False)
+                        raise
+                    if attempt == self.max_retries:
+                        if code in THROTTLING_ERROR_CODES:
+                            self._circuit_outcome(failed=True)
+                        raise
+                    delay = limiter.backoff_delay(attempt, _retry_after_seconds(e))
+                except BotoCoreError:
+                    # Connection and read failures: the endpoint itself is unhealthy
+                    pool.on_error(region)
+                    self._circuit_outcome(failed=True)
+                    if attempt == self.max_retries:
+                        raise
+                    delay = limiter.backoff_delay(attempt)
+                else:
+                    pool.on_success(region, latency)
+                    self._circuit_outcome(failed=False)
+                    if call is not None:
+                        call['region'] = region['name']
+                    return response
+                if call is not None:
+                    call['retries'] += 1
+            
+            if attempt + 1 >= len(pool.regions):
+                time.sleep(delay)
+    
+    def _read_answer(self, response: Dict[str, Any], read_stream: Optional[Callable[[Dict[str, Any]], Any]],
+                     on_answered: Callable[[], None]) -> Any:
+        """read_stream(response) when streaming, else the response itself
+        
+        Bedrock errors raised while reading go to the caller's retry handling.
+        Any other error came from the reader stopping a stream Bedrock was
+        answering, so on_answered and the circuit breaker record the answer
+        before it is raised.
+        """
+        if read_stream is None:
+            return response
+        try:
+            return read_stream(response)
+        except (ClientError, BotoCoreError, StreamInterruptedError):
+            raise
+        except Exception:
+            on_answered()
+            self._circuit_outcome(failed=False)
+            raise
+    
+    def _circuit_outcome(self, failed: bool):
+        """Tell the circuit breaker whether Bedrock failed a call or answered it"""
+        if self.circuit_breaker is None:
+            return
+        if failed:
+            self.circuit_breaker.on_failure()
+        else:
+            self.circuit_breaker.on_success()
+    
+    def _record_usage(self, usage: Dict[str, Any]):
+        """Add a response's token usage, including prompt cache reads and writes, to the totals"""
+        with self._usage_lock:
+            self.usage_totals['calls'] += 1
+            for field in ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens'):
+                self.usage_totals[field] += usage.get(field) or 0
+    
+    def get_usage_summary(self) -> Dict[str, Any]:
+        """Get token totals and how much of the prompt was served from Bedrock's prompt cache"""
+        with self._usage_lock:
+            summary = dict(self.usage_totals)
+        
+        prompt_tokens = (summary['input_tokens'] + summary['cache_read_input_tokens']
+                         + summary['cache_creation_input_tokens'])
+        summary['prompt_cache_hit_rate'] = (
+            round(summary['cache_read_input_tokens'] / prompt_tokens * 100, 1) if prompt_tokens else 0
+        )
+        return summary
+    
+    def get_run_report(self) -> Dict[str, Any]:
+        """Get latency percentiles, token totals and estimated cost over every call so far"""
+        return self.call_metrics.get_report(baseline_model_id=self.model_id)
+    
+    def get_region_metrics(self) -> Optional[List[Dict[str, Any]]]:
+        """Get per-region calls, throttles and errors, or None without a region pool"""
+        return self.region_pool.get_metrics() if self.region_pool is not None else None
+    
+    def get_rate_limiter_metrics(self) -> Dict[str, Any]:
+        """Get the rate limiter's current window and throttle counters"""
+        return self.rate_limiter.get_metrics()
+    
+    def extract_page_structure(self, page_content: str, doc_id: str, page_index: int) -> Optional[Dict[str, Any]]:
+        """Extract comprehensive structured JSON representation using master catalog"""
+        
+        try:
+            return self._analyze_page(page_content, doc_id, page_index)
+        except PageExtractionError as e:
+            st.error(str(e))
+            if e.raw_response:
+                st.error(f"Raw response: {e.raw_response[:500]}...")
+        except BedrockError as e:
+            st.error(str(e))
+        except Exception as e:
+            st.error(f"Error calling Claude: {str(e)}")
         
         return None
     
+    def extract_pages(self, pages: Iterable[Tuple[str, str, int]], max_concurrency: Optional[int] = None,
+                      on_page_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+                      pack_token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Analyze many pages concurrently, returning one result per page in input order
+        
+        pages yields (page_content, doc_id, page_index) tuples and may be a
+        generator: each page is submitted as soon as it is produced, so parsing
+        and analysis overlap. The rate limiter may hold the number of calls
+        actually in flight below max_concurrency while Bedrock is throttling.
+        Each result is a dict with doc_id, page_index, page_json (None on
+        failure) and error (None on success).
+        on_page_done is called on the calling thread for each result, in order.
+        
+        With pack_token_budget, consecutive short pages are packed into one
+        request until their estimated page tokens reach the budget; pages
+        whose packed answer cannot be used fall back to single-page calls.
+        """
+        
+        max_concurrency = max(1, max_concurrency or self.max_concurrency)
+        if max_concurrency > self.pool_size:
+            self.bedrock_runtime = self._create_runtime_client(max_concurrency)
+        
+        results = []
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="bedrock-page") as executor:
+            # (doc_id, page_index, future, position in pack or None)
+            submitted = []
+            pack = []
+            pack_tokens = 0
+            
+            def submit_pack():
+                if len(pack) == 1:
+                    page_content, doc_id, page_index = pack[0]
+                    future = executor.submit(self._analyze_page, page_content, doc_id, page_index)
+                    submitted.append((doc_id, page_index, future, None))
+                elif pack:
+                    future = executor.submit(self._analyze_page_pack, list(pack))
+                    for slot, (_, doc_id, page_index) in enumerate(pack):
+                        submitted.append((doc_id, page_index, future, slot))
+                pack.clear()
+            
+            for page in pages:
+                if not pack_token_budget:
+                    pack.append(page)
+                    submit_pack()
+                    continue
+                
+                page_tokens = estimate_tokens(page[0])
+                if pack and (pack_tokens + page_tokens > pack_token_budget or len(pack) >= MAX_PAGES_PER_PACK):
+                    submit_pack()
+                    pack_tokens = 0
+                pack.append(page)
+                pack_tokens += page_tokens
+            submit_pack()
+            
+            for doc_id, page_index, future, slot in submitted:
+                try:
+                    page_json, error = future.result(), None
+                    if slot is not None:
+                        page_json = page_json[slot]
+                        if isinstance(page_json, Exception):
+                            raise page_json
+                except Exception as e:
+                    page_json, error = None, str(e) or e.__class__.__name__
+                
+                result = {
+                    'doc_id': doc_id,
+                    'page_index': page_index,
+                    'page_json': page_json,
+                    'error': error
+                }
+                results.append(result)
+                if on_page_done:
+                    on_page_done(result)
+        
+        return results
+    
+    def get_packing_stats(self) -> Dict[str, Any]:
+        """Get how many pages were packed together and how many fell back to single calls"""
+        with self._usage_lock:
+            return dict(self.packing_stats)
+    
+    def _page_structure_system_prompt(self, full_catalog: bool = False) -> str:
+        """System prompt for page analysis, cached alongside the catalog it lists
+        
+        With catalog subsetting the catalog moves to each page's user prompt,
+        keeping this prompt identical across pages so it stays cacheable.
+        """
+        if self.catalog_top_k is not None and not full_catalog:
+            return self.catalog.get_prompt_rendering(
+                'page_structure_system_prompt_subset',
+                lambda: PAGE_STRUCTURE_SYSTEM_PROMPT.format(catalog_elements=CATALOG_SUBSET_NOTE)
+            )
+        return self.catalog.get_prompt_rendering(
+            'page_structure_system_prompt',
+            lambda: PAGE_STRUCTURE_SYSTEM_PROMPT.format(
+                catalog_elements=self.catalog.get_element_types_for_prompt()
+            )
+        )
+    
+    def _page_catalog_subset(self, page_content: str) -> str:
+        """Candidate catalog elements for one page, rendered for its user prompt"""
+        field_ids = self.catalog.get_selector().select(page_content, self.catalog_top_k)
+        return self.catalog.get_element_subset_for_prompt(field_ids)
+    
+    def _count_catalog_subset(self, page_content: str):
+        """Add a page's catalog subset to the totals, once per page however often its prompt is rebuilt"""
+        if self.catalog_top_k is None:
+            return
+        field_ids = self.catalog.get_selector().select(page_content, self.catalog_top_k)
+        subset_tokens = estimate_tokens(self.catalog.get_element_subset_for_prompt(field_ids))
+        with self._usage_lock:
+            self.catalog_subset_stats['pages'] += 1
+            self.catalog_subset_stats['candidates'] += len(field_ids)
+            self.catalog_subset_stats['subset_tokens'] += subset_tokens
+    
+    def get_catalog_subset_metrics(self) -> Dict[str, Any]:
+        """Get average candidates per page and prompt tokens saved against the full catalog list"""
+        full_tokens = estimate_tokens(self.catalog.get_element_types_for_prompt())
+        with self._usage_lock:
+            stats = dict(self.catalog_subset_stats)
+        
+        pages = stats['pages']
+        subset_tokens = stats['subset_tokens'] / pages if pages else None
+        return {
+            'pages': pages,
+            'catalog_elements': len(self.catalog.element_registry),
+            'avg_candidates': round(stats['candidates'] / pages, 1) if pages else None,
+            'full_catalog_tokens': full_tokens,
+            'avg_subset_tokens': round(subset_tokens, 1) if pages else None,
+            'token_reduction': round((1 - subset_tokens / full_tokens) * 100, 1) if pages and full_tokens else None
+        }
+    
+    def _page_user_prompt(self, page_content: str, doc_id: str, page_index: int,
+                          structured: Optional[bool] = None) -> str:
+        """User prompt asking for the structure of one page; structured overrides structured_output"""
+        task_prompt = self._page_task_prompt(page_content, doc_id, page_index, structured)
+        if self.catalog_top_k is not None:
+            return self._page_catalog_subset(page_content) + "\n" + task_prompt
+        return task_prompt
+    
+    def _page_task_prompt(self, page_content: str, doc_id: str, page_index: int,
+                          structured: Optional[bool] = None) -> str:
+        """The page content and the structure requested for it, with the contact pre-pass findings"""
+        if self.structured_output if structured is None else structured:
+            prompt = TOOL_PAGE_STRUCTURE_USER_PROMPT.format(
+                page_content=page_content,
+                doc_id=doc_id,
+                page_index=page_index,
+                guidelines=PAGE_STRUCTURE_GUIDELINES
+            )
+        else:
+            prompt = PAGE_STRUCTURE_USER_PROMPT.format(
+                page_content=page_content,
+                doc_id=doc_id,
+                page_index=page_index,
+                element_schema=PAGE_ELEMENT_SCHEMA,
+                guidelines=PAGE_STRUCTURE_GUIDELINES
+            )
+        hints = contact_hints(page_contacts(page_content)) if self.contact_prepass else None
+        return prompt + "\n\n" + hints if hints else prompt
+    
+    def build_page_request(self, page_content: str, doc_id: str, page_index: int,
+                           cache_system_prompt: bool = False) -> Dict[str, Any]:
+        """InvokeModel request body for one page, for callers that submit it themselves"""
+        self._count_catalog_subset(page_content)
+        return self._build_request_body(
+            self._page_structure_system_prompt(),
+            self._page_user_prompt(page_content, doc_id, page_index),
+            cache_system_prompt=cache_system_prompt,
+            tool=self._page_tool()
+        )
+    
+    def _page_tool(self) -> Optional[Dict[str, Any]]:
+        """The output-schema tool for page analysis, or None for the in-prompt JSON skeleton"""
+        return PAGE_STRUCTURE_TOOL if self.structured_output else None
+    
+    def parse_page_response(self, response: str, doc_id: str, page_index: int) -> Dict[str, Any]:
+        """Turn Claude's answer for one page into its page structure, raising PageExtractionError
+        
+        An answer that is not valid JSON keeps every element that was
+        generated completely; only an answer without any is an error.
+        """
+        try:
+            page_json = _parse_json_response(response)
+        except json.JSONDecodeError as e:
+            page_json = salvage_page_json(response)
+            if page_json is None:
+                raise PageExtractionError(
+                    f"Failed to parse JSON response for {doc_id} page {page_index}: {str(e)}",
+                    raw_response=response
+                )
+            logging.info(f"Salvaged {len(page_json.get('elements', []))} elements for {doc_id} page {page_index}")
+            with self._usage_lock:
+                self.recovery_stats['salvaged_pages'] += 1
+                self.recovery_stats['salvaged_elements'] += len(page_json.get('elements', []))
+        
+        # Tool calls may leave out the identifiers the prompt already carried
+        if isinstance(page_json, dict):
+            page_json.setdefault('doc_id', doc_id)
+            page_json.setdefault('page_index', page_index)
+        return page_json
+    
+    def _prepass_page(self, page_content: str, doc_id: str, page_index: int) -> Dict[str, Any]:
+        """Run the contact pre-pass on one page and count what it found (see prepass_page)"""
+        prepass = prepass_page(page_content, doc_id, page_index)
+        with self._usage_lock:
+            self.prepass_stats['pages'] += 1
+            self.prepass_stats['contacts'] += len(prepass['contacts'])
+            if prepass['page_json'] is not None:
+                self.prepass_stats['covered_pages'] += 1
+            elif prepass['contacts']:
+                self.prepass_stats['hinted_pages'] += 1
+        return prepass
+    
+    def _analyze_page(self, page_content: str, doc_id: str, page_index: int,
+                      prepass: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Extract the page structure, raising on call or parse failures
+        
+        With a hedger, an analysis that outlives the usual latency is started
+        a second time and the first valid structure wins; a streamed loser is
+        stopped, a non-streamed one finishes unread. While the circuit breaker
+        is open, or when it refuses or trips on one of the page's calls, the
+        page is extracted locally instead (see _heuristic_page).
+        
+        With single_flight, a page whose prompt (ignoring doc_id and
+        page_index) is already being analyzed waits for that analysis and
+        gets a copy of its structure under its own doc_id and page_index.
+        With contact_prepass, a page of nothing but contact details is
+        answered by the pre-pass alone; prepass is the page's pre-pass result
+        when the caller already ran it.
+        """
+        
+        contacts = []
+        if self.contact_prepass:
+            if prepass is None:
+                prepass = self._prepass_page(page_content, doc_id, page_index)
+            contacts = prepass['contacts']
+            if prepass['page_json'] is not None:
+                return prepass['page_json']
+        
+        if self.circuit_breaker is not None and self.circuit_breaker.is_open:
+            return self._heuristic_page(page_content, doc_id, page_index)
+        try:
+            if self.single_flight is None:
+                return self._analyze_page_once(page_content, doc_id, page_index, contacts)
+            page_json, shared = self.single_flight.do(
+                self._page_flight_key(page_content),
+                lambda: self._analyze_page_once(page_content, doc_id, page_index, contacts)
+            )
+            if shared:
+                logging.info(f"{doc_id} page {page_index} shared an identical page's analysis")
+                page_json = {**copy.deepcopy(page_json), 'doc_id': doc_id, 'page_index': page_index}
+            return page_json
+        except CircuitOpenError:
+            return self._heuristic_page(page_content, doc_id, page_index)
+        except Exception:
+            # The failure that tripped the breaker gets the fallback too
+            if self.circuit_breaker is None or self.circuit_breaker.state == CLOSED:
+                raise
+            return self._heuristic_page(page_content, doc_id, page_index)
+    
+    def _analyze_page_once(self, page_content: str, doc_id: str, page_index: int,
+                           contacts: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """One analysis of the page, hedged if there is a hedger, with the pre-pass contacts added back"""
+        if self.hedger is None:
+            page_json = self._route_page(page_content, doc_id, page_index)
+        else:
+            page_json = self.hedger.run(
+                lambda cancel, hedge: self._route_page(page_content, doc_id, page_index, cancel, hedge)
+            )
+        if contacts and isinstance(page_json, dict):
+            page_json = merge_contact_elements(page_json, contacts, page_index)
+        return page_json
+    
+    def _page_flight_key(self, page_content: str) -> str:
+        """Hash of what decides the page's answer, so repeated slides of any session match
+        
+        doc_id, page_index and the parser's page number markers are left out;
+        the model the page is routed to and the session's answer format are
+        kept, so pages only share analyses made the way they would be made.
+        """
+        model_id = self.router.route(page_content)[0] if self.router is not None else self.model_id
+        candidates = (self.catalog.get_selector().select(page_content, self.catalog_top_k)
+                      if self.catalog_top_k is not None else None)
+        return ResponseCache.make_key(model_id, {
+            'system': self._page_structure_system_prompt(),
+            'page': self._page_task_prompt(_PAGE_NUMBER_MARKER.sub('', page_content), '', 0),
+            'catalog_candidates': candidates,
+            'structured_output': self.structured_output,
+            'streaming': self.streaming
+        })
+    
+    def _heuristic_page(self, page_content: str, doc_id: str, page_index: int) -> Dict[str, Any]:
+        """Rule-based page structure for when Bedrock is not being called"""
+        logging.info(f"Circuit open, extracting {doc_id} page {page_index} locally")
+        with self._usage_lock:
+            self.heuristic_pages += 1
+        return heuristic_page_structure(page_content, doc_id, page_index)
+    
+    def get_prepass_metrics(self) -> Optional[Dict[str, Any]]:
+        """Get pages answered by the contact pre-pass alone and pages sent with its findings, or None without it"""
+        if not self.contact_prepass:
+            return None
+        with self._usage_lock:
+            return dict(self.prepass_stats)
+    
+    def get_single_flight_metrics(self) -> Optional[Dict[str, Any]]:
+        """Get calls made and identical requests that shared one in flight, or None without single_flight"""
+        return self.single_flight.get_metrics() if self.single_flight is not None else None
+    
+    def get_circuit_breaker_metrics(self) -> Optional[Dict[str, Any]]:
+        """Get the breaker's state, trips and refused calls with the pages extracted locally, or None without one"""
+        if self.circuit_breaker is None:
+            return None
+        with self._usage_lock:
+            heuristic_pages = self.heuristic_pages
+        return {**self.circuit_breaker.get_metrics(), 'heuristic_pages': heuristic_pages}
+    
+    def _route_page(self, page_content: str, doc_id: str, page_index: int,
+                    cancel: Optional[threading.Event] = None, hedge: bool = False) -> Dict[str, Any]:
+        """Extract the page structure with the model the router picks
+        
+        With a router, simple pages go to its cheaper model first and are
+        escalated to the strong model when that answer fails validation.
+        """
+        
+        tags = {'doc_id': doc_id, 'page_index': page_index}
+        if hedge:
+            tags['hedge'] = True
+        if self.router is not None:
+            model_id, tags['complexity'] = self.router.route(page_content)
+            tags['route'] = 'strong'
+            if model_id != self.model_id:
+                try:
+                    page_json = self._extract_with_model(page_content, doc_id, page_index, model_id,
+                                                         {**tags, 'route': 'simple'}, cancel)
+                    validate_page_structure(page_json, doc_id, page_index)
+                    return page_json
+                except HedgeCancelled:
+                    raise
+                except Exception as e:
+                    logging.info(f"Escalating {doc_id} page {page_index} to {self.model_id}: {str(e)}")
+                    tags['route'] = 'escalated'
+        
+        page_json = self._extract_with_model(page_content, doc_id, page_index, self.model_id, tags, cancel)
+        if self.hedger is not None:
+            # Only a valid structure may win a hedged race
+            validate_page_structure(page_json, doc_id, page_index)
+        return page_json
+    
+    def _extract_with_model(self, page_content: str, doc_id: str, page_index: int, model_id: str,
+                            tags: Dict[str, Any], cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Extract the page structure with one model, streamed or not; a set cancel stops it"""
+        
+        if cancel is not None and cancel.is_set():
+            raise HedgeCancelled(f"{doc_id} page {page_index} was answered by the other attempt")
+        if self.streaming:
+            return self.stream_page_structure(page_content, doc_id, page_index, model_id=model_id, tags=tags,
+                                              cancel=cancel)
+        
+        # Rendered once per catalog version, then a constant-time lookup
+        system_prompt = self._page_structure_system_prompt()
+        user_prompt = self._page_user_prompt(page_content, doc_id, page_index)
+        self._count_catalog_subset(page_content)
+        
+        # The system prompt is identical for every page, so it is the cache point
+        max_tokens, budget_tags = self._page_budget(page_content)
+        response_meta = {}
+        response = self._invoke_claude(
+            system_prompt, user_prompt, max_tokens, cache_system_prompt=True,
+            tags={'operation': 'page_structure', **tags, **budget_tags}, model_id=model_id,
+            tool=self._page_tool(), response_meta=response_meta
+        )
+        if (response_meta['stop_reason'] == 'max_tokens' and not _is_partial_json(response)
+                and self.output_budget is not None and max_tokens < self.output_budget.ceiling):
+            # A cut-off tool call leaves nothing to continue from; ask again with more room
+            max_tokens = self.output_budget.escalate(max_tokens)
+            response = self._invoke_claude(
+                system_prompt, user_prompt, max_tokens, cache_system_prompt=True,
+                tags={'operation': 'page_structure', **tags, **budget_tags, 'escalated': True}, model_id=model_id,
+                tool=self._page_tool(), response_meta=response_meta
+            )
+        if (response_meta['stop_reason'] == 'max_tokens' and not _is_partial_json(response)
+                and self._page_tool() is not None):
+            # Still cut off with nothing to continue from; a prompt-mode answer leaves partial text to continue
+            response = self._invoke_claude(
+                system_prompt, self._page_user_prompt(page_content, doc_id, page_index, structured=False),
+                max_tokens, cache_system_prompt=True,
+                tags={'operation': 'page_structure', **tags}, model_id=model_id,
+                response_meta=response_meta
+            )
+        if response_meta['stop_reason'] == 'max_tokens':
+            response = self._continue_page(response, page_content, doc_id, page_index, model_id, tags,
+                                           max_tokens=max_tokens)
+        
+        page_json = self.parse_page_response(response, doc_id, page_index)
+        validate_page_structure(page_json, doc_id, page_index)
+        return page_json
+    
+    def _continue_page(self, partial: str, page_content: str, doc_id: str, page_index: int,
+                       model_id: Optional[str], tags: Optional[Dict[str, Any]],
+                       on_text: Optional[Callable[[str], None]] = None, max_tokens: int = 4000) -> str:
+        """Complete a page answer cut off at max_tokens by asking Claude to carry on from it
+        
+        The partial answer is sent back as the start of Claude's reply
+        (an assistant prefill), so only the missing remainder is generated.
+        A forced tool call cannot be prefilled; its partial input is continued
+        as plain JSON text under the in-prompt schema instead. on_text
+        receives the continued text. Answers without a usable partial (empty,
+        or already complete JSON) are returned unchanged. With an
+        output_budget, each continuation escalates max_tokens.
+        """
+        
+        with self._usage_lock:
+            self.recovery_stats['truncated_responses'] += 1
+        if not _is_partial_json(partial) or self.max_continuations <= 0:
+            return partial
+        
+        system_prompt = self._page_structure_system_prompt()
+        user_prompt = self._page_user_prompt(page_content, doc_id, page_index, structured=False)
+        text = partial
+        for _ in range(self.max_continuations):
+            if self.output_budget is not None:
+                max_tokens = self.output_budget.escalate(max_tokens)
+            response_meta = {}
+            text = text.rstrip()
+            continuation = self._invoke_claude(
+                system_prompt, user_prompt, max_tokens, cache_system_prompt=True,
+                tags={'doc_id': doc_id, 'page_index': page_index, **(tags or {}),
+                      'operation': 'page_continuation', 'escalated': self.output_budget is not None},
+                model_id=model_id, prefill=text, response_meta=response_meta
+            )
+            with self._usage_lock:
+                self.recovery_stats['continuations'] += 1
+            text += continuation
+            if on_text is not None:
+                on_text(continuation)
+            if response_meta['stop_reason'] != 'max_tokens':
+                break
+        
+        with self._usage_lock:
+            self.recovery_stats['continued_pages'] += 1
+        return text
+    
+    def _page_budget(self, page_content: str) -> Tuple[int, Dict[str, Any]]:
+        """max_tokens for a page call, and the output estimate to log with it for calibration"""
+        if self.output_budget is None:
+            return DEFAULT_MAX_TOKENS, {}
+        max_tokens, estimate = self.output_budget.budget(page_content)
+        return max_tokens, {'output_estimate': estimate}
+    
+    def get_output_budget_metrics(self) -> Optional[Dict[str, Any]]:
+        """Get per-page max_tokens sizing figures, or None without an output budget
+        
+        The output budget may be shared between clients, so the budgets and
+        escalations are counted from this client's call records; only the
+        calibration comes from the budget itself.
+        """
+        if self.output_budget is None:
+            return None
+        calls = self.call_metrics.get_calls()
+        budgets = [call['max_tokens'] for call in calls
+                   if call['output_estimate'] is not None and not call['escalated']]
+        calibration = self.output_budget.get_metrics()
+        return {
+            'budgets': len(budgets),
+            'avg_max_tokens': round(sum(budgets) / len(budgets), 1) if budgets else None,
+            'escalations': sum(1 for call in calls if call['escalated']),
+            'samples': calibration['samples'],
+            'calibration_factor': calibration['calibration_factor'],
+            'reserved_tokens_saved': len(budgets) * DEFAULT_MAX_TOKENS - sum(budgets)
+        }
+    
+    def get_hedging_metrics(self) -> Optional[Dict[str, Any]]:
+        """Get the hedge rate and tail latency with and without hedging, or None without a hedger"""
+        return self.hedger.get_metrics() if self.hedger is not None else None
+    
+    def get_recovery_metrics(self) -> Dict[str, Any]:
+        """Get counts of truncated answers, continuation calls and pages salvaged from broken JSON"""
+        with self._usage_lock:
+            return dict(self.recovery_stats)
+    
+    def stream_page_structure(self, page_content: str, doc_id: str, page_index: int,
+                              on_element: Optional[Callable[[Dict[str, Any]], None]] = None,
+                              model_id: Optional[str] = None,
+                              tags: Optional[Dict[str, Any]] = None,
+                              cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Extract the page structure from a streamed response, handing over each element as it completes
+        
+        on_element is called (on this thread) with every entry of "elements"
+        as soon as it has been generated. A response that stops looking like
+        page-structure JSON aborts the stream early with PageExtractionError;
+        setting cancel closes the stream with HedgeCancelled.
+        """
+        
+        parser = ElementStreamParser()
+        start = time.monotonic()
+        first_element = []
+        
+        def on_text(chunk: str):
+            if cancel is not None and cancel.is_set():
+                raise HedgeCancelled(f"{doc_id} page {page_index} was answered by the other attempt")
+            for element in parser.feed(chunk):
+                if not first_element:
+                    first_element.append(time.monotonic() - start)
+                if on_element:
+                    on_element(element)
+        
+        max_tokens, budget_tags = self._page_budget(page_content)
+        self._count_catalog_subset(page_content)
+        try:
+            response_meta = {}
+            response = self._invoke_claude(
+                self._page_structure_system_prompt(),
+                self._page_user_prompt(page_content, doc_id, page_index),
+                max_tokens,
+                cache_system_prompt=True,
+                on_text=on_text,
+                tags={'operation': 'page_structure_stream', 'doc_id': doc_id, 'page_index': page_index,
+                      **(tags or {}), **budget_tags},
+                model_id=model_id,
+                tool=self._page_tool(),
+                response_meta=response_meta
+            )
+            if response_meta['stop_reason'] == 'max_tokens':
+                # The continuation feeds the same parser, so elements keep arriving in order
+                response = self._continue_page(response, page_content, doc_id, page_index, model_id, tags,
+                                               on_text=on_text, max_tokens=max_tokens)
+        except MalformedStreamError as e:
+            with self._usage_lock:
+                self.stream_stats['aborted_streams'] += 1
+            raise PageExtractionError(
+                f"Aborted malformed response for {doc_id} page {page_index}: {str(e)}",
+                raw_response=parser.text
+            )
+        
+        with self._usage_lock:
+            self.stream_stats['streamed_pages'] += 1
+            self.stream_stats['response_seconds'].append(time.monotonic() - start)
+            if first_element:
+                self.stream_stats['first_element_seconds'].append(first_element[0])
+        
+        return self.parse_page_response(response, doc_id, page_index)
+    
+    def get_streaming_metrics(self) -> Dict[str, Any]:
+        """Get streamed page counts and average time to first element versus the full response"""
+        with self._usage_lock:
+            stats = self.stream_stats
+            first_element = list(stats['first_element_seconds'])
+            response = list(stats['response_seconds'])
+            metrics = {
+                'streamed_pages': stats['streamed_pages'],
+                'aborted_streams': stats['aborted_streams']
+            }
+        
+        metrics['avg_time_to_first_element'] = (
+            round(sum(first_element) / len(first_element), 3) if first_element else None
+        )
+        metrics['max_time_to_first_element'] = round(max(first_element), 3) if first_element else None
+        metrics['avg_response_time'] = round(sum(response) / len(response), 3) if response else None
+        return metrics
+    
+    def _analyze_page_pack(self, pack: List[Tuple[str, str, int]]) -> List[Union[Dict[str, Any], Exception]]:
+        """Analyze several short pages in one request and split the answer back per page
+        
+        Returns one entry per page in pack order: the page structure, or the
+        exception raised by its single-page fallback. Pages missing from the
+        packed answer, or whose entry is not a usable page object, are retried
+        on their own. With contact_prepass, pages the pre-pass covers are left
+        out of the request, and the others carry their contact hints.
+        """
+        
+        prepasses = [self._prepass_page(*page) if self.contact_prepass else None for page in pack]
+        results: Dict[int, Union[Dict[str, Any], Exception]] = {}
+        slots = []
+        for slot, prepass in enumerate(prepasses):
+            if prepass is not None and prepass['page_json'] is not None:
+                results[slot] = prepass['page_json']
+            else:
+                slots.append(slot)
+        
+        packed_pages = {}
+        if len(slots) > 1:
+            pages_block = "\n\n".join(
+                f'=== PAGE doc_id="{pack[slot][1]}" page_index={pack[slot][2]} ===\n'
+                f'{self._packed_page_content(pack[slot][0], prepasses[slot])}\n=== END PAGE ==='
+                for slot in slots
+            )
+            user_prompt = PACKED_PAGES_USER_PROMPT.format(
+                page_count=len(slots),
+                pages_block=pages_block,
+                element_schema=textwrap.indent(PAGE_ELEMENT_SCHEMA, '    '),
+                guidelines=PAGE_STRUCTURE_GUIDELINES
+            )
+            
+            try:
+                response = self._invoke_claude(
+                    self._page_structure_system_prompt(full_catalog=True), user_prompt,
+                    max_tokens=PACKED_MAX_TOKENS, cache_system_prompt=True,
+                    tags={'operation': 'packed_pages', 'doc_id': pack[slots[0]][1],
+                          'page_index': f"{pack[slots[0]][2]}-{pack[slots[-1]][2]}"}
+                )
+                parsed = _parse_json_response(response)
+                entries = parsed.get('pages', []) if isinstance(parsed, dict) else parsed
+                for entry in entries if isinstance(entries, list) else []:
+                    if isinstance(entry, dict) and isinstance(entry.get('elements'), list):
+                        packed_pages[(str(entry.get('doc_id')), str(entry.get('page_index')))] = entry
+            except Exception:
+                # Nothing usable came back; every page falls back below
+                packed_pages = {}
+            
+            with self._usage_lock:
+                self.packing_stats['packed_requests'] += 1
+                self.packing_stats['packed_pages'] += len(slots)
+        
+        for slot in slots:
+            page_content, doc_id, page_index = pack[slot]
+            page_json = packed_pages.get((str(doc_id), str(page_index)))
+            if page_json is not None:
+                page_json['doc_id'], page_json['page_index'] = doc_id, page_index
+                if prepasses[slot] is not None:
+                    merge_contact_elements(page_json, prepasses[slot]['contacts'], page_index)
+                results[slot] = page_json
+                continue
+            
+            if len(slots) > 1:
+                with self._usage_lock:
+                    self.packing_stats['fallback_pages'] += 1
+            try:
+                results[slot] = self._analyze_page(page_content, doc_id, page_index, prepass=prepasses[slot])
+            except Exception as e:
+                results[slot] = e
+        
+        return [results[slot] for slot in range(len(pack))]
+    
+    @staticmethod
+    def _packed_page_content(page_content: str, prepass: Optional[Dict[str, Any]]) -> str:
+        """A page's content for a packed request, with its contact pre-pass findings"""
+        hints = contact_hints(prepass['contacts']) if prepass is not None else None
+        return page_content + "\n\n" + hints if hints else page_content
+    
     def suggest_page_types(self, page_summaries: list) -> Optional[Dict[str, Any]]:
         """Use Claude to suggest page type classifications"""
         
@@ -234,17 +1441,11 @@ Return JSON with suggested page types:
   ]
 }}"""
         
-        response = self._call_claude(system_prompt, user_prompt)
+        response = self._call_claude(system_prompt, user_prompt, tags={'operation': 'page_types'})
         
         if response:
             try:
-                response = response.strip()
-                if response.startswith('```json'):
-                    response = response[7:]
-                if response.endswith('```'):
-                    response = response[:-3]
-                
-                return json.loads(response)
+                return _parse_json_response(response)
             except json.JSONDecodeError:
                 return None
         
@@ -262,3 +1463,129 @@ Return JSON with suggested page types:
             all_detected_elements.extend(page_data.get('elements', []))
         
         return self.catalog.analyze_catalog_coverage(all_detected_elements)
+
+
+def _retry_after_seconds(error: ClientError) -> Optional[float]:
+    """Read a Retry-After hint (in seconds) from a throttling response, if present"""
+    headers = error.response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+    value = headers.get('retry-after') or headers.get('x-amzn-retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _read_response_stream(response: Dict[str, Any], on_text: Callable[[str], None]) -> Dict[str, Any]:
+    """Consume an invoke_model_with_response_stream body into the shape invoke_model returns
+    
+    on_text receives text deltas and, for tool calls, the partial JSON of the
+    tool input as it is generated. An error event after on_text received
+    output raises StreamInterruptedError.
+    """
+    blocks: Dict[int, Dict[str, Any]] = {}
+    parts: Dict[int, List[str]] = {}
+    response_body = {'content': [], 'stop_reason': None, 'usage': {}}
+    stream = response['body']
+    
+    try:
+        for event in stream:
+            if 'chunk' not in event:
+                continue
+            chunk = json.loads(event['chunk']['bytes'])
+            
+            if chunk['type'] == 'message_start':
+                response_body['usage'].update(chunk['message'].get('usage', {}))
+            elif chunk['type'] == 'content_block_start':
+                blocks[chunk['index']] = dict(chunk['content_block'])
+            elif chunk['type'] == 'content_block_delta':
+                delta = chunk['delta']
+                piece = delta.get('text') if delta.get('type') == 'text_delta' else delta.get('partial_json')
+                if piece is None:
+                    continue
+                blocks.setdefault(chunk.get('index', 0), {'type': 'text'})
+                parts.setdefault(chunk.get('index', 0), []).append(piece)
+                on_text(piece)
+            elif chunk['type'] == 'message_delta':
+                response_body['stop_reason'] = chunk['delta'].get('stop_reason')
+                response_body['usage'].update(chunk.get('usage', {}))
+    except ClientError as e:
+        # An error event mid-stream, e.g. a throttle; a retry would hand on_text the output again
+        if parts:
+            raise StreamInterruptedError(f"Bedrock stream failed after output was delivered: {e}",
+                                         e.response.get('Error', {}).get('Code')) from e
+        raise
+    finally:
+        # Stop reading (and paying for) a generation we abandoned
+        if hasattr(stream, 'close'):
+            stream.close()
+    
+    for index in sorted(blocks):
+        block = blocks[index]
+        streamed = ''.join(parts.get(index, []))
+        if block['type'] == 'tool_use':
+            try:
+                block['input'] = json.loads(streamed) if streamed else {}
+            except json.JSONDecodeError:
+                # Cut off mid-generation; keep what arrived for the caller to inspect
+                block['input'] = None
+                block['partial_json'] = streamed
+        else:
+            block['text'] = streamed
+        response_body['content'].append(block)
+    return response_body
+
+
+def response_output_text(response_body: Dict[str, Any]) -> Optional[str]:
+    """Claude's answer as text: the input of its tool call as JSON, else its first text block"""
+    content = response_body.get('content') or []
+    for block in content:
+        if block.get('type') == 'tool_use':
+            return json.dumps(block['input']) if block.get('input') is not None else block.get('partial_json', '')
+    if content and 'text' in content[0]:
+        return content[0]['text']
+    return None
+
+
+def validate_page_structure(page_json: Any, doc_id: str, page_index: int):
+    """Raise PageExtractionError unless page_json has the shape page analysis promises"""
+    problem = None
+    if not isinstance(page_json, dict):
+        problem = "response is not a JSON object"
+    elif not isinstance(page_json.get('elements'), list):
+        problem = "missing elements array"
+    elif not all(isinstance(element, dict) and isinstance(element.get('type'), str)
+                 for element in page_json['elements']):
+        problem = "every element needs a type"
+    
+    if problem:
+        raise PageExtractionError(
+            f"Invalid page structure for {doc_id} page {page_index}: {problem}",
+            raw_response=json.dumps(page_json)
+        )
+
+
+def _parse_json_response(response: str) -> Any:
+    """Strip markdown code fences from Claude's answer and parse the JSON inside"""
+    response = response.strip()
+    if response.startswith('```json'):
+        response = response[7:]
+    if response.endswith('```'):
+        response = response[:-3]
+    
+    return json.loads(response)
+
+
+def _is_partial_json(text: str) -> bool:
+    """True for an answer with text that does not parse yet, i.e. one a continuation can complete"""
+    if not text.strip():
+        return False
+    try:
+        _parse_json_response(text)
+        return False
+    except json.JSONDecodeError:
+        return True
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about four characters per token)"""
+    return len(text) // 4 + 1
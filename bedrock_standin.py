@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Bedrock Stand-in Module for Master Template System
+Deterministic local bedrock-runtime server for offline load, latency and failure testing
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+from urllib.parse import unquote
+
+# Behaviour of the stand-in; every rate is a probability per request
+DEFAULT_SCENARIO = {
+    # fixed: median; uniform: low..high; lognormal: median and sigma (seconds)
+    'latency': {'distribution': 'fixed', 'median': 0.0, 'sigma': 0.5, 'low': 0.0, 'high': 0.0},
+    'first_token_share': 0.3,  # Part of a streamed response's latency spent before its first event
+    'throttle_rate': 0.0,
+    'max_in_flight': 0,  # Throttle requests beyond this many in flight (0 = unlimited)
+    'truncate_rate': 0.0,
+    'malformed_rate': 0.0,
+    'stream_chunk_chars': 24,
+    'seed': 0
+}
+
+MALFORMATIONS = ('trailing_comma', 'prose_preamble', 'cut_off')
+
+_PAGE_CONTENT = re.compile(r'PAGE CONTENT:\n(.*?)\n\n(?:Return a JSON object|Record the structure)', re.DOTALL)
+_TOOL_PAGE_ID = re.compile(r'structure of document "(.*?)", page (\d+)')
+_PROMPT_PAGE_ID = re.compile(r'"doc_id": "(.*?)",\s*"page_index": (\d+)')
+_PACKED_PAGE = re.compile(r'=== PAGE doc_id="(.*?)" page_index=(\d+) ===\n(.*?)\n=== END PAGE ===', re.DOTALL)
+_BULLET = re.compile(r'^(?:[-•▪●*]|\d+[.)])\s+')
+_EMAIL = re.compile(r'[\w.+-]+@[\w-]+\.[\w.]+')
+_URL = re.compile(r'\b(?:https?://|www\.)\S+', re.IGNORECASE)
+_PHONE = re.compile(r'(?:\+|\b00)\d[\d ()-]{7,}\d')
+
+
+def synthesize_page(page_content: str, doc_id: str, page_index: int) -> Dict[str, Any]:
+    """A page structure derived only from the page text, so equal pages always get equal answers"""
+    lines = [line.strip() for line in page_content.splitlines() if line.strip()]
+    elements: List[Dict[str, Any]] = []
+
+    def add(element_type: str, category: str, importance: str, pii_type: str = 'NONE', **fields):
+        elements.append({
+            'element_id': f"e{len(elements) + 1}", 'type': element_type, 'category': category,
+            'importance': importance, **fields, 'pii_type': pii_type
+        })
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if _BULLET.match(line):
+            items = []
+            while i < len(lines) and _BULLET.match(lines[i]):
+                items.append(_BULLET.sub('', lines[i]))
+                i += 1
+            add('bullet_list', 'main_body', 'important', items=items)
+            continue
+        if ' | ' in line:
+            rows = []
+            while i < len(lines) and ' | ' in lines[i]:
+                rows.append([cell.strip() for cell in lines[i].split(' | ')])
+                i += 1
+            add('table', 'supporting', 'important', table={'headers': rows[0], 'rows': rows[1:]})
+            continue
+
+        if not elements and len(line) <= 80:
+            add('title' if page_index == 1 else 'heading', 'front_matter' if page_index == 1 else 'main_body',
+                'critical', text=line)
+        elif _EMAIL.search(line) or _PHONE.search(line):
+            add('contact_information', 'end_matter', 'important', text=line,
+                pii_type='EMAIL' if _EMAIL.search(line) else 'PHONE')
+        elif _URL.search(line):
+            add('hyperlink', 'supporting', 'optional', text=line, pii_type='URL')
+        else:
+            add('paragraph', 'main_body', 'important', text=line)
+        i += 1
+
+    for position, element in enumerate(elements):
+        element['position_hint'] = 'top' if position == 0 else ('bottom' if position == len(elements) - 1
+                                                                else 'middle')
+    return {
+        'doc_id': doc_id,
+        'page_index': page_index,
+        'page_role': 'cover' if page_index == 1 else 'main_content',
+        'elements': elements
+    }
+
+
+def synthesize_answer(user_prompt: str) -> Dict[str, Any]:
+    """The JSON answer for a prompt of this app: page, packed pages or page types"""
+    packed = _PACKED_PAGE.findall(user_prompt)
+    if packed:
+        return {'pages': [synthesize_page(content, doc_id, int(index)) for doc_id, index, content in packed]}
+
+    content = _PAGE_CONTENT.search(user_prompt)
+    if content:
+        page_id = _TOOL_PAGE_ID.search(user_prompt) or _PROMPT_PAGE_ID.search(user_prompt)
+        doc_id, page_index = (page_id.group(1), int(page_id.group(2))) if page_id else ('doc_1', 1)
+        return synthesize_page(content.group(1), doc_id, page_index)
+
+    if 'page type classifications' in user_prompt:
+        return {'page_types': [
+            {'page_type': 'cover', 'description': 'Cover page', 'typical_elements': ['title']},
+            {'page_type': 'content', 'description': 'Content page', 'typical_elements': ['heading', 'paragraph']}
+        ]}
+    return {}
+
+
+def _message_text(content: Any) -> str:
+    """Text of a message whose content is a string or a list of blocks"""
+    if isinstance(content, str):
+        return content
+    return ''.join(block.get('text', '') for block in content if isinstance(block, dict))
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def encode_event(payload: Dict[str, Any]) -> bytes:
+    """One application/vnd.amazon.eventstream message carrying a bedrock-runtime chunk event"""
+    headers = b''
+    for name, value in ((':event-type', 'chunk'), (':content-type', 'application/json'),
+                        (':message-type', 'event')):
+        name_bytes, value_bytes = name.encode('utf-8'), value.encode('utf-8')
+        headers += struct.pack('!B', len(name_bytes)) + name_bytes
+        headers += struct.pack('!BH', 7, len(value_bytes)) + value_bytes
+    body = json.dumps({'bytes': base64.b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')})
+    body = body.encode('utf-8')
+
+    total_length = 12 + len(headers) + len(body) + 4
+    prelude = struct.pack('!II', total_length, len(headers))
+    prelude += struct.pack('!I', zlib.crc32(prelude) & 0xffffffff)
+    message = prelude + headers + body
+    return message + struct.pack('!I', zlib.crc32(message) & 0xffffffff)
+
+
+class BedrockStandIn:
+    def __init__(self, scenario: Optional[Dict[str, Any]] = None, host: str = '127.0.0.1', port: int = 0):
+        """Local InvokeModel / InvokeModelWithResponseStream endpoint answering like Claude on Bedrock
+
+        Answers are synthesized from the prompt (see synthesize_answer).
+        scenario overrides DEFAULT_SCENARIO: latency distribution, throttling,
+        truncation and malformed-JSON injection. Every random choice is
+        seeded by the scenario seed, the request body and how often that body
+        was seen before, so a run replays identically while retries of the
+        same request can still get a different outcome.
+        """
+        self.scenario = {**DEFAULT_SCENARIO, **(scenario or {})}
+        self.scenario['latency'] = {**DEFAULT_SCENARIO['latency'], **self.scenario['latency']}
+        self.host = host
+        self.port = port
+
+        self.stats = {'requests': 0, 'streamed': 0, 'throttled': 0, 'truncated': 0, 'malformed': 0}
+        self.in_flight = 0
+        self._seen: Dict[str, int] = {}
+        self._prompt_cache = set()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def endpoint_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> str:
+        """Serve on a background thread; returns the endpoint_url to give BedrockClient"""
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                standin._serve(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.endpoint_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> 'BedrockStandIn':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
+
+    def _serve(self, handler: BaseHTTPRequestHandler):
+        """Route one HTTP request to invoke or invoke-with-response-stream"""
+        match = re.match(r'^/model/([^/]+)/(invoke|invoke-with-response-stream)$', handler.path)
+        body = handler.rfile.read(int(handler.headers.get('Content-Length', 0)))
+        if not match:
+            return self._send_error(handler, 404, 'UnknownOperationException', 'Unknown operation')
+        try:
+            request = json.loads(body)
+        except json.JSONDecodeError:
+            return self._send_error(handler, 400, 'ValidationException', 'Malformed input request')
+
+        rng = self._rng(body)
+        with self._lock:
+            self.stats['requests'] += 1
+            over_capacity = self.scenario['max_in_flight'] and self.in_flight >= self.scenario['max_in_flight']
+            throttled = over_capacity or rng.random() < self.scenario['throttle_rate']
+            if throttled:
+                self.stats['throttled'] += 1
+            else:
+                self.in_flight += 1
+        if throttled:
+            return self._send_error(handler, 429, 'ThrottlingException',
+                                    'Too many requests, please wait before trying again.')
+
+        try:
+            model_id = unquote(match.group(1))
+            response_body, stream_text = self._answer(model_id, request, rng)
+            latency = self._latency(rng)
+            if match.group(2) == 'invoke':
+                time.sleep(latency)
+                payload = json.dumps(response_body).encode('utf-8')
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'application/json')
+                handler.send_header('Content-Length', str(len(payload)))
+                handler.end_headers()
+                handler.wfile.write(payload)
+            else:
+                with self._lock:
+                    self.stats['streamed'] += 1
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'application/vnd.amazon.eventstream')
+                handler.end_headers()
+                events = list(self._stream_events(response_body, stream_text))
+                time.sleep(latency * self.scenario['first_token_share'])
+                gap = latency * (1 - self.scenario['first_token_share']) / max(1, len(events) - 1)
+                for i, event in enumerate(events):
+                    if i:
+                        time.sleep(gap)
+                    handler.wfile.write(encode_event(event))
+                    handler.wfile.flush()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _send_error(self, handler: BaseHTTPRequestHandler, status: int, code: str, message: str):
+        payload = json.dumps({'message': message}).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('x-amzn-ErrorType', f"{code}:http://internal.amazon.com/coral/com.amazon.bedrock/")
+        handler.send_header('Content-Length', str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _rng(self, body: bytes) -> random.Random:
+        """Random source fixed by the seed, the request and how often it was sent before"""
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            occurrence = self._seen.get(digest, 0)
+            self._seen[digest] = occurrence + 1
+        return random.Random(f"{self.scenario['seed']}:{digest}:{occurrence}")
+
+    def _latency(self, rng: random.Random) -> float:
+        latency = self.scenario['latency']
+        if latency['distribution'] == 'uniform':
+            return rng.uniform(latency['low'], latency['high'])
+        if latency['distribution'] == 'lognormal' and latency['median'] > 0:
+            return rng.lognormvariate(math.log(latency['median']), latency['sigma'])
+        return latency['median']
+
+    def _answer(self, model_id: str, request: Dict[str, Any], rng: random.Random) -> Tuple[Dict[str, Any], str]:
+        """The response body, and the text a stream of it carries
+
+        A prefilled (final assistant) turn is continued: only the part of the
+        answer after it is returned. Truncation cuts the answer at
+        max_tokens, or part way through when injected by truncate_rate.
+        """
+        messages = request.get('messages', [])
+        user_prompt = _message_text(messages[0]['content']) if messages else ''
+        prefill = _message_text(messages[-1]['content']) if messages and messages[-1]['role'] == 'assistant' else ''
+        text = json.dumps(synthesize_answer(user_prompt))
+        if prefill and text.startswith(prefill):
+            text = text[len(prefill):]
+
+        stop_reason = 'end_turn'
+        if rng.random() < self.scenario['malformed_rate']:
+            text = self._malform(text, rng)
+            with self._lock:
+                self.stats['malformed'] += 1
+        max_chars = request.get('max_tokens', 4096) * 4
+        if rng.random() < self.scenario['truncate_rate']:
+            max_chars = min(max_chars, int(len(text) * rng.uniform(0.3, 0.8)))
+        if len(text) > max_chars:
+            text, stop_reason = text[:max_chars], 'max_tokens'
+            with self._lock:
+                self.stats['truncated'] += 1
+
+        tools = request.get('tools') or []
+        content: Dict[str, Any] = {'type': 'text', 'text': text}
+        if tools and not prefill:
+            try:
+                tool_input = json.loads(text) if stop_reason != 'max_tokens' else {}
+                content = {'type': 'tool_use', 'id': f"toolu_standin_{rng.getrandbits(48):012x}",
+                           'name': tools[0]['name'], 'input': tool_input}
+                stop_reason = 'tool_use' if stop_reason == 'end_turn' else stop_reason
+            except json.JSONDecodeError:
+                pass
+
+        return {
+            'id': f"msg_standin_{rng.getrandbits(48):012x}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': model_id,
+            'content': [content],
+            'stop_reason': stop_reason,
+            'stop_sequence': None,
+            'usage': self._usage(request, text)
+        }, text
+
+    def _malform(self, text: str, rng: random.Random) -> str:
+        kind = rng.choice(MALFORMATIONS)
+        if kind == 'trailing_comma' and text.endswith(']}'):
+            return text[:-2] + ',]}'
+        if kind == 'prose_preamble':
+            return "Here is the structure of the page:\n" + text
+        return text[:len(text) // 2]
+
+    def _usage(self, request: Dict[str, Any], text: str) -> Dict[str, int]:
+        """Token usage with prompt cache reads and writes for cache_control system blocks"""
+        usage = {'input_tokens': 0, 'output_tokens': _tokens(text),
+                 'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0}
+        usage['input_tokens'] += sum(_tokens(_message_text(message['content']))
+                                     for message in request.get('messages', []))
+        tools = json.dumps(request['tools']) if request.get('tools') else ''
+        system = request.get('system', '')
+        if isinstance(system, str):
+            usage['input_tokens'] += _tokens(tools + system)
+            return usage
+        for block in system:
+            prefix = tools + block.get('text', '')
+            if 'cache_control' not in block:
+                usage['input_tokens'] += _tokens(prefix)
+                continue
+            with self._lock:
+                cached = prefix in self._prompt_cache
+                self._prompt_cache.add(prefix)
+            usage['cache_read_input_tokens' if cached else 'cache_creation_input_tokens'] += _tokens(prefix)
+        return usage
+
+    def _stream_events(self, response_body: Dict[str, Any], text: str) -> Iterator[Dict[str, Any]]:
+        """The chunk events Bedrock streams for a response body"""
+        usage = response_body['usage']
+        block = response_body['content'][0]
+        message = {key: value for key, value in response_body.items() if key not in ('content', 'usage')}
+        yield {'type': 'message_start', 'message': dict(message, content=[], stop_reason=None, usage={
+            key: value for key, value in usage.items() if key != 'output_tokens'
+        })}
+
+        if block['type'] == 'tool_use':
+            yield {'type': 'content_block_start', 'index': 0, 'content_block': dict(block, input={})}
+            delta_type, field = 'input_json_delta', 'partial_json'
+        else:
+            yield {'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}}
+            delta_type, field = 'text_delta', 'text'
+        size = self.scenario['stream_chunk_chars']
+        for i in range(0, len(text), size):
+            yield {'type': 'content_block_delta', 'index': 0, 'delta': {'type': delta_type, field: text[i:i + size]}}
+        yield {'type': 'content_block_stop', 'index': 0}
+        yield {'type': 'message_delta', 'delta': {'stop_reason': response_body['stop_reason'], 'stop_sequence': None},
+               'usage': {'output_tokens': usage['output_tokens']}}
+        yield {'type': 'message_stop', 'amazon-bedrock-invocationMetrics': {
+            'inputTokenCount': usage['input_tokens'], 'outputTokenCount': usage['output_tokens']
+        }}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description="Serve a deterministic local bedrock-runtime stand-in. Point the app at it with "
+                    "BEDROCK_ENDPOINT_URL=http://127.0.0.1:<port> (any AWS credentials will do)"
+    )
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--latency", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    arg_parser.add_argument("--median", type=float, default=1.0, help="Median (fixed/lognormal) latency in seconds")
+    arg_parser.add_argument("--sigma", type=float, default=0.5, help="Lognormal sigma")
+    arg_parser.add_argument("--low", type=float, default=0.5, help="Uniform lower bound in seconds")
+    arg_parser.add_argument("--high", type=float, default=2.0, help="Uniform upper bound in seconds")
+    arg_parser.add_argument("--throttle-rate", type=float, default=0.0)
+    arg_parser.add_argument("--max-in-flight", type=int, default=0)
+    arg_parser.add_argument("--truncate-rate", type=float, default=0.0)
+    arg_parser.add_argument("--malformed-rate", type=float, default=0.0)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    standin = BedrockStandIn({
+        'latency': {'distribution': args.latency, 'median': args.median, 'sigma': args.sigma,
+                    'low': args.low, 'high': args.high},
+        'throttle_rate': args.throttle_rate,
+        'max_in_flight': args.max_in_flight,
+        'truncate_rate': args.truncate_rate,
+        'malformed_rate': args.malformed_rate,
+        'seed': args.seed
+    }, host=args.host, port=args.port)
+    print(f"🛰️ Bedrock stand-in listening on {standin.start()}")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"  {standin.get_stats()}")
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
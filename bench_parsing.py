@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Parsing Benchmark
+Measures PDF extraction speedup from parallel worker processes
+"""
+
+import argparse
+import os
+import time
+
+import parsing
+from parsing import DocumentParser
+from sample_documents import build_sample_pdf, make_upload
+
+
+def build_benchmark_pdf(page_count: int, lines_per_page: int) -> bytes:
+    """Build a text-dense PDF resembling a long company profile"""
+    pages = []
+    for page in range(page_count):
+        lines = [
+            f"Page {page + 1} line {line + 1}: revenue 12.{line}M, growth {line % 9}%, offices in {line % 40} cities"
+            for line in range(lines_per_page)
+        ]
+        pages.append("\n".join(lines))
+    return build_sample_pdf(pages)
+
+
+def time_parse(pdf_bytes: bytes, workers: int, repeats: int) -> float:
+    """Return the best wall-clock time for parsing with the given worker count"""
+    parser = DocumentParser(pdf_workers=workers)
+    best = float('inf')
+    for _ in range(repeats):
+        upload = make_upload(pdf_bytes, "benchmark.pdf")
+        start = time.perf_counter()
+        pages = parser.parse_document(upload)
+        best = min(best, time.perf_counter() - start)
+    assert pages, "Benchmark PDF produced no pages"
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark parallel PDF page extraction")
+    arg_parser.add_argument("--pages", type=int, default=200, help="Pages in the generated PDF")
+    arg_parser.add_argument("--lines", type=int, default=45, help="Text lines per page")
+    arg_parser.add_argument("--repeats", type=int, default=3, help="Runs per worker count (best is reported)")
+    arg_parser.add_argument("--pdfplumber", action="store_true", help="Use pdfplumber (text + tables) instead of PyPDF2")
+    args = arg_parser.parse_args()
+
+    if args.pdfplumber:
+        parsing.USE_PDFPLUMBER = True
+
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1))) or [1]
+
+    pdf_bytes = build_benchmark_pdf(args.pages, args.lines)
+    backend = "pdfplumber" if args.pdfplumber else "PyPDF2"
+    print(f"📄 Benchmark PDF: {args.pages} pages, {len(pdf_bytes):,} bytes, {backend}, {cores} CPU core(s)\n")
+    print(f"{'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+
+    baseline = None
+    for workers in worker_counts:
+        elapsed = time_parse(pdf_bytes, workers, args.repeats)
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>9.2f} {args.pages / elapsed:>9.1f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
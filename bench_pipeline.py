@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmark
+Times page extraction and master template inference end to end, offline from a recorded cassette
+"""
+
+import argparse
+import time
+from typing import Dict, List, Any, Optional
+
+from bedrock_client import BedrockClient
+from bench_structured_output import load_corpus, save_corpus, corpus_from_documents
+from cassette import Cassette
+from template_inference import TemplateInferenceEngine
+
+
+def run_pipeline(corpus: List[Dict[str, Any]], client: BedrockClient, max_concurrency: int = 4) -> Dict[str, Any]:
+    """Extract every corpus page and infer the master template, timing both stages"""
+    pages = [(record["page_content"], record["doc_id"], record["page_index"]) for record in corpus]
+
+    start = time.perf_counter()
+    results = client.extract_pages(pages, max_concurrency=max_concurrency)
+    extracted = time.perf_counter()
+    page_docs = [result["page_json"] for result in results if result["page_json"]]
+    template = TemplateInferenceEngine(client).infer_master_template(page_docs) if page_docs else None
+    finished = time.perf_counter()
+
+    report = client.get_run_report()
+    return {
+        "pages": len(pages),
+        "failed": len(pages) - len(page_docs),
+        "extraction_seconds": extracted - start,
+        "inference_seconds": finished - extracted,
+        "total_seconds": finished - start,
+        "calls": report["calls"],
+        "latency_p50": report["latency_p50"],
+        "latency_p95": report["latency_p95"],
+        "template_pages": template["total_pages"] if template else 0,
+        "cassette": client.cassette.get_stats() if client.cassette else None
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark extraction and template inference end to end")
+    arg_parser.add_argument("corpus", help="JSONL corpus of pages")
+    arg_parser.add_argument("--documents", nargs="+", help="Build the corpus from these documents first")
+    cassette_args = arg_parser.add_mutually_exclusive_group()
+    cassette_args.add_argument("--record", metavar="CASSETTE", help="Call Bedrock and record the responses here")
+    cassette_args.add_argument("--replay", metavar="CASSETTE", help="Serve the responses recorded here, no network")
+    arg_parser.add_argument("--replay-latency", action="store_true", help="Delay replayed answers as recorded")
+    arg_parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiply replayed latencies")
+    arg_parser.add_argument("--endpoint-url", help="bedrock-runtime endpoint, e.g. a local stand-in server")
+    arg_parser.add_argument("--region", default="eu-west-1")
+    arg_parser.add_argument("--concurrency", type=int, default=4)
+    arg_parser.add_argument("--streaming", action="store_true")
+    arg_parser.add_argument("--repeat", type=int, default=1, help="Runs to time")
+    args = arg_parser.parse_args()
+
+    corpus = corpus_from_documents(args.documents) if args.documents else load_corpus(args.corpus)
+    if args.documents:
+        save_corpus(args.corpus, corpus)
+
+    cassette: Optional[Cassette] = None
+    if args.record:
+        cassette = Cassette(args.record, mode="record")
+    elif args.replay:
+        cassette = Cassette(args.replay, replay_latency=args.replay_latency, latency_scale=args.latency_scale)
+
+    print(f"\n📄 Corpus: {len(corpus)} pages\n")
+    print(f"{'run':>4} {'extract s':>10} {'infer s':>9} {'total s':>9} {'calls':>6} {'p50 s':>7} {'p95 s':>7} {'failed':>7}")
+    fmt = lambda value: "-" if value is None else f"{value:.3f}"
+    for run in range(1, args.repeat + 1):
+        # A fresh client per run, so the replay starts from the first recording again
+        if cassette is not None and cassette.replaying and run > 1:
+            cassette = Cassette(args.replay, replay_latency=args.replay_latency, latency_scale=args.latency_scale)
+        client = BedrockClient(region=args.region, max_concurrency=args.concurrency, streaming=args.streaming,
+                               endpoint_url=args.endpoint_url, cassette=cassette)
+        result = run_pipeline(corpus, client, args.concurrency)
+        print(f"{run:>4} {fmt(result['extraction_seconds']):>10} {fmt(result['inference_seconds']):>9} "
+              f"{fmt(result['total_seconds']):>9} {result['calls']:>6} {fmt(result['latency_p50']):>7} "
+              f"{fmt(result['latency_p95']):>7} {result['failed']:>7}")
+
+    if args.record:
+        cassette.save()
+        stats = cassette.get_stats()
+        print(f"\n📼 Recorded {stats['recorded']} responses for {stats['requests']} requests to {args.record}")
+    elif cassette is not None:
+        stats = cassette.get_stats()
+        print(f"\n📼 Replayed {stats['replayed']} responses, {stats['misses']} missing from {args.replay}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Structured Output Benchmark
+Compares the in-prompt JSON skeleton with tool-use structured output on a recorded corpus
+"""
+
+import argparse
+import json
+from typing import Dict, List, Any
+
+from bedrock_client import BedrockClient, estimate_tokens, response_output_text, validate_page_structure
+
+MODES = ("prompt", "tool")
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    """Corpus records: doc_id, page_index, page_content and optional recorded responses per mode"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_corpus(path: str, corpus: List[Dict[str, Any]]):
+    with open(path, "w") as f:
+        for record in corpus:
+            f.write(json.dumps(record) + "\n")
+
+
+def corpus_from_documents(paths: List[str]) -> List[Dict[str, Any]]:
+    """Parse documents into corpus records without responses"""
+    from parsing import DocumentParser
+    parser = DocumentParser()
+    corpus = []
+    for i, path in enumerate(paths):
+        for page_idx, page_content in enumerate(parser.iter_pages(path)):
+            corpus.append({"doc_id": f"doc_{i+1}", "page_index": page_idx + 1, "page_content": page_content})
+    return corpus
+
+
+def record_responses(corpus: List[Dict[str, Any]], clients: Dict[str, BedrockClient]):
+    """Call Bedrock for every page in both modes and store the raw response bodies"""
+    for record in corpus:
+        for mode, client in clients.items():
+            body = client.build_page_request(record["page_content"], record["doc_id"], record["page_index"])
+            response = client._invoke_with_retries(body)
+            record.setdefault("responses", {})[mode] = json.loads(response["body"].read())
+        print(f"  recorded {record['doc_id']} page {record['page_index']}")
+
+
+def measure(corpus: List[Dict[str, Any]], client: BedrockClient, mode: str) -> Dict[str, Any]:
+    """Estimated and recorded prompt tokens, and parse failures over the recorded responses"""
+    system_tokens = estimate_tokens(client._page_structure_system_prompt())
+    tool = client._page_tool()
+    schema_tokens = estimate_tokens(json.dumps(tool)) if tool else 0
+
+    user_tokens, measured_tokens, failures, recorded = [], [], 0, 0
+    for record in corpus:
+        args = (record["page_content"], record["doc_id"], record["page_index"])
+        user_tokens.append(estimate_tokens(client._page_user_prompt(*args)))
+
+        response_body = record.get("responses", {}).get(mode)
+        if response_body is None:
+            continue
+        recorded += 1
+        usage = response_body.get("usage", {})
+        measured_tokens.append(sum(usage.get(field) or 0 for field in (
+            "input_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"
+        )))
+        try:
+            output = response_output_text(response_body)
+            if output is None:
+                raise ValueError("no output")
+            validate_page_structure(client.parse_page_response(output, *args[1:]), *args[1:])
+        except Exception:
+            failures += 1
+
+    average = lambda values: sum(values) / len(values) if values else None
+    return {
+        "mode": mode,
+        "pages": len(corpus),
+        "page_prompt_tokens": average(user_tokens),
+        "prompt_tokens": system_tokens + schema_tokens + average(user_tokens) if user_tokens else None,
+        "measured_input_tokens": average(measured_tokens),
+        "recorded": recorded,
+        "parse_failures": failures,
+        "parse_failure_rate": failures / recorded * 100 if recorded else None
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark structured output against the in-prompt JSON skeleton")
+    arg_parser.add_argument("corpus", help="JSONL corpus of pages and recorded responses")
+    arg_parser.add_argument("--documents", nargs="+", help="Build the corpus from these documents first")
+    arg_parser.add_argument("--record", action="store_true", help="Call Bedrock in both modes and store the responses")
+    arg_parser.add_argument("--region", default="eu-west-1")
+    args = arg_parser.parse_args()
+
+    corpus = corpus_from_documents(args.documents) if args.documents else load_corpus(args.corpus)
+    clients = {mode: BedrockClient(region=args.region, structured_output=(mode == "tool")) for mode in MODES}
+
+    if args.record:
+        record_responses(corpus, clients)
+    if args.documents or args.record:
+        save_corpus(args.corpus, corpus)
+
+    results = {mode: measure(corpus, clients[mode], mode) for mode in MODES}
+
+    fmt = lambda value, suffix="": "-" if value is None else f"{value:,.1f}{suffix}"
+    print(f"\n📄 Corpus: {len(corpus)} pages\n")
+    print(f"{'mode':>8} {'page prompt':>12} {'full prompt':>12} {'measured in':>12} {'recorded':>9} {'parse fail':>11}")
+    for result in results.values():
+        print(f"{result['mode']:>8} {fmt(result['page_prompt_tokens']):>12} {fmt(result['prompt_tokens']):>12} "
+              f"{fmt(result['measured_input_tokens']):>12} {result['recorded']:>9} "
+              f"{fmt(result['parse_failure_rate'], '%'):>11}")
+
+    before, after = results["prompt"], results["tool"]
+    if before["page_prompt_tokens"]:
+        reduction = (1 - after["page_prompt_tokens"] / before["page_prompt_tokens"]) * 100
+        print(f"\n✂️ Per-page (uncached) prompt tokens reduced by {reduction:.1f}%")
+    if before["measured_input_tokens"] and after["measured_input_tokens"]:
+        reduction = (1 - after["measured_input_tokens"] / before["measured_input_tokens"]) * 100
+        print(f"✂️ Measured input tokens reduced by {reduction:.1f}%")
+    if before["recorded"] and after["recorded"]:
+        print(f"🧪 Parse failures: {before['parse_failures']}/{before['recorded']} before, "
+              f"{after['parse_failures']}/{after['recorded']} after")
+
+
+if __name__ == "__main__":
+    main()
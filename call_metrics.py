@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Call Metrics Module for Master Template System
+Per-call token, latency and cost accounting for Bedrock runs
+"""
+
+import csv
+import io
+import json
+import math
+import threading
+from typing import Dict, List, Any, Optional
+
+# USD per million tokens: input, output, prompt cache write, prompt cache read
+MODEL_PRICING = {
+    "eu.anthropic.claude-sonnet-4-5-20250929-v1:0": {
+        "input": 3.00, "output": 15.00, "cache_write": 3.75, "cache_read": 0.30
+    },
+    "eu.anthropic.claude-haiku-4-5-20251001-v1:0": {
+        "input": 1.00, "output": 5.00, "cache_write": 1.25, "cache_read": 0.10
+    }
+}
+
+# Columns of every call record, in export order
+CALL_FIELDS = [
+    "operation", "doc_id", "page_index", "model_id", "region", "input_tokens", "output_tokens",
+    "cache_read_input_tokens", "cache_creation_input_tokens", "latency_seconds", "retries",
+    "stop_reason", "cached", "error", "route", "complexity", "max_tokens", "output_estimate",
+    "escalated", "hedge", "replayed", "cost_usd"
+]
+
+
+def estimate_cost(model_id: str, usage: Dict[str, Any]) -> float:
+    """Estimated USD cost of one call's token usage (0 for models without a price)"""
+    pricing = MODEL_PRICING.get(model_id)
+    if pricing is None:
+        return 0.0
+    return (
+        (usage.get("input_tokens") or 0) * pricing["input"]
+        + (usage.get("output_tokens") or 0) * pricing["output"]
+        + (usage.get("cache_creation_input_tokens") or 0) * pricing["cache_write"]
+        + (usage.get("cache_read_input_tokens") or 0) * pricing["cache_read"]
+    ) / 1_000_000
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of values, None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class CallMetrics:
+    def __init__(self):
+        """Thread-safe log of every Bedrock call made during a run"""
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(self, call: Dict[str, Any]):
+        """Add one call record; missing fields default to empty and the cost is filled in"""
+        record = {field: None for field in CALL_FIELDS}
+        record.update(call)
+        for field in ("input_tokens", "output_tokens", "cache_read_input_tokens",
+                      "cache_creation_input_tokens", "retries"):
+            record[field] = record[field] or 0
+        record["cached"] = bool(record["cached"])
+        record["escalated"] = bool(record["escalated"])
+        record["hedge"] = bool(record["hedge"])
+        record["replayed"] = bool(record["replayed"])
+        # Responses served from the local cache cost nothing
+        record["cost_usd"] = 0.0 if record["cached"] else round(estimate_cost(record["model_id"], record), 6)
+
+        with self._lock:
+            self.calls.append(record)
+
+    def get_calls(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(call) for call in self.calls]
+
+    def get_report(self, top_n: int = 5, baseline_model_id: Optional[str] = None) -> Dict[str, Any]:
+        """Aggregate the calls: token totals, latency percentiles, cost, and the costliest documents and pages
+
+        When pages were routed between models, a routing section compares
+        them against sending everything to baseline_model_id.
+        """
+        calls = self.get_calls()
+        # Latency percentiles describe real Bedrock round trips only
+        latencies = [c["latency_seconds"] for c in calls if not c["cached"] and c["latency_seconds"] is not None]
+
+        documents: Dict[str, Dict[str, Any]] = {}
+        pages: Dict[Any, Dict[str, Any]] = {}
+        for call in calls:
+            if call["doc_id"] is None:
+                continue
+            doc = documents.setdefault(call["doc_id"], {"doc_id": call["doc_id"], "calls": 0, "cost_usd": 0.0,
+                                                        "latency_seconds": 0.0})
+            page = pages.setdefault((call["doc_id"], call["page_index"]), {
+                "doc_id": call["doc_id"], "page_index": call["page_index"], "calls": 0, "cost_usd": 0.0,
+                "output_tokens": 0, "latency_seconds": 0.0
+            })
+            for totals in (doc, page):
+                totals["calls"] += 1
+                totals["cost_usd"] += call["cost_usd"]
+                totals["latency_seconds"] += call["latency_seconds"] or 0
+            page["output_tokens"] += call["output_tokens"]
+
+        for totals in list(documents.values()) + list(pages.values()):
+            totals["cost_usd"] = round(totals["cost_usd"], 6)
+            totals["latency_seconds"] = round(totals["latency_seconds"], 3)
+
+        round_latency = lambda value: None if value is None else round(value, 3)
+        return {
+            "calls": len(calls),
+            "cached_calls": sum(1 for c in calls if c["cached"]),
+            "failed_calls": sum(1 for c in calls if c["error"]),
+            "retries": sum(c["retries"] for c in calls),
+            "input_tokens": sum(c["input_tokens"] for c in calls),
+            "output_tokens": sum(c["output_tokens"] for c in calls),
+            "cache_read_input_tokens": sum(c["cache_read_input_tokens"] for c in calls),
+            "cache_creation_input_tokens": sum(c["cache_creation_input_tokens"] for c in calls),
+            "stop_reasons": _count(c["stop_reason"] for c in calls if c["stop_reason"]),
+            "latency_p50": round_latency(percentile(latencies, 50)),
+            "latency_p95": round_latency(percentile(latencies, 95)),
+            "latency_p99": round_latency(percentile(latencies, 99)),
+            "latency_max": round_latency(max(latencies) if latencies else None),
+            "estimated_cost_usd": round(sum(c["cost_usd"] for c in calls), 4),
+            "hedge_calls": sum(1 for c in calls if c["hedge"]),
+            "hedge_cost_usd": round(sum(c["cost_usd"] for c in calls if c["hedge"]), 4),
+            "replayed_calls": sum(1 for c in calls if c["replayed"]),
+            "by_document": sorted(documents.values(), key=lambda d: d["cost_usd"], reverse=True),
+            "costliest_pages": sorted(pages.values(), key=lambda p: p["cost_usd"], reverse=True)[:top_n],
+            "routing": _routing_report(calls, baseline_model_id)
+        }
+
+    def to_json(self) -> str:
+        """The run report together with every call record"""
+        return json.dumps({"report": self.get_report(), "calls": self.get_calls()}, indent=2)
+
+    def to_csv(self) -> str:
+        """One CSV row per call"""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CALL_FIELDS)
+        writer.writeheader()
+        writer.writerows(self.get_calls())
+        return buffer.getvalue()
+
+    def export(self, path: str):
+        """Write the calls to path as CSV or JSON, chosen by its extension"""
+        with open(path, "w", newline="") as f:
+            f.write(self.to_csv() if path.lower().endswith(".csv") else self.to_json())
+
+
+def _routing_report(calls: List[Dict[str, Any]], baseline_model_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Routing decisions and what sending simple pages to the cheaper model saved
+
+    Savings compare each page kept on the simple model with the average
+    strong-model call of the run (latency) and with the same tokens at
+    baseline_model_id prices (cost); simple attempts that were escalated
+    count as pure overhead.
+    """
+    routed = [c for c in calls if c["route"]]
+    if not routed:
+        return None
+
+    escalated = {(c["doc_id"], c["page_index"]) for c in routed if c["route"] == "escalated"}
+    simple = [c for c in routed if c["route"] == "simple" and not c["cached"]]
+    kept = [c for c in simple if (c["doc_id"], c["page_index"]) not in escalated]
+    wasted = [c for c in simple if (c["doc_id"], c["page_index"]) in escalated]
+    strong_latencies = [c["latency_seconds"] for c in routed
+                        if c["route"] in ("strong", "escalated") and not c["cached"]]
+
+    latency_saved = None
+    if strong_latencies:
+        average_strong = sum(strong_latencies) / len(strong_latencies)
+        latency_saved = round(sum(average_strong - c["latency_seconds"] for c in kept)
+                              - sum(c["latency_seconds"] for c in wasted), 3)
+
+    cost_saved = None
+    if baseline_model_id in MODEL_PRICING:
+        cost_saved = round(sum(estimate_cost(baseline_model_id, c) - c["cost_usd"] for c in kept)
+                           - sum(c["cost_usd"] for c in wasted), 6)
+
+    return {
+        "pages_simple": len({(c["doc_id"], c["page_index"]) for c in routed if c["route"] == "simple"} - escalated),
+        "pages_strong": len({(c["doc_id"], c["page_index"]) for c in routed if c["route"] == "strong"}),
+        "pages_escalated": len(escalated),
+        "estimated_latency_saved_seconds": latency_saved,
+        "estimated_cost_saved_usd": cost_saved
+    }
+
+
+def _count(values) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return counts
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Cassette Module for Master Template System
+Record and replay of Bedrock responses for reproducible offline runs
+"""
+
+import gzip
+import json
+import threading
+import time
+from typing import Dict, List, Any
+
+from response_cache import ResponseCache
+
+CASSETTE_VERSION = 1
+MODES = ("record", "replay")
+
+
+class CassetteMissError(KeyError):
+    """A replayed request was never recorded"""
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str = "replay", replay_latency: bool = False, latency_scale: float = 1.0):
+        """Responses keyed by request hash, stored as gzipped JSON lines at path
+
+        In record mode every response BedrockClient receives is kept together
+        with how long it took; save() writes them. In replay mode the
+        responses are served back instead of calling Bedrock: repeats of a
+        request get its recordings in order (the last one from then on), and
+        with replay_latency each answer is delayed by its recorded latency
+        times latency_scale.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected one of {MODES}")
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.latency_scale = latency_scale
+
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+        self._plays: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if mode == "replay":
+            self.load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def record(self, model_id: str, body: Dict[str, Any], response_body: Dict[str, Any], latency: float):
+        """Keep one response and its latency for the request (model_id, body)"""
+        key = ResponseCache.make_key(model_id, body)
+        with self._lock:
+            self.entries.setdefault(key, []).append({
+                "model_id": model_id, "latency": round(latency, 4), "response": response_body
+            })
+            self.stats["recorded"] += 1
+
+    def play(self, model_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """The recorded response for a request, after its recorded latency if replay_latency is set"""
+        key = ResponseCache.make_key(model_id, body)
+        with self._lock:
+            recordings = self.entries.get(key)
+            if not recordings:
+                self.stats["misses"] += 1
+                raise CassetteMissError(f"No recorded response for {model_id} request {key[:12]}")
+            play = self._plays.get(key, 0)
+            self._plays[key] = play + 1
+            entry = recordings[min(play, len(recordings) - 1)]
+            self.stats["replayed"] += 1
+        if self.replay_latency:
+            time.sleep(entry["latency"] * self.latency_scale)
+        return json.loads(json.dumps(entry["response"]))
+
+    def save(self):
+        """Write every recorded response to path"""
+        with self._lock:
+            entries = {key: list(recordings) for key, recordings in self.entries.items()}
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps({"cassette_version": CASSETTE_VERSION, "requests": len(entries)}) + "\n")
+            for key, recordings in entries.items():
+                f.write(json.dumps({"key": key, "recordings": recordings}, separators=(",", ":")) + "\n")
+
+    def load(self):
+        """Read the responses stored at path"""
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("cassette_version") != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version {header.get('cassette_version')} in {self.path}")
+            entries = {}
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    entries[record["key"]] = record["recordings"]
+        with self._lock:
+            self.entries = entries
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "requests": len(self.entries), "mode": self.mode}
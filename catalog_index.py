@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Catalog Index Module for Master Template System
+Inverted index over catalog elements for per-page candidate pre-selection
+"""
+
+import math
+import re
+from collections import defaultdict
+from typing import Dict, List, Any, Iterable, Optional
+
+# Elements offered on every page regardless of score
+DEFAULT_CORE_ELEMENTS = [
+    'title', 'subtitle', 'sections_h1', 'subsections_h2', 'paragraphs', 'bullet_points',
+    'numbered_lists', 'content_tables', 'charts_graphs', 'figures_images', 'footnotes', 'hyperlinks'
+]
+
+# Weight of a term by the catalog field it came from
+FIELD_WEIGHTS = {'field_id': 3.0, 'label': 2.0, 'description': 1.0, 'category': 0.5}
+
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'that', 'this', 'are', 'from', 'was', 'were', 'has', 'have', 'its',
+    'our', 'your', 'their', 'not', 'but', 'all', 'any', 'can', 'will', 'into', 'than', 'also', 'more',
+    'used', 'such', 'each', 'page', 'slide', 'document', 'e.g'
+}
+
+_WORD = re.compile(r'[a-z][a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word terms with stopwords dropped and a trailing plural s folded"""
+    terms = []
+    for word in _WORD.findall(text.lower()):
+        if len(word) < 3 or word in STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+# Lexical cues in page text, and the catalog vocabulary they stand for, as index terms
+LEXICAL_CUES = [(pattern, tokenize(' '.join(cue_terms))) for pattern, cue_terms in [
+    (re.compile(r'[\w.+-]+@[\w-]+\.[\w.]+'), ['email', 'contact', 'support']),
+    (re.compile(r'(?:\+|\b00)\d[\d ()-]{7,}\d'), ['phone', 'contact']),
+    (re.compile(r'\b(?:https?://|www\.)\S+', re.IGNORECASE), ['website', 'url', 'hyperlink', 'link']),
+    (re.compile(r'\b(?:19|20)\d{2}\b'), ['date', 'year']),
+    (re.compile(r'^\s*(?:TABLES?:|.+ \| .+)', re.MULTILINE), ['table', 'tabular', 'data']),
+    (re.compile(r'^\s*CHART:', re.MULTILINE), ['chart', 'graph', 'figure', 'data']),
+    (re.compile(r'^\s*(?:[-•▪●*]|\d+[.)])\s+\S', re.MULTILINE), ['list', 'bullet', 'points', 'steps']),
+    (re.compile(r'^\s*SLIDE 1:', re.MULTILINE), ['cover', 'title', 'logo'])
+]]
+
+
+class CatalogSelector:
+    def __init__(self, element_registry: Dict[str, Dict[str, Any]], top_k: int = 24,
+                 core_elements: Optional[Iterable[str]] = None):
+        """Precompute an inverted index from catalog terms to the elements they describe
+
+        Terms come from each element's field_id, label, description and
+        category, weighted by FIELD_WEIGHTS and by inverse document frequency.
+        """
+        self.top_k = top_k
+        self.core_elements = [field_id for field_id in (core_elements or DEFAULT_CORE_ELEMENTS)
+                              if field_id in element_registry]
+        self.element_count = len(element_registry)
+
+        weights: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for field_id, element in element_registry.items():
+            sources = {
+                'field_id': field_id.replace('_', ' '),
+                'label': element.get('label', ''),
+                'description': element.get('description', ''),
+                'category': element.get('category', '').replace('_', ' ')
+            }
+            for source, text in sources.items():
+                for term in set(tokenize(text)):
+                    weights[term][field_id] = max(weights[term][field_id], FIELD_WEIGHTS[source])
+
+        # term -> [(field_id, weight * idf)]
+        self.index: Dict[str, List[tuple]] = {}
+        for term, postings in weights.items():
+            idf = math.log(1 + self.element_count / len(postings))
+            self.index[term] = [(field_id, weight * idf) for field_id, weight in postings.items()]
+
+    def query_terms(self, page_content: str) -> Dict[str, float]:
+        """Page terms with log-scaled frequencies, plus the vocabulary of any lexical cues found"""
+        counts: Dict[str, int] = defaultdict(int)
+        for term in tokenize(page_content):
+            counts[term] += 1
+        terms = {term: 1 + math.log(count) for term, count in counts.items()}
+
+        for pattern, cue_terms in LEXICAL_CUES:
+            if pattern.search(page_content):
+                for term in cue_terms:
+                    terms[term] = terms.get(term, 0) + 2.0
+        return terms
+
+    def score(self, page_content: str) -> Dict[str, float]:
+        """Relevance of every matching catalog element to the page"""
+        scores: Dict[str, float] = defaultdict(float)
+        for term, weight in self.query_terms(page_content).items():
+            for field_id, term_weight in self.index.get(term, ()):
+                scores[field_id] += weight * term_weight
+        return scores
+
+    def select(self, page_content: str, top_k: Optional[int] = None) -> List[str]:
+        """The always-on core plus the top_k best scoring other elements, core first"""
+        top_k = self.top_k if top_k is None else top_k
+        scores = self.score(page_content)
+        ranked = sorted((field_id for field_id in scores if field_id not in self.core_elements),
+                        key=lambda field_id: (-scores[field_id], field_id))
+        return self.core_elements + ranked[:top_k]
@@ -4,17 +4,45 @@ Catalog Integration Module for Master Template System
 Integrates master_template.json with document analysis
 """
 
+import hashlib
 import json
 import os
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Callable
 from collections import defaultdict
+from catalog_index import CatalogSelector
 
 class CatalogIntegration:
     def __init__(self, catalog_path: str = "master_template.json"):
         """Initialize catalog integration"""
         self.catalog_path = catalog_path
+        self._prompt_renderings: Dict[Tuple[str, str], str] = {}
+        self.reload()
+    
+    def reload(self):
+        """(Re)load the catalog from disk and drop renderings of the previous version"""
         self.master_catalog = self._load_catalog()
         self.element_registry = self._build_element_registry()
+        self.catalog_version = self._compute_catalog_version()
+        self._prompt_renderings = {}
+        self._selector = None
+    
+    def _compute_catalog_version(self) -> str:
+        """Identify this exact catalog content: declared id/version plus a content hash"""
+        content = json.dumps(self.master_catalog, sort_keys=True).encode('utf-8')
+        return "{}:{}:{}".format(
+            self.master_catalog.get('template_id', 'unknown'),
+            self.master_catalog.get('version', '1.0'),
+            hashlib.sha256(content).hexdigest()[:12]
+        )
+    
+    def get_prompt_rendering(self, name: str, render: Callable[[], str]) -> str:
+        """Return a prompt text derived from the catalog, rendering it once per catalog version"""
+        key = (self.catalog_version, name)
+        rendering = self._prompt_renderings.get(key)
+        if rendering is None:
+            rendering = render()
+            self._prompt_renderings[key] = rendering
+        return rendering
     
     def _load_catalog(self) -> Dict[str, Any]:
         """Load master template catalog"""
@@ -75,13 +103,30 @@ class CatalogIntegration:
     
     def get_element_types_for_prompt(self) -> str:
         """Get formatted element types for Claude prompt"""
+        return self.get_prompt_rendering('element_types', self._render_element_types)
+    
+    def get_element_subset_for_prompt(self, field_ids: List[str]) -> str:
+        """Format only the given registry elements for the prompt, grouped like the full list"""
+        return self._render_element_types(field_ids, "CANDIDATE ELEMENT TYPES FROM MASTER CATALOG")
+    
+    def get_selector(self) -> CatalogSelector:
+        """Inverted-index selector of per-page candidate elements, built once per catalog version"""
+        if self._selector is None:
+            self._selector = CatalogSelector(self.element_registry)
+        return self._selector
+    
+    def _render_element_types(self, field_ids: Optional[List[str]] = None,
+                              heading: str = "AVAILABLE ELEMENT TYPES FROM MASTER CATALOG") -> str:
+        """Group, sort and format registry elements (all of them by default) for the prompt"""
         elements_by_category = defaultdict(list)
         
         for element in self.element_registry.values():
+            if field_ids is not None and element['field_id'] not in field_ids:
+                continue
             category = element['category']
             elements_by_category[category].append(element['field_id'])
         
-        prompt_text = "AVAILABLE ELEMENT TYPES FROM MASTER CATALOG:\n\n"
+        prompt_text = f"{heading}:\n\n"
         
         for category, elements in elements_by_category.items():
             category_name = category.replace('_', ' ').title()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Circuit Breaker Module for Master Template System
+Stops calling Bedrock after a burst of failures, so a degraded service fails fast
+"""
+
+import threading
+import time
+from typing import Dict, Any
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is refusing calls"""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        """Refuse calls for reset_seconds once failure_threshold calls in a row failed
+
+        Failures are errors and timeouts of the service itself, reported by
+        the caller through on_failure; any answer, even a rejected request,
+        is an on_success. After reset_seconds a single probe call is let
+        through (half open): its success closes the circuit, its failure
+        opens it for another reset_seconds.
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+
+        self.stats = {"trips": 0, "rejected_calls": 0, "failures": 0, "successes": 0}
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._open_seconds = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """closed, open, or half_open once the open circuit is due a probe"""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return HALF_OPEN
+            return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are refused without a probe being due"""
+        return self.state == OPEN
+
+    def allow(self, retry: bool = False):
+        """Raise CircuitOpenError unless a call may go ahead
+
+        A retry of a call that was already let through is refused only while
+        the circuit is open, so a probe can see its own retries through.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            due = time.monotonic() - self._opened_at >= self.reset_seconds
+            if retry and (due or self._state == HALF_OPEN):
+                return
+            if self._state == OPEN and due and not self._probing:
+                self._state = HALF_OPEN
+                self._probing = True
+                return
+            self.stats["rejected_calls"] += 1
+        raise CircuitOpenError(f"Bedrock circuit is open after {self.failure_threshold} failed calls in a row")
+
+    def on_success(self):
+        """The service answered: close the circuit"""
+        with self._lock:
+            self.stats["successes"] += 1
+            self._consecutive_failures = 0
+            if self._state != CLOSED:
+                self._open_seconds += time.monotonic() - self._opened_at
+                self._state = CLOSED
+                self._probing = False
+
+    def on_failure(self):
+        """The service errored or timed out: trip after failure_threshold in a row, or a failed probe"""
+        with self._lock:
+            self.stats["failures"] += 1
+            self._consecutive_failures += 1
+            now = time.monotonic()
+            if self._state == HALF_OPEN or (self._state == CLOSED
+                                            and self._consecutive_failures >= self.failure_threshold):
+                if self._state == HALF_OPEN:
+                    self._open_seconds += now - self._opened_at
+                self._state = OPEN
+                self._opened_at = now
+                self._probing = False
+                self.stats["trips"] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the state, trips, refused calls and seconds spent open"""
+        state = self.state
+        with self._lock:
+            open_seconds = self._open_seconds
+            if self._state != CLOSED:
+                open_seconds += time.monotonic() - self._opened_at
+            return {**self.stats, "state": state, "open_seconds": round(open_seconds, 3)}
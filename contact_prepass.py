@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Contact Pre-pass Module for Master Template System
+Finds contact details and dates with regular expressions before a page is sent to Claude
+"""
+
+from typing import Dict, List, Any, Optional
+
+from heuristic_extractor import (contact_element, find_contacts, heuristic_page_structure, inline_contacts,
+                                 is_contact_line)
+
+# Appended to a page prompt; Claude leaves these out and they are merged back afterwards
+CONTACT_HINTS_NOTE = """CONTACT DETAILS ALREADY EXTRACTED (recorded separately; do NOT output elements for them):
+{hints}"""
+
+# Elements that may precede the contact details of a page the pre-pass covers
+_HEADING_TYPES = ('title', 'sections_h1')
+
+
+def prepass_page(page_content: str, doc_id: str, page_index: int) -> Dict[str, Any]:
+    """Contact details on the page and, when they are all it holds, the page structure
+
+    Returns a dict with contacts (see page_contacts) and page_json, which is
+    None unless every line of the page is a contact detail, apart from an
+    optional heading above them; such a page needs no model call.
+    """
+    contacts = page_contacts(page_content)
+    page_json = None
+    if contacts:
+        structure = heuristic_page_structure(page_content, doc_id, page_index)
+        elements = structure['elements']
+        body = elements[1:] if elements and elements[0]['type'] in _HEADING_TYPES else elements
+        if body and all(element['pii_type'] != 'NONE' for element in body):
+            page_json = {**structure, 'extracted_by': 'prepass'}
+    return {'contacts': contacts, 'page_json': page_json}
+
+
+def page_contacts(page_content: str) -> List[Dict[str, Any]]:
+    """Contact details of the page, line by line (see find_contacts)
+
+    Dates and addresses count only on lines of contact details; in running
+    text they are left to Claude, and so are numbers that are not clearly
+    phone numbers (see inline_contacts).
+    """
+    contacts = []
+    for line in page_content.splitlines():
+        found = find_contacts(line)
+        contacts.extend(found if is_contact_line(line, found) else inline_contacts(line, found))
+    return contacts
+
+
+def contact_hints(contacts: List[Dict[str, Any]]) -> Optional[str]:
+    """Prompt note listing the contact details found, or None without any"""
+    if not contacts:
+        return None
+    hints = "\n".join(f"- {contact['field_id']} ({contact['pii_type']}): {contact['value']}" for contact in contacts)
+    return CONTACT_HINTS_NOTE.format(hints=hints)
+
+
+def merge_contact_elements(page_json: Dict[str, Any], contacts: List[Dict[str, Any]],
+                           page_index: int) -> Dict[str, Any]:
+    """Add an element for each contact detail Claude left out of page_json, numbered after its own"""
+    elements = page_json.setdefault('elements', [])
+    answered = " ".join(str(element.get('text', '')) for element in elements if isinstance(element, dict))
+    for contact in contacts:
+        if contact['value'] in answered:
+            continue
+        elements.append({'element_id': f"e{len(elements) + 1}", **contact_element(contact, page_index),
+                         'position_hint': 'bottom'})
+    return page_json
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Hedging Module for Master Template System
+Duplicate requests that run past the usual latency, keeping the first good answer
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+from typing import Dict, Any, Callable, Optional
+
+from call_metrics import percentile
+
+
+class HedgeCancelled(Exception):
+    """The other attempt of a hedged request already answered"""
+
+
+class RequestHedger:
+    def __init__(self, latency_percentile: float = 95, max_hedge_ratio: float = 0.1,
+                 min_samples: int = 20, history: int = 200, min_delay: float = 0.5):
+        """Send a second attempt when the first outlives latency_percentile of recent requests
+
+        The delay is taken over the last history unhedged latencies and is
+        never below min_delay; there is no hedging before min_samples requests
+        finished. Hedges are capped at max_hedge_ratio of all requests, which
+        bounds the extra spend. One hedger may be shared between clients.
+        """
+        self.latency_percentile = latency_percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+
+        self.latencies = deque(maxlen=history)
+        self.stats = {'requests': 0, 'hedges': 0, 'hedge_wins': 0, 'budget_exhausted': 0}
+        # What recent callers waited, and what they would have waited for the first attempt alone
+        self.effective_seconds = deque(maxlen=history)
+        self.unhedged_seconds = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def delay(self) -> Optional[float]:
+        """Seconds after which a request is hedged, None until enough latencies were observed"""
+        with self._lock:
+            latencies = list(self.latencies)
+        if len(latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, percentile(latencies, self.latency_percentile))
+
+    def run(self, attempt: Callable[[threading.Event, bool], Any]) -> Any:
+        """Call attempt(cancel, hedge) and, if it is slow, a second one; returns the first to succeed
+
+        An attempt signals an invalid answer by raising. The losing attempt
+        finds its cancel event set and may stop early by raising
+        HedgeCancelled; its result is ignored either way. Only when every
+        attempt failed is the last error raised.
+        """
+        start = time.monotonic()
+        delay = self.delay()
+        with self._lock:
+            self.stats['requests'] += 1
+
+        primary = self._start(attempt, False)
+        primary.add_done_callback(lambda future: self._observe(time.monotonic() - start, future))
+        pending = {primary}
+        if delay is not None and not wait(pending, timeout=delay).done and self._acquire():
+            pending.add(self._start(attempt, True))
+
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for other in pending:
+                    other.cancel_event.set()
+                elapsed = time.monotonic() - start
+                with self._lock:
+                    self.effective_seconds.append(elapsed)
+                    if future is not primary:
+                        self.stats['hedge_wins'] += 1
+                return future.result()
+        raise error
+
+    def _start(self, attempt: Callable[[threading.Event, bool], Any], hedge: bool) -> Future:
+        """Run one attempt on its own thread, so a hedge never queues behind the work it hedges"""
+        future = Future()
+        future.cancel_event = threading.Event()
+
+        def target():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(attempt(future.cancel_event, hedge))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=target, daemon=True).start()
+        return future
+
+    def _acquire(self) -> bool:
+        """Take a hedge from the budget if it still allows one"""
+        with self._lock:
+            if self.stats['hedges'] + 1 > self.max_hedge_ratio * self.stats['requests']:
+                self.stats['budget_exhausted'] += 1
+                return False
+            self.stats['hedges'] += 1
+            return True
+
+    def _observe(self, elapsed: float, future: Future):
+        """Record how long a successful first attempt took, whether or not it won"""
+        if future.exception() is not None:
+            return
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.unhedged_seconds.append(elapsed)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the hedge rate and tail latencies with hedging versus the first attempts alone
+
+        Counts span the hedger's lifetime; tail latencies cover the last
+        history requests. First attempts that lost and were cancelled never report a time, so
+        the unhedged tail is a lower bound.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            effective = list(self.effective_seconds)
+            unhedged = list(self.unhedged_seconds)
+
+        rounded = lambda value: round(value, 3) if value is not None else None
+        metrics = {
+            **stats,
+            'hedge_rate': round(stats['hedges'] / stats['requests'] * 100, 1) if stats['requests'] else 0.0,
+            'delay_seconds': rounded(self.delay())
+        }
+        for pct in (50, 95, 99):
+            metrics[f'p{pct}_seconds'] = rounded(percentile(effective, pct))
+            metrics[f'unhedged_p{pct}_seconds'] = rounded(percentile(unhedged, pct))
+        before, after = metrics['unhedged_p99_seconds'], metrics['p99_seconds']
+        metrics['p99_improvement'] = round((1 - after / before) * 100, 1) if before and after is not None else None
+        return metrics
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Heuristic Extractor Module for Master Template System
+Rule-based page structures from parser output, for when Bedrock cannot be called
+"""
+
+import re
+from typing import Dict, List, Any
+
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[A-Za-z]{2,}')
+URL_PATTERN = re.compile(r'\b(?i:https?://|www\.)[^\s|<>"]+[^\s|<>".,;:)]')
+PHONE_PATTERN = re.compile(r'(?<![\w+])(?:\+|00)?\(?\d[\d ().-]{6,}\d(?!\w)')
+_MONTH = (r'(?i:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?'
+          r'|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)')
+DATE_PATTERN = re.compile(
+    r'\b(?:\d{4}-\d{2}-\d{2}|\d{1,2}[./]\d{1,2}[./](?:\d{4}|\d{2})'
+    rf'|(?:\d{{1,2}}(?:st|nd|rd|th)?\s+)?{_MONTH}\.?\s+(?:\d{{1,2}}(?:st|nd|rd|th)?,?\s+)?\d{{4}})\b'
+)
+_POSTCODE = r'(?:[A-Z]{1,2}\d[A-Z\d]?\s?\d[A-Z]{2}|[A-Z]{2}\s\d{5}(?:-\d{4})?)\b'
+ADDRESS_PATTERN = re.compile(
+    r"\b\d{1,5}[A-Za-z]?(?:,?\s+[A-Z][\w.'-]*){0,4},?\s+"
+    r"(?:Street|St|Road|Rd|Avenue|Ave|Lane|Ln|Boulevard|Blvd|Drive|Dr|Way|Place|Pl|Square|Sq|Court|Ct"
+    r"|Parkway|Pkwy|Highway|Hwy|Terrace|Crescent|Close|Plaza)\b\.?"
+    rf"(?:,?\s+(?:{_POSTCODE}|[A-Z][\w'-]*))*"
+    rf"|\b(?:[A-Z][\w'-]*,?\s+){{0,3}}{_POSTCODE}"
+)
+
+_BULLET = re.compile(r'^[-•▪●◦*–]\s+')
+_NUMBERED = re.compile(r'^\d{1,2}[.)]\s+')
+# Lines the parsers add around the page text
+_PARSER_MARKER = re.compile(r'^(?:SLIDE \d+:|TABLES?:|\[Page \d+ - .*\])$')
+_CHART = re.compile(r'^CHART:\s*(.*)$')
+_UPDATED_LABEL = re.compile(r'(?i)\b(?:updated|revised|last modified)\b')
+_HEADING_MAX_CHARS = 80
+
+# Kinds of contact detail in match priority order, with the catalog field_id each becomes
+CONTACT_TYPES = (
+    ('EMAIL', EMAIL_PATTERN, 'support_email'),
+    ('URL', URL_PATTERN, 'contact_website'),
+    ('DATE', DATE_PATTERN, 'date_created'),
+    ('ADDRESS', ADDRESS_PATTERN, 'contact_address'),
+    ('PHONE', PHONE_PATTERN, 'contact_phone')
+)
+# Kinds still worth an element of their own when they sit inside running text
+INLINE_CONTACT_TYPES = ('EMAIL', 'PHONE', 'URL')
+# In running text a long number is only a phone number with an international prefix or a label before it
+_PHONE_LABEL = re.compile(r'(?i)\b(?:tel|telephone|phone|mobile|fax|call)\b')
+# Every kind in one alternation, so text is scanned once and an email's domain never also counts as a URL
+_CONTACT_SCAN = re.compile('|'.join(f'(?P<{pii_type}>{pattern.pattern})' for pii_type, pattern, _ in CONTACT_TYPES))
+_FIELD_IDS = {pii_type: field_id for pii_type, _, field_id in CONTACT_TYPES}
+
+# Words that may accompany contact details on a line without adding anything to them
+_LABEL_WORDS = {
+    'contact', 'contacts', 'us', 'email', 'e-mail', 'mail', 'tel', 'telephone', 'phone', 'mobile', 'mob',
+    'fax', 'call', 'web', 'website', 'site', 'url', 'visit', 'address', 'office', 'date', 'dated',
+    'updated', 'last', 'revised', 'modified', 'published', 'on', 'or', 'and', 'at'
+}
+_WORD = re.compile(r"[^\W\d_][\w'-]*|\d+")
+
+
+def find_contacts(text: str) -> List[Dict[str, Any]]:
+    """Emails, URLs, dates, addresses and phone numbers in text as dicts, in text order
+
+    Each has the catalog field_id, pii_type, value and span; a date labelled
+    as an update is a last_updated_date.
+    """
+    found = []
+    for match in _CONTACT_SCAN.finditer(text):
+        pii_type = match.lastgroup
+        value = match.group()
+        if pii_type == 'PHONE' and not 7 <= sum(char.isdigit() for char in value) <= 15:
+            continue
+        field_id = _FIELD_IDS[pii_type]
+        if pii_type == 'DATE' and _UPDATED_LABEL.search(text, text.rfind('\n', 0, match.start()) + 1, match.start()):
+            field_id = 'last_updated_date'
+        found.append({'field_id': field_id, 'pii_type': pii_type, 'value': value.strip(), 'span': match.span()})
+    return found
+
+
+def is_contact_line(line: str, contacts: List[Dict[str, Any]]) -> bool:
+    """True when line holds nothing but the given contact details and label words like 'Email:'"""
+    if not contacts:
+        return False
+    rest, end = [], 0
+    for contact in contacts:
+        rest.append(line[end:contact['span'][0]])
+        end = contact['span'][1]
+    rest.append(line[end:])
+    return all(word.lower() in _LABEL_WORDS for word in _WORD.findall(' '.join(rest)))
+
+
+def inline_contacts(line: str, contacts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The contacts of a line of running text that still count (see INLINE_CONTACT_TYPES)
+
+    Figures, reference numbers and the like look like phone numbers, so a
+    phone number counts only with a + or 00 prefix, or after a label like
+    'Tel' on the same line.
+    """
+    return [
+        contact for contact in contacts
+        if contact['pii_type'] in INLINE_CONTACT_TYPES and (
+            contact['pii_type'] != 'PHONE' or contact['value'].startswith(('+', '00'))
+            or _PHONE_LABEL.search(line, 0, contact['span'][0]))
+    ]
+
+
+def contact_element(contact: Dict[str, Any], page_index: int) -> Dict[str, Any]:
+    """Element fields for one contact detail; on the first page a plain date is the cover date"""
+    field_id = contact['field_id']
+    if field_id == 'date_created' and page_index == 1:
+        field_id = 'cover_date'
+    category = 'metadata' if contact['pii_type'] == 'DATE' else 'end_matter'
+    return {'type': field_id, 'category': category, 'importance': 'important', 'text': contact['value'],
+            'pii_type': contact['pii_type']}
+
+
+def heuristic_page_structure(page_content: str, doc_id: str, page_index: int) -> Dict[str, Any]:
+    """Page structure with catalog-typed elements found by rules alone
+
+    Recognises the page title (and a subtitle on the first page), bullet and
+    numbered lists, ' | ' table rows as the parsers emit them, chart titles,
+    and lines of contact details (see find_contacts); remaining lines become
+    paragraphs, keeping any email, phone number or URL in them as well.
+    Much coarser than Claude's answer, but it keeps a template possible
+    while Bedrock is down.
+    """
+    lines = [line.strip() for line in page_content.splitlines()]
+    lines = [line for line in lines if line and not _PARSER_MARKER.match(line)]
+    elements: List[Dict[str, Any]] = []
+    paragraph: List[str] = []
+
+    def add(element_type: str, category: str, importance: str, pii_type: str = 'NONE', **fields):
+        elements.append({
+            'element_id': f"e{len(elements) + 1}", 'type': element_type, 'category': category,
+            'importance': importance, **fields, 'pii_type': pii_type
+        })
+
+    def add_contact(contact: Dict[str, Any]):
+        element = contact_element(contact, page_index)
+        previous = elements[-1] if elements else None
+        if element['type'] == 'contact_address' and previous and previous['type'] == 'contact_address':
+            # Address lines in a row are one address
+            previous['text'] += ', ' + element['text']
+        else:
+            add(element.pop('type'), element.pop('category'), element.pop('importance'), **element)
+
+    def flush_paragraph():
+        if paragraph:
+            add('paragraphs', 'main_body', 'important', text=' '.join(paragraph))
+            paragraph.clear()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        for pattern, element_type in ((_BULLET, 'bullet_points'), (_NUMBERED, 'numbered_lists')):
+            if pattern.match(line):
+                flush_paragraph()
+                items = []
+                while i < len(lines) and pattern.match(lines[i]):
+                    items.append(pattern.sub('', lines[i]))
+                    i += 1
+                add(element_type, 'main_body', 'important', items=items)
+                break
+        else:
+            if ' | ' in line:
+                flush_paragraph()
+                rows = []
+                while i < len(lines) and ' | ' in lines[i]:
+                    rows.append([cell.strip() for cell in lines[i].split(' | ')])
+                    i += 1
+                add('content_tables', 'supporting', 'important', table={'headers': rows[0], 'rows': rows[1:]})
+                continue
+
+            chart = _CHART.match(line)
+            contacts = find_contacts(line)
+            if chart:
+                flush_paragraph()
+                add('charts_graphs', 'supporting', 'important', chart={'description': chart.group(1)})
+            elif is_contact_line(line, contacts):
+                flush_paragraph()
+                for contact in contacts:
+                    add_contact(contact)
+            elif not elements and not paragraph and len(line) <= _HEADING_MAX_CHARS:
+                add('title' if page_index == 1 else 'sections_h1',
+                    'front_matter' if page_index == 1 else 'main_body', 'critical', text=line)
+            elif (page_index == 1 and len(elements) == 1 and elements[0]['type'] == 'title' and not paragraph
+                  and len(line) <= _HEADING_MAX_CHARS):
+                add('subtitle', 'front_matter', 'important', text=line)
+            else:
+                paragraph.append(line)
+                for contact in inline_contacts(line, contacts):
+                    flush_paragraph()
+                    add_contact(contact)
+            i += 1
+    flush_paragraph()
+
+    for position, element in enumerate(elements):
+        element['position_hint'] = 'top' if position == 0 else ('bottom' if position == len(elements) - 1
+                                                                else 'middle')
+    # A heading followed by nothing but contact details closes the document
+    contact_page = len(elements) > 1 and all(element['pii_type'] != 'NONE' for element in elements[1:])
+    return {
+        'doc_id': doc_id,
+        'page_index': page_index,
+        'page_role': 'cover' if page_index == 1 else ('end_matter' if contact_page else 'main_content'),
+        'elements': elements,
+        'extracted_by': 'heuristic'
+    }
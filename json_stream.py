@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+JSON Stream Module for Master Template System
+Incremental parsing of page-structure JSON as Claude generates it
+"""
+
+import json
+import re
+from typing import Dict, List, Any, Optional
+
+# Top-level page fields worth keeping when only part of the object survived
+_PAGE_FIELDS = re.compile(r'"(doc_id|page_role)"\s*:\s*"([^"\\]*)"|"(page_index)"\s*:\s*(\d+)')
+
+
+class MalformedStreamError(ValueError):
+    """The generated text can no longer become valid page-structure JSON"""
+
+
+class ElementStreamParser:
+    def __init__(self, array_key: str = "elements", max_prefix_chars: int = 64):
+        """Incremental scanner emitting each entry of the top-level array_key as soon as it closes
+
+        Text is fed in arbitrary chunks. An optional ```json fence before the
+        object is skipped; anything else before the opening brace, or more
+        than max_prefix_chars of preamble, is reported as malformed at once.
+        """
+        self.array_key = array_key
+        self.max_prefix_chars = max_prefix_chars
+        self.text = ""
+        self.elements: List[Dict[str, Any]] = []
+        self.complete = False  # The top-level object has closed
+
+        self._pos = 0
+        self._started = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key = None
+        self._in_elements = False
+        self._element_start = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Add generated text; returns the elements completed by it"""
+        self.text += chunk
+        if not self._started and not self._find_start():
+            return []
+
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_key = text[self._string_start:i]
+                continue
+
+            if self.complete:
+                break
+            if char == '"':
+                self._in_string = True
+                self._string_start = i + 1
+            elif char in '{[':
+                if char == '[' and self._stack == ['{'] and self._last_key == self.array_key:
+                    self._in_elements = True
+                elif char == '{' and self._in_elements and len(self._stack) == 2:
+                    self._element_start = i
+                self._stack.append(char)
+            elif char in '}]':
+                if not self._stack or self._stack.pop() != ('{' if char == '}' else '['):
+                    raise MalformedStreamError(f"Unbalanced '{char}' at offset {i}")
+                if char == '}' and self._element_start is not None and len(self._stack) == 2:
+                    element = self._parse_element(text[self._element_start:i + 1])
+                    # Kept at once so elements before a later error survive it
+                    self.elements.append(element)
+                    completed.append(element)
+                    self._element_start = None
+                elif char == ']' and self._in_elements and len(self._stack) == 1:
+                    self._in_elements = False
+                if not self._stack:
+                    self.complete = True
+
+        self._pos = len(text)
+        return completed
+
+    def _find_start(self) -> bool:
+        """Skip whitespace and a code fence up to the opening brace; False if more text is needed"""
+        offset = len(self.text) - len(self.text.lstrip())
+        rest = self.text[offset:]
+        if rest.startswith('```'):
+            newline = rest.find('\n')
+            if newline == -1:
+                if len(rest) > self.max_prefix_chars:
+                    raise MalformedStreamError("Code fence never ended")
+                return False
+            offset += newline + 1
+            offset += len(self.text[offset:]) - len(self.text[offset:].lstrip())
+            rest = self.text[offset:]
+
+        if not rest or rest == '`' or rest == '``':
+            if offset > self.max_prefix_chars:
+                raise MalformedStreamError("No JSON object in response")
+            return False
+        if rest[0] != '{':
+            raise MalformedStreamError(f"Response does not start with a JSON object: {rest[:40]!r}")
+
+        self._started = True
+        self._pos = offset
+        return True
+
+    def _parse_element(self, raw: str) -> Dict[str, Any]:
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as e:
+            try:
+                return json.loads(strip_trailing_commas(raw))
+            except json.JSONDecodeError:
+                raise MalformedStreamError(f"Malformed element: {str(e)}")
+
+
+def strip_trailing_commas(text: str) -> str:
+    """Drop commas directly before a closing bracket, leaving string contents alone"""
+    out = []
+    in_string = escape = False
+    pending_comma = None
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if pending_comma is not None:
+            if char.isspace():
+                pending_comma.append(char)
+                continue
+            if char not in '}]':
+                out.append(',')
+            out.extend(pending_comma[1:])
+            pending_comma = None
+        if char == ',':
+            pending_comma = [',']
+            continue
+        if char == '"':
+            in_string = True
+        out.append(char)
+    if pending_comma is not None:
+        out.extend(pending_comma)
+    return ''.join(out)
+
+
+def salvage_page_json(text: str) -> Optional[Dict[str, Any]]:
+    """Recover a page structure from malformed or truncated JSON
+
+    Trailing commas are repaired first; failing that, every complete object
+    in the elements array is kept, along with doc_id, page_index and
+    page_role if they were generated. Returns None if no element survived.
+    """
+    body = text.strip()
+    if body.startswith('```'):
+        body = body.split('\n', 1)[1] if '\n' in body else ''
+    if body.endswith('```'):
+        body = body[:-3]
+    try:
+        page_json = json.loads(strip_trailing_commas(body))
+        if isinstance(page_json, dict):
+            return page_json
+    except json.JSONDecodeError:
+        pass
+
+    parser = ElementStreamParser()
+    try:
+        parser.feed(text)
+    except MalformedStreamError:
+        pass
+    if not parser.elements:
+        return None
+
+    page_json: Dict[str, Any] = {}
+    head = text[:text.find('"elements"')] if '"elements"' in text else text
+    for match in _PAGE_FIELDS.finditer(head):
+        if match.group(1):
+            page_json[match.group(1)] = match.group(2)
+        else:
+            page_json[match.group(3)] = int(match.group(4))
+    page_json['elements'] = parser.elements
+    return page_json
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Model Router Module for Master Template System
+Routes pages to a fast or a strong model by local complexity scoring
+"""
+
+import re
+from typing import Dict, Any, Tuple
+
+STRONG_MODEL_ID = "eu.anthropic.claude-sonnet-4-5-20250929-v1:0"
+SIMPLE_MODEL_ID = "eu.anthropic.claude-haiku-4-5-20251001-v1:0"
+
+# Markers the document parser writes around extracted tables and charts
+TABLE_MARKERS = ("\nTABLE:", "\nTABLES:", "\nCHART:")
+
+_NUMBER_LIKE = re.compile(r"^[$€£(+\-]?\d[\d.,:/%)\-]*$")
+
+
+class ModelRouter:
+    def __init__(self, simple_model_id: str = SIMPLE_MODEL_ID, strong_model_id: str = STRONG_MODEL_ID,
+                 threshold: float = 0.35, long_page_chars: int = 3000, dense_numeric_ratio: float = 0.25):
+        """Score pages from 0 (trivial) to 1 (complex); pages below threshold go to the simple model
+
+        The score weighs text length (saturating at long_page_chars), table or
+        chart markers from the parser and pipe-separated rows, and the share of
+        number-like tokens (saturating at dense_numeric_ratio).
+        """
+        self.simple_model_id = simple_model_id
+        self.strong_model_id = strong_model_id
+        self.threshold = threshold
+        self.long_page_chars = long_page_chars
+        self.dense_numeric_ratio = dense_numeric_ratio
+
+    def score(self, page_content: str) -> Dict[str, Any]:
+        """Complexity features of a page and their weighted score"""
+        text = page_content.strip()
+        tokens = text.split()
+        table_rows = sum(1 for line in text.splitlines() if line.count(" | ") >= 1)
+        has_table_marker = any(marker in "\n" + text for marker in TABLE_MARKERS)
+        numeric_ratio = (sum(1 for token in tokens if _NUMBER_LIKE.match(token)) / len(tokens)) if tokens else 0.0
+
+        length_score = min(1.0, len(text) / self.long_page_chars)
+        table_score = 1.0 if has_table_marker else min(1.0, table_rows / 3)
+        numeric_score = min(1.0, numeric_ratio / self.dense_numeric_ratio)
+
+        return {
+            "chars": len(text),
+            "table_rows": table_rows,
+            "has_table_marker": has_table_marker,
+            "numeric_ratio": round(numeric_ratio, 3),
+            "score": round(0.4 * length_score + 0.35 * table_score + 0.25 * numeric_score, 3)
+        }
+
+    def route(self, page_content: str) -> Tuple[str, float]:
+        """Pick the model for a page; returns (model_id, complexity score)"""
+        score = self.score(page_content)["score"]
+        return (self.simple_model_id if score < self.threshold else self.strong_model_id), score
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Parse Cache Module for Master Template System
+Content-addressed on-disk cache of parsed document pages
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from typing import Dict, List, Any, Optional
+
+DEFAULT_CACHE_DIR = os.environ.get("PARSE_CACHE_DIR", ".parse_cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+ENTRY_SUFFIX = ".jsonl.gz"
+
+
+class ParseCache:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        """Initialize a parse cache rooted at cache_dir, capped at max_bytes on disk"""
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(file_digest: str, backend: str, parser_version: str) -> str:
+        """Build a cache key from the file's SHA-256 plus the parser that read it"""
+        return hashlib.sha256(f"{file_digest}:{backend}:{parser_version}".encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Return the cached pages for key, or None on a miss"""
+        path = self._entry_path(key)
+
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path, None)
+        except (OSError, EOFError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return [record["text"] for record in sorted(records, key=lambda r: r["page_index"])]
+
+    def put(self, key: str, pages: List[str]):
+        """Store pages for key as compressed per-page records, then enforce the size cap"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                for page_index, text in enumerate(pages, start=1):
+                    f.write(json.dumps({"page_index": page_index, "text": text}) + "\n")
+            # Atomic so concurrent readers never see a partial entry
+            os.replace(tmp_path, self._entry_path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self._evict()
+
+    def invalidate(self, key: Optional[str] = None) -> int:
+        """Remove one entry, or every entry when key is None; returns entries removed"""
+        if key is not None:
+            try:
+                os.unlink(self._entry_path(key))
+                return 1
+            except FileNotFoundError:
+                return 0
+
+        removed = 0
+        for entry in self._entries():
+            try:
+                os.unlink(entry["path"])
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _entries(self) -> List[Dict[str, Any]]:
+        """List cache entries with their size and last-used time"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append({"path": path, "size": stat.st_size, "last_used": stat.st_mtime})
+        return entries
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self._entries(), key=lambda e: e["last_used"])
+        total = sum(e["size"] for e in entries)
+
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(entry["path"])
+            except FileNotFoundError:
+                pass
+            total -= entry["size"]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get entry count, disk usage and hit/miss counters"""
+        entries = self._entries()
+        return {
+            "cache_dir": self.cache_dir,
+            "entries": len(entries),
+            "total_bytes": sum(e["size"] for e in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+def main():
+    """Command line: inspect or invalidate the parse cache"""
+    arg_parser = argparse.ArgumentParser(description="Manage the on-disk parse cache")
+    arg_parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show entry count and disk usage")
+    invalidate = commands.add_parser("invalidate", help="Drop cached pages for the given files, or everything")
+    invalidate.add_argument("files", nargs="*", help="Documents whose cached pages should be dropped")
+    args = arg_parser.parse_args()
+
+    cache = ParseCache(args.cache_dir)
+
+    if args.command == "stats":
+        stats = cache.get_stats()
+        print(f"📦 {stats['entries']} entries, {stats['total_bytes']:,} bytes in {stats['cache_dir']}")
+        return 0
+
+    if not args.files:
+        print(f"🗑️ Removed {cache.invalidate()} entries")
+        return 0
+
+    from parsing import DocumentParser
+    parser = DocumentParser(cache=cache)
+    removed = sum(parser.invalidate_cache(path) for path in args.files)
+    print(f"🗑️ Removed {removed} entries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,18 @@
 import streamlit as st
-from typing import List, BinaryIO
+from typing import List, BinaryIO, Generator, Iterable, Iterator, Optional
+import hashlib
 import io
+import math
+import mmap
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from parse_cache import ParseCache
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # PDF parsing
 try:
@@ -22,120 +34,474 @@ try:
 except ImportError:
     PPTX_AVAILABLE = False
 
+# Bump whenever page extraction output changes so cached parses are not reused
+PARSER_VERSION = "1"
+
+# Inputs that have to be copied (non-seekable streams) stay in memory up to
+# this size and are spooled to a temporary file on disk beyond it
+SPOOL_THRESHOLD = 32 * 1024 * 1024
+
 class DocumentParser:
-    def __init__(self):
-        """Initialize document parser with available libraries"""
+    def __init__(self, pdf_workers: int = 1, cache: Optional[ParseCache] = None):
+        """Initialize document parser with available libraries
+        
+        pdf_workers > 1 extracts PDF pages in that many worker processes;
+        0 uses one worker per CPU core. With a cache, repeat uploads of the
+        same bytes return their stored pages instead of being re-parsed.
+        """
+        self.pdf_workers = pdf_workers if pdf_workers > 0 else (os.cpu_count() or 1)
+        self.cache = cache
+        
         if not PDF_AVAILABLE:
             st.warning("PDF parsing not available. Install PyPDF2 or pdfplumber: pip install PyPDF2 pdfplumber")
         if not PPTX_AVAILABLE:
             st.warning("PPTX parsing not available. Install python-pptx: pip install python-pptx")
     
-    def parse_document(self, uploaded_file) -> List[str]:
+    def parse_document(self, uploaded_file, file_name: Optional[str] = None) -> List[str]:
         """Parse uploaded document and return list of page contents"""
+        return list(self.iter_pages(uploaded_file, file_name))
+    
+    def iter_pages(self, uploaded_file, file_name: Optional[str] = None) -> Iterator[str]:
+        """Yield page contents one at a time, as soon as each page is extracted
         
-        file_extension = uploaded_file.name.lower().split('.')[-1]
+        uploaded_file may be an uploaded file object, a file path, bytes, a
+        memoryview (e.g. UploadedFile.getbuffer()) or an mmap.mmap; the
+        document bytes are read in place rather than copied. file_name gives
+        the type for inputs that carry no name.
+        """
         
-        if file_extension == 'pdf':
-            return self._parse_pdf(uploaded_file)
-        elif file_extension == 'pptx':
-            return self._parse_pptx(uploaded_file)
-        else:
-            st.error(f"Unsupported file type: {file_extension}")
-            return []
+        # A non-seekable stream is copied once, so it can be sniffed, hashed and parsed
+        with _rereadable_input(uploaded_file) as source:
+            file_extension = _file_extension(source, file_name or getattr(uploaded_file, 'name', None))
+            
+            if file_extension == 'pdf':
+                pages = self._iter_pdf_pages(source)
+            elif file_extension == 'pptx':
+                pages = self._iter_pptx_pages(source)
+            else:
+                st.error(f"Unsupported file type: {file_extension}")
+                return
+            
+            if self.cache is None:
+                yield from pages
+                return
+            
+            cache_key = self._cache_key(source, file_extension)
+            cached_pages = self.cache.get(cache_key)
+            if cached_pages is not None:
+                yield from cached_pages
+                return
+            
+            parsed_pages = []
+            parsed_ok = yield from _recorded(pages, parsed_pages)
+            # Only complete, error-free parses are cached
+            if parsed_ok:
+                try:
+                    self.cache.put(cache_key, parsed_pages)
+                except OSError as e:
+                    st.warning(f"Could not write parse cache: {str(e)}")
+    
+    def _cache_key(self, uploaded_file, file_extension: str) -> str:
+        """Cache key from the document's SHA-256 plus the backend that parses it"""
+        return ParseCache.make_key(file_sha256(uploaded_file), _backend_id(file_extension), PARSER_VERSION)
+    
+    def invalidate_cache(self, uploaded_file, file_name: Optional[str] = None) -> int:
+        """Drop any cached pages for this document"""
+        if self.cache is None:
+            return 0
+        with _rereadable_input(uploaded_file) as source:
+            file_extension = _file_extension(source, file_name or getattr(uploaded_file, 'name', None))
+            return self.cache.invalidate(self._cache_key(source, file_extension))
     
     def _parse_pdf(self, uploaded_file) -> List[str]:
         """Parse PDF file and extract text from each page"""
+        return list(self._iter_pdf_pages(uploaded_file))
+    
+    def _iter_pdf_pages(self, uploaded_file) -> Generator[str, None, bool]:
+        """Extract text from each PDF page, yielding pages in order
+        
+        Returns True once every page was extracted without a parse error.
+        """
         
         if not PDF_AVAILABLE:
             st.error("PDF parsing libraries not available")
-            return []
+            return False
         
         try:
-            # Read file content
-            file_content = uploaded_file.read()
-            uploaded_file.seek(0)  # Reset file pointer
-            
-            pages = []
-            
-            if 'USE_PDFPLUMBER' in globals() and USE_PDFPLUMBER:
-                # Use pdfplumber for better text extraction
-                import pdfplumber
-                
-                with pdfplumber.open(io.BytesIO(file_content)) as pdf:
-                    for page_num, page in enumerate(pdf.pages):
-                        try:
-                            text = page.extract_text()
-                            
-                            # Also try to extract tables
-                            tables = page.extract_tables()
-                            if tables:
-                                text += "\n\nTABLES:\n"
-                                for table in tables:
-                                    for row in table:
-                                        if row:
-                                            text += " | ".join([cell or "" for cell in row]) + "\n"
-                            
-                            pages.append(text or f"[Page {page_num + 1} - No text extracted]")
-                        except Exception as e:
-                            pages.append(f"[Page {page_num + 1} - Error extracting text: {str(e)}]")
+            # pdfplumber gives better text extraction; PyPDF2 is the fallback
+            use_pdfplumber = 'USE_PDFPLUMBER' in globals() and USE_PDFPLUMBER
             
-            else:
-                # Use PyPDF2 as fallback
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-                
-                for page_num in range(len(pdf_reader.pages)):
-                    try:
-                        page = pdf_reader.pages[page_num]
-                        text = page.extract_text()
-                        pages.append(text or f"[Page {page_num + 1} - No text extracted]")
-                    except Exception as e:
-                        pages.append(f"[Page {page_num + 1} - Error extracting text: {str(e)}]")
+            with _open_input(uploaded_file) as stream:
+                pdf = _open_pdf(stream, use_pdfplumber)
+                try:
+                    page_count = len(pdf.pages)
+                    workers = min(self.pdf_workers, page_count)
+                    
+                    if workers > 1:
+                        yield from self._iter_pdf_pages_parallel(
+                            uploaded_file, stream, page_count, workers, use_pdfplumber
+                        )
+                    else:
+                        for page_num in range(page_count):
+                            yield _pdf_page_text(pdf, use_pdfplumber, page_num)
+                finally:
+                    if use_pdfplumber:
+                        pdf.close()
             
-            return pages
+            return True
             
         except Exception as e:
             st.error(f"Error parsing PDF: {str(e)}")
-            return []
+            return False
+    
+    def _iter_pdf_pages_parallel(self, uploaded_file, stream: BinaryIO, page_count: int,
+                                 workers: int, use_pdfplumber: bool) -> Iterator[str]:
+        """Split the page range across a process pool, yielding pages in order"""
+        
+        # Several small ranges per worker so early pages are yielded while
+        # later ranges are still being extracted
+        range_size = max(1, math.ceil(page_count / (workers * 4)))
+        starts = range(0, page_count, range_size)
+        
+        # Workers open the file by path, so the document is never pickled
+        with _input_path(uploaded_file, stream) as path:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_pdf_worker,
+                initargs=(path, use_pdfplumber)
+            ) as executor:
+                for texts in executor.map(_extract_pdf_worker_range, starts, [range_size] * len(starts)):
+                    yield from texts
     
     def _parse_pptx(self, uploaded_file) -> List[str]:
         """Parse PPTX file and extract content from each slide"""
+        return list(self._iter_pptx_pages(uploaded_file))
+    
+    def _iter_pptx_pages(self, uploaded_file) -> Generator[str, None, bool]:
+        """Extract content from each PPTX slide, yielding slides in order
+        
+        Returns True once every slide was extracted without a parse error.
+        """
         
         if not PPTX_AVAILABLE:
             st.error("PPTX parsing library not available")
-            return []
+            return False
         
         try:
-            # Read file content
-            file_content = uploaded_file.read()
-            uploaded_file.seek(0)  # Reset file pointer
+            with _open_input(uploaded_file) as stream:
+                yield from self._iter_slides(Presentation(stream))
+            
+            return True
             
-            prs = Presentation(io.BytesIO(file_content))
-            slides = []
+        except Exception as e:
+            st.error(f"Error parsing PPTX: {str(e)}")
+            return False
+    
+    def _iter_slides(self, prs) -> Iterator[str]:
+        """Extract content from each slide of an opened presentation"""
+        
+        for slide_num, slide in enumerate(prs.slides):
+            slide_text = f"SLIDE {slide_num + 1}:\n"
             
-            for slide_num, slide in enumerate(prs.slides):
-                slide_text = f"SLIDE {slide_num + 1}:\n"
+            # Extract text from all shapes
+            for shape in slide.shapes:
+                if hasattr(shape, "text") and shape.text.strip():
+                    slide_text += f"{shape.text.strip()}\n"
                 
-                # Extract text from all shapes
-                for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text.strip():
-                        slide_text += f"{shape.text.strip()}\n"
-                    
-                    # Handle tables
-                    if shape.has_table:
-                        slide_text += "\nTABLE:\n"
-                        table = shape.table
-                        for row in table.rows:
-                            row_text = " | ".join([cell.text.strip() for cell in row.cells])
-                            slide_text += f"{row_text}\n"
-                    
-                    # Handle charts (basic text extraction)
-                    if shape.has_chart:
-                        slide_text += f"\nCHART: {shape.chart.chart_title.text_frame.text if shape.chart.chart_title else 'Untitled Chart'}\n"
+                # Handle tables
+                if shape.has_table:
+                    slide_text += "\nTABLE:\n"
+                    table = shape.table
+                    for row in table.rows:
+                        row_text = " | ".join([cell.text.strip() for cell in row.cells])
+                        slide_text += f"{row_text}\n"
                 
-                slides.append(slide_text)
-            
-            return slides
+                # Handle charts (basic text extraction)
+                if shape.has_chart:
+                    slide_text += f"\nCHART: {shape.chart.chart_title.text_frame.text if shape.chart.chart_title else 'Untitled Chart'}\n"
             
-        except Exception as e:
-            st.error(f"Error parsing PPTX: {str(e)}")
-            return []
+            yield slide_text
+
+
+def _pdfplumber_page_text(page, page_num: int) -> str:
+    """Extract text and tables from a single pdfplumber page"""
+    try:
+        text = page.extract_text()
+        
+        # Also try to extract tables
+        tables = page.extract_tables()
+        if tables:
+            text += "\n\nTABLES:\n"
+            for table in tables:
+                for row in table:
+                    if row:
+                        text += " | ".join([cell or "" for cell in row]) + "\n"
+        
+        return text or f"[Page {page_num + 1} - No text extracted]"
+    except Exception as e:
+        return f"[Page {page_num + 1} - Error extracting text: {str(e)}]"
+
+
+def _pypdf2_page_text(pdf_reader, page_num: int) -> str:
+    """Extract text from a single PyPDF2 page"""
+    try:
+        page = pdf_reader.pages[page_num]
+        text = page.extract_text()
+        return text or f"[Page {page_num + 1} - No text extracted]"
+    except Exception as e:
+        return f"[Page {page_num + 1} - Error extracting text: {str(e)}]"
+
+
+def _pdf_page_text(pdf, use_pdfplumber: bool, page_num: int) -> str:
+    """Extract a single page with whichever backend opened the PDF"""
+    if use_pdfplumber:
+        return _pdfplumber_page_text(pdf.pages[page_num], page_num)
+    return _pypdf2_page_text(pdf, page_num)
+
+
+def _open_pdf(stream: BinaryIO, use_pdfplumber: bool):
+    """Open a PDF from a binary stream with the selected backend"""
+    if use_pdfplumber:
+        import pdfplumber
+        return pdfplumber.open(stream)
+    return PyPDF2.PdfReader(stream)
+
+
+# Per-process state for parallel PDF extraction; each worker opens the PDF once
+_worker_file = None
+_worker_pdf = None
+_worker_use_pdfplumber = False
+
+
+def _init_pdf_worker(path: str, use_pdfplumber: bool):
+    """Process pool initializer: open this worker's own handle on the PDF"""
+    global _worker_file, _worker_pdf, _worker_use_pdfplumber
+    _worker_file = open(path, 'rb')
+    _worker_pdf = _open_pdf(_worker_file, use_pdfplumber)
+    _worker_use_pdfplumber = use_pdfplumber
+
+
+def _extract_pdf_worker_range(start: int, count: int) -> List[str]:
+    """Process pool task: extract a contiguous page range in this worker"""
+    stop = min(start + count, len(_worker_pdf.pages))
+    return [_pdf_page_text(_worker_pdf, _worker_use_pdfplumber, page_num) for page_num in range(start, stop)]
+
+
+class _BufferReader(io.RawIOBase):
+    """Read-only, seekable file view over a buffer that never copies it whole"""
+    
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def readinto(self, b) -> int:
+        size = max(0, min(len(b), len(self._view) - self._pos))
+        b[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self._pos = offset
+        return self._pos
+    
+    def tell(self) -> int:
+        return self._pos
+    
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def _is_seekable(file_obj) -> bool:
+    try:
+        return file_obj.seekable()
+    except (AttributeError, ValueError):
+        return False
+
+
+@contextmanager
+def _open_input(source) -> Iterator[BinaryIO]:
+    """Yield a seekable binary stream over any supported input without
+    duplicating its bytes in memory"""
+    
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield f
+    elif isinstance(source, mmap.mmap):
+        source.seek(0)
+        yield source
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        reader = _BufferReader(source)
+        try:
+            yield reader
+        finally:
+            reader.close()
+    elif _is_seekable(source):
+        # Uploaded files are already seekable in memory; read them in place
+        source.seek(0)
+        try:
+            yield source
+        finally:
+            source.seek(0)  # Reset file pointer
+    else:
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD) as spool:
+            shutil.copyfileobj(source, spool)
+            spool.seek(0)
+            yield spool
+
+
+@contextmanager
+def _rereadable_input(source) -> Iterator:
+    """Yield the input itself when it can be read more than once, else a
+    spooled copy of the non-seekable stream"""
+    
+    if isinstance(source, (str, os.PathLike, mmap.mmap, bytes, bytearray, memoryview)) or _is_seekable(source):
+        yield source
+        return
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD) as spool:
+        shutil.copyfileobj(source, spool)
+        spool.seek(0)
+        yield spool
+
+
+@contextmanager
+def _input_path(source, stream: BinaryIO) -> Iterator[str]:
+    """Yield a file path for the input, spooling it to a temporary file when
+    it only exists in memory"""
+    
+    if isinstance(source, (str, os.PathLike)):
+        yield os.fspath(source)
+        return
+    
+    position = stream.tell()
+    stream.seek(0)
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as spool:
+        shutil.copyfileobj(stream, spool)
+    stream.seek(position)
+    try:
+        yield spool.name
+    finally:
+        os.unlink(spool.name)
+
+
+def _file_extension(source, file_name: Optional[str] = None) -> str:
+    """Work out the document type from its name, falling back to its magic bytes"""
+    
+    name = file_name or getattr(source, 'name', None)
+    if name is None and isinstance(source, (str, os.PathLike)):
+        name = os.fspath(source)
+    if isinstance(name, str) and '.' in name:
+        return name.lower().split('.')[-1]
+    
+    with _open_input(source) as stream:
+        header = stream.read(4)
+    if header.startswith(b'%PDF'):
+        return 'pdf'
+    if header.startswith(b'PK'):
+        return 'pptx'
+    return name or 'unknown'
+
+
+def file_sha256(source) -> str:
+    """SHA-256 of a document's bytes, hashed in place without copying it"""
+    digest = hashlib.sha256()
+    
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        digest.update(source)
+        return digest.hexdigest()
+    
+    chunk = memoryview(bytearray(1024 * 1024))
+    with _open_input(source) as stream:
+        while True:
+            size = stream.readinto(chunk)
+            if not size:
+                break
+            digest.update(chunk[:size])
+    
+    return digest.hexdigest()
+
+
+def _backend_id(file_extension: str) -> str:
+    """Name and version of the library that parses this file type"""
+    if file_extension == 'pdf':
+        if 'USE_PDFPLUMBER' in globals() and USE_PDFPLUMBER:
+            import pdfplumber
+            return f"pdfplumber-{pdfplumber.__version__}"
+        return f"PyPDF2-{PyPDF2.__version__}" if PDF_AVAILABLE else "none"
+    if file_extension == 'pptx':
+        if not PPTX_AVAILABLE:
+            return "none"
+        import pptx
+        return f"python-pptx-{pptx.__version__}"
+    return file_extension
+
+
+def _recorded(pages: Generator[str, None, bool], record: List[str]) -> Generator[str, None, bool]:
+    """Yield from a page generator, appending each page to record, and pass
+    through the generator's return value"""
+    while True:
+        try:
+            page = next(pages)
+        except StopIteration as finished:
+            return finished.value
+        record.append(page)
+        yield page
+
+
+def prefetch_pages(pages: Iterable[str], depth: int = 4) -> Iterator[str]:
+    """Drive a page iterator from a background thread so that extraction of the
+    next pages overlaps with whatever the caller does with the current one"""
+    
+    buffer = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+    done = object()
+    
+    def put(item) -> bool:
+        # Give up once the consumer has gone away instead of blocking forever
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        try:
+            for page in pages:
+                if not put(page):
+                    return
+            put(done)
+        except BaseException as e:
+            put(e)
+    
+    worker = threading.Thread(target=produce, name="page-prefetch", daemon=True)
+    # Keep st.* calls made while parsing attached to the current Streamlit session
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None:
+        add_script_run_ctx(worker, ctx)
+    worker.start()
+    
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
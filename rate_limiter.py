@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter Module for Master Template System
+Adaptive (AIMD) concurrency limiter for Bedrock calls
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, initial_window: float = 4, min_window: float = 1, max_window: float = 16,
+                 additive_increase: float = 1.0, multiplicative_decrease: float = 0.5,
+                 base_delay: float = 0.5, max_delay: float = 20.0):
+        """Initialize an additive-increase / multiplicative-decrease concurrency window
+
+        The window is the number of calls allowed in flight. Every success grows
+        it by additive_increase / window (about +additive_increase per window of
+        successes); every throttle multiplies it by multiplicative_decrease,
+        at most once per round trip so a burst of throttles only cuts once.
+        base_delay and max_delay bound the jittered retry backoff.
+        """
+        self.min_window = min_window
+        self.max_window = max(max_window, min_window)
+        self.window = min(max(initial_window, min_window), self.max_window)
+        self.additive_increase = additive_increase
+        self.multiplicative_decrease = multiplicative_decrease
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.in_flight = 0
+        self.successes = 0
+        self.throttles = 0
+        self.retries = 0
+        self.window_cuts = 0
+        self.min_window_seen = self.window
+        self._last_cut = 0.0
+        self._last_latency = 1.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Block until the window has room for another call"""
+        with self._condition:
+            while self.in_flight >= max(1, int(self.window)):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        """Free the slot taken by acquire"""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one slot of the window for the duration of a call"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self, latency: Optional[float] = None):
+        """Grow the window additively after a successful call"""
+        with self._condition:
+            self.successes += 1
+            if latency is not None:
+                self._last_latency = latency
+            self.window = min(self.max_window, self.window + self.additive_increase / self.window)
+            self._condition.notify_all()
+
+    def on_throttle(self):
+        """Cut the window multiplicatively after a throttled call"""
+        with self._condition:
+            self.throttles += 1
+            now = time.monotonic()
+            # Calls already in flight when we cut will throttle too; one cut per round trip
+            if now - self._last_cut >= self._last_latency:
+                self.window = max(self.min_window, self.window * self.multiplicative_decrease)
+                self.window_cuts += 1
+                self.min_window_seen = min(self.min_window_seen, self.window)
+                self._last_cut = now
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than a server Retry-After hint"""
+        with self._condition:
+            self.retries += 1
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the current window and throttle counters"""
+        with self._condition:
+            return {
+                "window": round(self.window, 2),
+                "min_window": self.min_window,
+                "max_window": self.max_window,
+                "min_window_seen": round(self.min_window_seen, 2),
+                "in_flight": self.in_flight,
+                "successes": self.successes,
+                "throttles": self.throttles,
+                "window_cuts": self.window_cuts,
+                "retries": self.retries
+            }
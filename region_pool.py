@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Region Pool Module for Master Template System
+Spreads Bedrock calls over several regions and steers them away from unhealthy ones
+"""
+
+import threading
+import time
+from typing import Dict, List, Any, Callable, Optional
+
+import boto3
+from botocore.config import Config
+
+from rate_limiter import AdaptiveRateLimiter
+
+# Geography prefix of cross-region inference profiles, by region name prefix
+PROFILE_PREFIXES = {'eu-': 'eu', 'us-': 'us', 'ca-': 'us', 'ap-': 'apac'}
+
+
+def create_runtime_client(spec: Dict[str, Any], pool_size: int):
+    """bedrock-runtime client for one region spec, honouring its endpoint_url"""
+    return boto3.client(
+        service_name='bedrock-runtime',
+        region_name=spec['region'],
+        endpoint_url=spec.get('endpoint_url'),
+        config=Config(
+            max_pool_connections=max(10, pool_size),
+            # Throttling retries go through the rate limiter instead
+            retries={'mode': 'standard', 'total_max_attempts': 1}
+        )
+    )
+
+
+def regional_model_id(model_id: str, spec: Dict[str, Any]) -> str:
+    """The model or inference profile to call in a region
+
+    An explicit spec['model_ids'] mapping wins; otherwise the geography
+    prefix of a cross-region inference profile (eu., us., apac.) is swapped
+    for the region's own, from spec['profile_prefix'] or the region name.
+    """
+    if model_id in spec.get('model_ids', {}):
+        return spec['model_ids'][model_id]
+    geography, _, rest = model_id.partition('.')
+    if geography not in PROFILE_PREFIXES.values() or not rest:
+        return model_id
+    prefix = spec.get('profile_prefix')
+    if prefix is None:
+        prefix = next((value for key, value in PROFILE_PREFIXES.items() if spec['region'].startswith(key)),
+                      geography)
+    return f"{prefix}.{rest}"
+
+
+class RegionPool:
+    def __init__(self, regions: List[Dict[str, Any]], max_concurrency: int = 4,
+                 error_threshold: int = 2, cooldown_seconds: float = 30.0,
+                 client_factory: Optional[Callable[[Dict[str, Any], int], Any]] = None):
+        """Bedrock runtimes in several regions, each with its own concurrency window
+
+        Each region spec is a dict with 'region' and optionally 'endpoint_url'
+        (e.g. a local stand-in server), 'max_concurrency', 'model_ids' or
+        'profile_prefix' (see regional_model_id). Calls go to the region with
+        the most free room in its adaptive window, so a throttling region,
+        whose window shrinks, gets fewer of them; after error_threshold
+        consecutive errors a region is left alone for cooldown_seconds.
+        client_factory(spec, pool_size) builds each region's runtime client.
+        """
+        if not regions:
+            raise ValueError("RegionPool needs at least one region")
+        self.error_threshold = error_threshold
+        self.cooldown_seconds = cooldown_seconds
+        client_factory = client_factory or create_runtime_client
+
+        self.regions: List[Dict[str, Any]] = []
+        for spec in regions:
+            concurrency = max(1, spec.get('max_concurrency', max_concurrency))
+            self.regions.append({
+                'spec': spec,
+                'name': spec.get('name', spec['region']),
+                'runtime': client_factory(spec, concurrency),
+                'limiter': AdaptiveRateLimiter(initial_window=concurrency, max_window=concurrency),
+                'calls': 0,
+                'throttles': 0,
+                'errors': 0,
+                'consecutive_errors': 0,
+                'cooldown_until': 0.0
+            })
+        self._lock = threading.Lock()
+
+    @property
+    def max_concurrency(self) -> int:
+        """Calls the pool can have in flight across all regions"""
+        return sum(int(region['limiter'].max_window) for region in self.regions)
+
+    def choose(self, avoid: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """The region for the next call, preferring any other than avoid
+
+        Regions cooling down after errors are skipped unless all are, in
+        which case the one recovering first is used.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [region for region in self.regions if region is not avoid] or self.regions
+            healthy = [region for region in candidates if region['cooldown_until'] <= now]
+
+            def free_share(region):
+                metrics = region['limiter'].get_metrics()
+                return (metrics['window'] - metrics['in_flight']) / metrics['window'], -region['calls']
+
+            if healthy:
+                region = max(healthy, key=free_share)
+            else:
+                region = min(candidates, key=lambda region: region['cooldown_until'])
+            region['calls'] += 1
+            return region
+
+    def model_id(self, region: Dict[str, Any], model_id: str) -> str:
+        """model_id as it is called in region"""
+        return regional_model_id(model_id, region['spec'])
+
+    def on_success(self, region: Dict[str, Any], latency: float):
+        """Grow the region's window and clear its error streak"""
+        region['limiter'].on_success(latency)
+        with self._lock:
+            region['consecutive_errors'] = 0
+
+    def on_throttle(self, region: Dict[str, Any]):
+        """Shrink the region's window so it is offered fewer calls"""
+        region['limiter'].on_throttle()
+        with self._lock:
+            region['throttles'] += 1
+
+    def on_error(self, region: Dict[str, Any]):
+        """Count a failed call; enough in a row put the region into cooldown"""
+        with self._lock:
+            region['errors'] += 1
+            region['consecutive_errors'] += 1
+            if region['consecutive_errors'] >= self.error_threshold:
+                region['cooldown_until'] = time.monotonic() + self.cooldown_seconds
+
+    def get_metrics(self) -> List[Dict[str, Any]]:
+        """Per-region call, throttle and error counts with the current window"""
+        now = time.monotonic()
+        with self._lock:
+            regions = [dict(region) for region in self.regions]
+        return [{
+            'region': region['name'],
+            'calls': region['calls'],
+            'throttles': region['throttles'],
+            'errors': region['errors'],
+            'window': region['limiter'].get_metrics()['window'],
+            'cooling_down': region['cooldown_until'] > now
+        } for region in regions]
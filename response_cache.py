@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Response Cache Module for Master Template System
+SQLite-backed cache of Bedrock model responses
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+DEFAULT_CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", ".bedrock_cache.sqlite3")
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ResponseCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_BYTES, bypass: bool = False):
+        """Initialize a response cache stored in the SQLite database at path
+
+        Entries older than ttl_seconds are treated as misses (None keeps them
+        forever); least recently used entries are evicted once the stored
+        responses exceed max_bytes. With bypass set, lookups always miss but
+        fresh responses are still stored.
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model_id TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_accessed ON responses(last_accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_id: str, request_body: Dict[str, Any]) -> str:
+        """Hash the model and the full request body: system prompt, messages and generation parameters"""
+        canonical = json.dumps({"model_id": model_id, "body": request_body}, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response body for key, or None on a miss"""
+        if self.bypass:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or (self.ttl_seconds is not None and now - row[1] > self.ttl_seconds):
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET last_accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+
+        return json.loads(row[0])
+
+    def put(self, key: str, model_id: str, response_body: Dict[str, Any]):
+        """Store a response body, then evict expired and least recently used entries"""
+        response = json.dumps(response_body)
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model_id, response, size, created_at, last_accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_id, response, len(response), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """Drop expired entries, then the least recently used until under max_bytes"""
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evict_keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_accessed ASC"):
+            if total <= self.max_bytes:
+                break
+            evict_keys.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evict_keys)
+
+    def clear(self) -> int:
+        """Remove every cached response; returns entries removed"""
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM responses").rowcount
+            self._conn.commit()
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and storage usage"""
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0,
+            "entries": entries,
+            "total_bytes": total,
+            "max_bytes": self.max_bytes,
+            "bypass": self.bypass
+        }
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
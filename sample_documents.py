@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Sample Documents Module for Master Template System
+Builds small in-memory PDF and PPTX uploads for tests and benchmarks
+"""
+
+import io
+from typing import List
+
+
+def build_sample_pdf(page_texts: List[str], padding_bytes: int = 0) -> bytes:
+    """Build a minimal text-only PDF with one page per entry in page_texts
+
+    padding_bytes adds an unreferenced stream object, inflating the file the
+    way embedded images do without adding text to extract.
+    """
+
+    def escape(text: str) -> str:
+        return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    page_count = len(page_texts)
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(page_count)), page_count
+        ),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    for i, text in enumerate(page_texts):
+        lines = " T* ".join(f"({escape(line)}) Tj" for line in text.split("\n"))
+        stream = f"BT /F1 12 Tf 14 TL 72 720 Td {lines} ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    if padding_bytes:
+        objects.append(f"<< /Length {padding_bytes} >>\nstream\n{' ' * padding_bytes}\nendstream")
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+
+    xref_offset = output.tell()
+    output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    for offset in offsets:
+        output.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+    output.write(
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1")
+    )
+    return output.getvalue()
+
+
+def build_sample_pptx(slide_texts: List[str]) -> bytes:
+    """Build a PPTX deck with one title-only slide per entry in slide_texts"""
+    from pptx import Presentation
+
+    prs = Presentation()
+    for text in slide_texts:
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+        slide.shapes.title.text = text
+
+    output = io.BytesIO()
+    prs.save(output)
+    return output.getvalue()
+
+
+def make_upload(data: bytes, name: str) -> io.BytesIO:
+    """Wrap bytes like a Streamlit UploadedFile"""
+    upload = io.BytesIO(data)
+    upload.name = name
+    return upload
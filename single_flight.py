@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Single Flight Module for Master Template System
+Lets concurrent identical requests share one call instead of each making their own
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        """Calls in flight by key; a caller arriving with a key already in flight waits for that call
+
+        Only calls that overlap are shared: once a call finished its key is
+        free again, so later repeats are a response cache's job. One instance
+        may be shared between clients, so identical requests from different
+        sessions coalesce too.
+        """
+        self.stats = {'calls': 0, 'coalesced': 0}
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, call: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run call() unless a call with key is in flight; returns its result and whether it was shared
+
+        Every caller sharing a call gets the same result object, or has the
+        same exception raised.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+                self.stats['calls'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            return future.result(), True
+        try:
+            result = call()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get how many requests made a call and how many shared one already in flight"""
+        with self._lock:
+            stats = dict(self.stats)
+            in_flight = len(self._in_flight)
+        requests = stats['calls'] + stats['coalesced']
+        return {
+            **stats,
+            'in_flight': in_flight,
+            'coalesce_rate': round(stats['coalesced'] / requests * 100, 1) if requests else 0.0
+        }
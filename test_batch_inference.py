@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Batch Inference
+Runs the batch job flow end to end against the local directory backend
+"""
+
+import json
+import os
+import tempfile
+
+from batch_inference import BatchInference, BatchInferenceError, LocalBatchBackend
+from test_bedrock_client import StubRuntime, make_client, page_structure_json, prompt_page
+
+
+def test_batch_job_round_trip():
+    """Test pages go out as batch records and come back as per-page structures"""
+    print("🧪 Testing batch inference round trip...")
+
+    def reply(request):
+        page = prompt_page(request)
+        if "corrupt" in page:
+            return "not json"
+        return page_structure_json("doc_1", int(page.split()[-1]))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        runtime = StubRuntime(reply)
+        client = make_client()
+        batch = BatchInference(client, LocalBatchBackend(os.path.join(tmp_dir, "service"), runtime),
+                               os.path.join(tmp_dir, "work"))
+
+        pages = [(f"Page {i}", "doc_1", i) for i in range(1, 5)]
+        pages[2] = ("corrupt Page 3", "doc_1", 3)
+        job = batch.submit(pages, "quarterly")
+
+        # The job file uses Bedrock's batch record format
+        with open(job["input_path"]) as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) == 4 and all(set(r) == {"recordId", "modelInput"} for r in records)
+        assert records[0]["modelInput"]["anthropic_version"] == "bedrock-2023-05-31"
+        assert isinstance(records[0]["modelInput"]["system"], str), "❌ Batch records should not carry cache points"
+        assert len(client.bedrock_runtime.calls) == 0, "❌ Batch mode called InvokeModel directly"
+
+        # A later process can pick the job up from its manifest
+        resumed = batch.load_job("quarterly")
+        assert batch.wait(resumed, poll_interval=0) == "Completed"
+        results = batch.ingest(resumed)
+
+        assert [r["page_index"] for r in results] == [1, 2, 3, 4], "❌ Results out of submission order"
+        assert results[0]["page_json"] == json.loads(page_structure_json("doc_1", 1))
+        assert results[2]["page_json"] is None and "doc_1 page 3" in results[2]["error"]
+        assert client.get_usage_summary()["calls"] == 4, "❌ Batch token usage was not recorded"
+
+    print("✅ Batch job results ingested per page")
+
+
+def test_batch_record_errors_and_failed_jobs():
+    """Test failed records surface as page errors and failed jobs raise"""
+
+    class FailingRuntime(StubRuntime):
+        def invoke_model(self, modelId, body):
+            if "Page 2" in body:
+                raise ValueError("model error")
+            return super().invoke_model(modelId, body)
+
+    class FailedBackend(LocalBatchBackend):
+        def get_status(self, job_id):
+            return "Failed"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        client = make_client()
+        backend = LocalBatchBackend(os.path.join(tmp_dir, "service"), FailingRuntime())
+        results = BatchInference(client, backend, tmp_dir).run(
+            [("Page 1", "doc_1", 1), ("Page 2", "doc_1", 2)], poll_interval=0
+        )
+        assert results[0]["error"] is None
+        assert "model error" in results[1]["error"], f"❌ Record error not reported: {results[1]}"
+
+        batch = BatchInference(client, FailedBackend(os.path.join(tmp_dir, "service"), StubRuntime()), tmp_dir)
+        try:
+            batch.run([("Page 1", "doc_1", 1)], poll_interval=0)
+            assert False, "❌ Failed job did not raise"
+        except BatchInferenceError as e:
+            assert "Failed" in str(e)
+
+    print("✅ Batch record and job failures reported")
+
+
+def test_batch_contact_prepass():
+    """Test pages the contact pre-pass covers skip the job and hinted contacts are merged back"""
+    print("🧪 Testing contact pre-pass in batch jobs...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        client = make_client(contact_prepass=True)
+        batch = BatchInference(client, LocalBatchBackend(os.path.join(tmp_dir, "service"), StubRuntime()),
+                               os.path.join(tmp_dir, "work"))
+        pages = [("Contact Us\nEmail: support@acme.com\nTel: +44 20 7946 0958", "doc_1", 9),
+                 ("Results\nQuestions? ir@acme.com", "doc_1", 2)]
+        job = batch.submit(pages, "contacts")
+
+        with open(job["input_path"]) as f:
+            records = [json.loads(line) for line in f]
+        assert [r["recordId"] for r in records] == [job["records"][1][0]], "❌ A covered page was submitted"
+
+        batch.wait(job, poll_interval=0)
+        results = batch.ingest(batch.load_job("contacts"))
+        assert results[0]["page_json"]["extracted_by"] == "prepass"
+        assert [e["type"] for e in results[1]["page_json"]["elements"]] == ["title", "support_email"], \
+            "❌ Hinted contact missing from the batch answer"
+
+        # With every page covered no job is submitted at all
+        job = batch.submit(pages[:1], "contacts-only")
+        assert job["job_id"] is None and batch.wait(job, poll_interval=0) == "Completed"
+        assert batch.ingest(job)[0]["page_json"]["extracted_by"] == "prepass"
+
+    print("✅ Contact pre-pass findings kept in batch mode")
+
+
+if __name__ == "__main__":
+    test_batch_job_round_trip()
+    test_batch_record_errors_and_failed_jobs()
+    test_batch_contact_prepass()
+    print("\n🎉 All batch inference tests passed!")
@@ -0,0 +1,1007 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Bedrock Client
+Exercises BedrockClient request handling against an in-process stub runtime
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from botocore.exceptions import ClientError, EventStreamError, ReadTimeoutError
+
+from bedrock_client import BedrockClient, StreamInterruptedError
+from catalog_integration import CatalogIntegration
+from circuit_breaker import CircuitBreaker
+from contact_prepass import page_contacts
+from hedging import RequestHedger
+from model_router import ModelRouter, SIMPLE_MODEL_ID, STRONG_MODEL_ID
+from rate_limiter import AdaptiveRateLimiter
+from region_pool import RegionPool
+from response_cache import ResponseCache
+from single_flight import SingleFlight
+from token_budget import OutputBudget
+
+
+def page_structure_json(doc_id: str = "doc_1", page_index: int = 1) -> str:
+    """A minimal valid page structure as Claude would return it"""
+    return json.dumps({
+        "doc_id": doc_id,
+        "page_index": page_index,
+        "page_role": "cover",
+        "elements": [
+            {"element_id": "e1", "type": "title", "text": "Acme Corp", "pii_type": "ORG_NAME"}
+        ]
+    })
+
+
+class StubRuntime:
+    """Stands in for the boto3 bedrock-runtime client"""
+
+    def __init__(self, reply=None, latency: float = 0.0, capacity: int = 0):
+        self.calls = []
+        self.reply = reply or (lambda body: page_structure_json())
+        self.latency = latency
+        self.capacity = capacity  # Throttle calls beyond this many in flight (0 = unlimited)
+        self.throttled = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompt_cache = set()
+        self.stream_chunk_chars = 16
+        self.stream_chunk_latency = 0.0
+        self.stream_throttles = []  # Events read before each of the next streams is throttled
+        self.streams = []
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId, body):
+        response_body, _ = self._respond(modelId, body)
+        return {"body": io.BytesIO(json.dumps(response_body).encode("utf-8"))}
+
+    def _respond(self, modelId, body):
+        """The response body, and the text a stream of it would carry
+
+        reply may return (text, stop_reason) to end the answer early, e.g. at max_tokens.
+        """
+        request = json.loads(body)
+        with self._lock:
+            if self.capacity and self.in_flight >= self.capacity:
+                self.throttled += 1
+                raise ClientError({
+                    "Error": {"Code": "ThrottlingException", "Message": "Too many requests"},
+                    "ResponseMetadata": {"HTTPHeaders": {"retry-after": "0.01"}}
+                }, "InvokeModel")
+            self.calls.append({"modelId": modelId, "body": request})
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            text = self.reply(dict(request, modelId=modelId))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        text, stop_reason = text if isinstance(text, tuple) else (text, "end_turn")
+        response_body = {
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": stop_reason,
+            "usage": self._usage(request, text)
+        }
+        if "tools" in request and stop_reason == "max_tokens":
+            # A cut-off tool call has no usable input; only a stream shows the partial JSON
+            response_body["content"] = [{"type": "tool_use", "id": "toolu_stub",
+                                         "name": request["tools"][0]["name"], "input": {}}]
+        elif "tools" in request:
+            # A forced tool call returns the reply as the tool's input; non-JSON replies stay text
+            try:
+                tool_input = json.loads(text.strip().removeprefix("```json").removesuffix("```"))
+                response_body["content"] = [{"type": "tool_use", "id": "toolu_stub",
+                                             "name": request["tools"][0]["name"], "input": tool_input}]
+                response_body["stop_reason"] = "tool_use"
+            except json.JSONDecodeError:
+                pass
+        return response_body, text
+
+    def invoke_model_with_response_stream(self, modelId, body):
+        """Stream the same reply as Bedrock's event stream: a message_start, text deltas, a message_delta"""
+        response_body, text = self._respond(modelId, body)
+        block = response_body["content"][0]
+        usage = response_body["usage"]
+
+        chunks = [{"type": "message_start", "message": {"usage": {
+            key: value for key, value in usage.items() if key != "output_tokens"
+        }}}]
+        if block["type"] == "tool_use":
+            if response_body["stop_reason"] != "max_tokens":
+                text = json.dumps(block["input"])
+            delta_type, field = "input_json_delta", "partial_json"
+            chunks.append({"type": "content_block_start", "index": 0, "content_block": dict(block, input={})})
+        else:
+            delta_type, field = "text_delta", "text"
+            chunks.append({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for i in range(0, len(text), self.stream_chunk_chars):
+            chunks.append({"type": "content_block_delta", "index": 0,
+                           "delta": {"type": delta_type, field: text[i:i + self.stream_chunk_chars]}})
+        chunks.append({"type": "message_delta", "delta": {"stop_reason": response_body["stop_reason"]},
+                       "usage": {"output_tokens": usage["output_tokens"]}})
+        chunks.append({"type": "message_stop"})
+
+        throttle_after = self.stream_throttles.pop(0) if self.stream_throttles else None
+        self.streams.append(StubEventStream(chunks, self.stream_chunk_latency, throttle_after))
+        return {"body": self.streams[-1]}
+
+    def _usage(self, request, text):
+        """Echo usage the way Bedrock reports it, including prompt cache reads and writes"""
+        tokens = lambda value: max(1, len(value) // 4)
+        usage = {
+            "input_tokens": tokens(request["messages"][0]["content"]),
+            "output_tokens": tokens(text),
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0
+        }
+
+        # Tools come first in the prompt, so a system cache point covers them too
+        tools = json.dumps(request["tools"]) if "tools" in request else ""
+        system = request["system"]
+        if isinstance(system, str):
+            usage["input_tokens"] += tokens(system) + (tokens(tools) if tools else 0)
+            return usage
+
+        for block in system:
+            prefix = tools + block["text"]
+            if "cache_control" not in block:
+                usage["input_tokens"] += tokens(prefix)
+                continue
+            with self._lock:
+                cached = prefix in self.prompt_cache
+                self.prompt_cache.add(prefix)
+            usage["cache_read_input_tokens" if cached else "cache_creation_input_tokens"] += tokens(prefix)
+        return usage
+
+
+class StubEventStream:
+    """Stands in for botocore's EventStream: yields chunk events, records how far it was read"""
+
+    def __init__(self, chunks, latency: float = 0.0, throttle_after: int = None):
+        self.chunks = chunks
+        self.latency = latency
+        self.throttle_after = throttle_after  # Raise a throttling error event after this many events
+        self.events_read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if self.closed:
+                return
+            if self.events_read == self.throttle_after:
+                raise EventStreamError({"Error": {"Code": "ThrottlingException", "Message": "Too many tokens"}},
+                                       "InvokeModelWithResponseStream")
+            time.sleep(self.latency)
+            self.events_read += 1
+            yield {"chunk": {"bytes": json.dumps(chunk).encode("utf-8")}}
+
+    def close(self):
+        self.closed = True
+
+
+def make_client(runtime=None, **kwargs) -> BedrockClient:
+    """Build a BedrockClient wired to a stub runtime"""
+    client = BedrockClient(region="eu-west-1", **kwargs)
+    client.bedrock_runtime = runtime or StubRuntime()
+    return client
+
+
+def test_response_cache_skips_repeat_calls():
+    """Test identical page prompts are answered from the response cache"""
+    print("🧪 Testing response cache...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = ResponseCache(os.path.join(tmp_dir, "responses.sqlite3"))
+        runtime = StubRuntime()
+        client = make_client(runtime, response_cache=cache)
+
+        first = client.extract_page_structure("Acme Corp\nCompany Profile", "doc_1", 1)
+        second = client.extract_page_structure("Acme Corp\nCompany Profile", "doc_1", 1)
+        assert first == second and first["elements"][0]["type"] == "title"
+        assert len(runtime.calls) == 1, f"❌ Expected 1 Bedrock call, got {len(runtime.calls)}"
+
+        # A different page is a different prompt
+        client.extract_page_structure("About Us", "doc_1", 2)
+        assert len(runtime.calls) == 2
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2, f"❌ Unexpected counters: {stats}"
+
+        # Bypass always calls Bedrock but refreshes the stored response
+        cache.bypass = True
+        client.extract_page_structure("Acme Corp\nCompany Profile", "doc_1", 1)
+        assert len(runtime.calls) == 3, "❌ Bypass flag did not force a Bedrock call"
+        cache.bypass = False
+
+        # An answer cut off at max_tokens is not stored; only its finished continuation is
+        full = page_structure_json("doc_1", 3)
+        runtime = StubRuntime(lambda request: (full[:60], "max_tokens") if len(request["messages"]) == 1
+                              else full[60:])
+        client = make_client(runtime, response_cache=cache, structured_output=False)
+        for _ in range(2):
+            assert client.extract_page_structure("Our Team", "doc_1", 3)["elements"][0]["type"] == "title"
+        assert len(runtime.calls) == 3, f"❌ Truncated answer was served from the cache: {len(runtime.calls)} calls"
+        cache.close()
+
+    print("✅ Response cache served repeat calls")
+
+
+def test_response_cache_ttl_and_size_eviction():
+    """Test expired entries miss and the size cap evicts least recently used entries"""
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = ResponseCache(os.path.join(tmp_dir, "responses.sqlite3"), ttl_seconds=0.05)
+        cache.put("old", "model", {"content": [{"text": "x"}]})
+        time.sleep(0.1)
+        assert cache.get("old") is None, "❌ Expired entry was served"
+
+        cache.ttl_seconds = None
+        response = {"content": [{"text": "x" * 1000}]}
+        cache.put("a", "model", response)
+        cache.put("b", "model", response)
+        time.sleep(0.01)
+        assert cache.get("a") == response  # "a" becomes most recently used
+        cache.max_bytes = 2500
+        cache.put("c", "model", response)
+
+        assert cache.get("b") is None, "❌ Least recently used entry was not evicted"
+        assert cache.get("a") == response and cache.get("c") == response
+        cache.close()
+
+    print("✅ Response cache TTL and size eviction work")
+
+
+def prompt_page(request) -> str:
+    """The PAGE CONTENT section of a page-structure user prompt"""
+    prompt = request["messages"][0]["content"]
+    page = prompt.split("PAGE CONTENT:\n", 1)[1]
+    return re.split(r"\n\n(?:Return a JSON object|Record the structure)", page, maxsplit=1)[0]
+
+
+def test_extract_pages_concurrently_in_order():
+    """Test batch extraction overlaps calls, keeps page order and reports failures"""
+    print("🧪 Testing concurrent page extraction...")
+
+    def reply(request):
+        page = prompt_page(request)
+        if "corrupt" in page:
+            return "not json"
+        page_index = int(page.split()[-1])
+        time.sleep(0.01 * (8 - page_index))  # Later pages finish first
+        return page_structure_json("doc_1", page_index)
+
+    runtime = StubRuntime(reply, latency=0.05)
+    client = make_client(runtime, max_concurrency=4)
+
+    pages = [(f"Page {i}", "doc_1", i) for i in range(1, 9)]
+    pages[4] = ("corrupt Page 5", "doc_1", 5)
+
+    start = time.perf_counter()
+    results = client.extract_pages(iter(pages))
+    elapsed = time.perf_counter() - start
+
+    assert [r["page_index"] for r in results] == list(range(1, 9)), "❌ Results out of page order"
+    assert results[0]["page_json"]["page_index"] == 1
+    assert results[4]["page_json"] is None and "doc_1 page 5" in results[4]["error"], \
+        f"❌ Failure not reported: {results[4]}"
+    assert all(r["error"] is None for i, r in enumerate(results) if i != 4)
+    assert runtime.max_in_flight == 4, f"❌ Expected 4 calls in flight, saw {runtime.max_in_flight}"
+    # Sequential would take over 0.6s
+    assert elapsed < 0.4, f"❌ Pages were not analyzed concurrently ({elapsed:.2f}s)"
+
+    print(f"✅ 8 pages analyzed in {elapsed:.2f}s with 4 concurrent calls")
+
+
+def test_throttled_calls_back_off_without_losing_pages():
+    """Test the AIMD limiter shrinks on throttling and every page still succeeds"""
+    print("🧪 Testing adaptive rate limiting...")
+
+    runtime = StubRuntime(latency=0.02, capacity=2)
+    limiter = AdaptiveRateLimiter(initial_window=8, max_window=8, base_delay=0.01, max_delay=0.05)
+    client = make_client(runtime, max_concurrency=8, rate_limiter=limiter)
+
+    pages = [(f"Page {i}", "doc_1", i) for i in range(1, 25)]
+    results = client.extract_pages(pages)
+
+    metrics = client.get_rate_limiter_metrics()
+    assert all(r["page_json"] for r in results), "❌ Throttled pages were dropped"
+    assert runtime.throttled > 0 and metrics["throttles"] == runtime.throttled
+    assert metrics["window_cuts"] >= 1 and metrics["min_window_seen"] <= 4, f"❌ Window never cut: {metrics}"
+    assert metrics["retries"] == runtime.throttled
+
+    # Successes grow the window back additively
+    window = limiter.window
+    for _ in range(20):
+        limiter.on_success()
+    assert window < limiter.window <= limiter.max_window
+
+    print(f"✅ {runtime.throttled} throttles absorbed, window settled at {metrics['window']}")
+
+
+def test_prompt_caching_marks_system_prompt():
+    """Test the catalog system prompt is sent as a cache point and cache usage is recorded"""
+    print("🧪 Testing prompt caching...")
+
+    runtime = StubRuntime()
+    client = make_client(runtime)
+
+    for page_index in range(1, 4):
+        client.extract_page_structure(f"Page {page_index}", "doc_1", page_index)
+
+    system = runtime.calls[0]["body"]["system"]
+    assert isinstance(system, list) and system[0]["cache_control"] == {"type": "ephemeral"}
+    assert "AVAILABLE ELEMENT TYPES FROM MASTER CATALOG" in system[0]["text"]
+    assert all(call["body"]["system"] == system for call in runtime.calls), "❌ Cached prefix changed between pages"
+
+    usage = client.get_usage_summary()
+    system_tokens = len(json.dumps(runtime.calls[0]["body"]["tools"]) + system[0]["text"]) // 4
+    assert usage["calls"] == 3
+    assert usage["cache_creation_input_tokens"] == system_tokens, f"❌ Unexpected cache writes: {usage}"
+    assert usage["cache_read_input_tokens"] == 2 * system_tokens, f"❌ Unexpected cache reads: {usage}"
+    assert usage["prompt_cache_hit_rate"] > 50
+
+    # Disabled caching sends the plain string prompt
+    uncached = make_client(StubRuntime(), prompt_caching=False)
+    uncached.extract_page_structure("Page 1", "doc_1", 1)
+    assert isinstance(uncached.bedrock_runtime.calls[0]["body"]["system"], str)
+
+    print(f"✅ Prompt cache served {usage['prompt_cache_hit_rate']}% of prompt tokens")
+
+
+def test_packed_pages_split_back_per_page():
+    """Test short pages share one request and pages the model skips fall back to single calls"""
+    print("🧪 Testing multi-page request packing...")
+
+    def reply(request):
+        prompt = request["messages"][0]["content"]
+        if '"pages": [' not in prompt:
+            return page_structure_json("doc_1", int(prompt_page(request).split()[-1]))
+        headers = re.findall(r'=== PAGE doc_id="([^"]+)" page_index=(\d+) ===', prompt)
+        # The model drops page 3 from its answer
+        return json.dumps({"pages": [
+            json.loads(page_structure_json(doc_id, int(page_index)))
+            for doc_id, page_index in headers if page_index != "3"
+        ]})
+
+    runtime = StubRuntime(reply)
+    client = make_client(runtime)
+
+    pages = [(f"Page {i}", "doc_1", i) for i in range(1, 7)]
+    pages.append(("x" * 4000 + " Page 7", "doc_1", 7))
+    results = client.extract_pages(pages, pack_token_budget=500)
+
+    assert [r["page_index"] for r in results] == list(range(1, 8)), "❌ Packed results out of page order"
+    assert all(r["error"] is None and r["page_json"]["page_index"] == r["page_index"] for r in results)
+    # One pack for pages 1-6, one single call for page 3, one for the page over budget
+    assert len(runtime.calls) == 3, f"❌ Expected 3 Bedrock calls, got {len(runtime.calls)}"
+
+    stats = client.get_packing_stats()
+    assert stats == {"packed_requests": 1, "packed_pages": 6, "fallback_pages": 1}, f"❌ Unexpected stats: {stats}"
+
+    # An unparseable packed answer sends every page to its own call
+    runtime = StubRuntime(lambda request: "not json" if '"pages": [' in request["messages"][0]["content"]
+                          else page_structure_json("doc_1", int(prompt_page(request).split()[-1])))
+    client = make_client(runtime)
+    results = client.extract_pages(pages[:3], pack_token_budget=500)
+    assert all(r["page_json"] for r in results) and len(runtime.calls) == 4
+    assert client.get_packing_stats()["fallback_pages"] == 3
+
+    print(f"✅ 7 pages analyzed in {stats['packed_requests'] + 2} requests")
+
+
+def test_streamed_elements_arrive_before_response_ends():
+    """Test streamed pages hand over each element early and malformed streams abort"""
+    print("🧪 Testing streamed page extraction...")
+
+    page = {
+        "doc_id": "doc_1",
+        "page_index": 1,
+        "page_role": "cover",
+        "elements": [
+            {"element_id": "e1", "type": "title", "text": "Acme {Corp}", "pii_type": "ORG_NAME"},
+            {"element_id": "e2", "type": "subtitle", "text": "Say \"hello\" ]", "pii_type": None},
+            {"element_id": "e3", "type": "body_text", "text": "x" * 400, "pii_type": None}
+        ]
+    }
+    runtime = StubRuntime(lambda request: "```json\n" + json.dumps(page, indent=2) + "\n```")
+    runtime.stream_chunk_latency = 0.002
+    client = make_client(runtime, streaming=True)
+
+    arrivals = []
+    start = time.monotonic()
+    result = client.stream_page_structure("Acme Corp", "doc_1", 1,
+                                          on_element=lambda element: arrivals.append((element, time.monotonic())))
+    finished = time.monotonic()
+
+    assert result == page, "❌ Streamed page differs from the full response"
+    assert [element for element, _ in arrivals] == page["elements"], "❌ Elements not emitted as they completed"
+    assert arrivals[0][1] - start < (finished - start) / 2, "❌ First element only arrived at the end"
+
+    metrics = client.get_streaming_metrics()
+    assert metrics["streamed_pages"] == 1
+    assert metrics["avg_time_to_first_element"] < metrics["avg_response_time"]
+    assert client.get_usage_summary()["output_tokens"] > 0, "❌ Streamed usage not recorded"
+
+    # A throttle before any output arrives is retried; one after it is an error, not a replay of the elements
+    limiter = AdaptiveRateLimiter(base_delay=0.01, max_delay=0.02)
+    breaker = CircuitBreaker(failure_threshold=5)
+    client = make_client(runtime, streaming=True, rate_limiter=limiter, circuit_breaker=breaker)
+    runtime.calls.clear()
+    runtime.stream_throttles = [2]
+    arrivals = []
+    assert client.stream_page_structure("Acme Corp", "doc_1", 1, on_element=arrivals.append) == page
+    assert arrivals == page["elements"] and len(runtime.calls) == 2
+    runtime.stream_throttles = [5]
+    arrivals = []
+    try:
+        client.stream_page_structure("Acme Corp", "doc_1", 1, on_element=arrivals.append)
+        assert False, "❌ A stream throttled mid-output was retried"
+    except StreamInterruptedError as e:
+        assert e.code == "ThrottlingException"
+    assert len(runtime.calls) == 3 and len(arrivals) <= 1
+    assert (limiter.get_metrics()["throttles"], limiter.get_metrics()["successes"]) == (2, 1)
+    assert (breaker.get_metrics()["failures"], breaker.get_metrics()["successes"]) == (1, 1)
+
+    # A response that is not JSON is abandoned after the first chunk
+    runtime = StubRuntime(lambda request: "I'm sorry, I can't analyze this page. " * 50)
+    client = make_client(runtime, streaming=True)
+    results = client.extract_pages([("Page 1", "doc_1", 1)])
+    assert results[0]["page_json"] is None and "Aborted malformed response" in results[0]["error"]
+    stream = runtime.streams[0]
+    assert stream.closed and stream.events_read < len(stream.chunks) / 10, "❌ Malformed stream was read to the end"
+    assert client.get_streaming_metrics()["aborted_streams"] == 1
+
+    print(f"✅ First element after {metrics['avg_time_to_first_element']}s "
+          f"of a {metrics['avg_response_time']}s response")
+
+
+def test_call_metrics_report_and_export():
+    """Test every call is logged with tokens, latency, retries and page tags, then aggregated and exported"""
+    print("🧪 Testing per-call accounting...")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = ResponseCache(os.path.join(tmp_dir, "responses.sqlite3"))
+        runtime = StubRuntime(latency=0.01, capacity=1)
+        limiter = AdaptiveRateLimiter(initial_window=2, max_window=2, base_delay=0.01, max_delay=0.02)
+        client = make_client(runtime, max_concurrency=2, rate_limiter=limiter, response_cache=cache)
+
+        client.extract_pages([(f"Page {i}", "doc_1", i) for i in range(1, 5)] + [("Page 1", "doc_2", 1)])
+        client.extract_page_structure("Page 1", "doc_1", 1)  # Served from the response cache
+        calls = client.call_metrics.get_calls()
+        cache.close()
+
+        assert len(calls) == 6 and all(c["operation"] == "page_structure" for c in calls)
+        fresh = [c for c in calls if not c["cached"]]
+        assert len(fresh) == 5 and all(c["latency_seconds"] >= 0.01 and c["stop_reason"] == "tool_use" for c in fresh)
+        assert all(c["input_tokens"] > 0 and c["output_tokens"] > 0 and c["cost_usd"] > 0 for c in fresh)
+        assert sum(c["retries"] for c in calls) == runtime.throttled > 0, "❌ Retries not attributed to calls"
+        cached = [c for c in calls if c["cached"]][0]
+        assert (cached["doc_id"], cached["page_index"], cached["cost_usd"]) == ("doc_1", 1, 0.0)
+
+        report = client.get_run_report()
+        assert report["calls"] == 6 and report["cached_calls"] == 1 and report["retries"] == runtime.throttled
+        assert report["latency_p50"] <= report["latency_p95"] <= report["latency_p99"] == report["latency_max"]
+        assert report["estimated_cost_usd"] == round(sum(c["cost_usd"] for c in calls), 4)
+        assert [d["doc_id"] for d in report["by_document"]] == ["doc_1", "doc_2"]
+        assert report["by_document"][0]["calls"] == 5
+
+        client.call_metrics.export(os.path.join(tmp_dir, "calls.csv"))
+        client.call_metrics.export(os.path.join(tmp_dir, "report.json"))
+        with open(os.path.join(tmp_dir, "calls.csv")) as f:
+            rows = list(csv.DictReader(f))
+        with open(os.path.join(tmp_dir, "report.json")) as f:
+            exported = json.load(f)
+        assert len(rows) == 6 and rows[0]["doc_id"] == "doc_1" and "latency_seconds" in rows[0]
+        assert exported["report"]["calls"] == 6 and len(exported["calls"]) == 6
+
+    print(f"✅ {report['calls']} calls, p95 {report['latency_p95']}s, ${report['estimated_cost_usd']}")
+
+
+def test_router_sends_simple_pages_to_cheap_model():
+    """Test simple pages use the cheap model, complex ones the strong model, and bad cheap answers escalate"""
+    print("🧪 Testing complexity-based model routing...")
+
+    router = ModelRouter()
+    divider = "SLIDE 3:\nOur Services\n"
+    table = "SLIDE 7:\nRevenue\n\nTABLE:\nYear | Revenue | Margin\n2023 | 4.1m | 12%\n2024 | 5.3m | 14%\n"
+    prose = "Acme has served clients across Europe since 1998. " * 80
+    assert router.route(divider)[0] == SIMPLE_MODEL_ID
+    assert router.route(table)[0] == STRONG_MODEL_ID, f"❌ Table page scored {router.score(table)}"
+    assert router.route(prose)[0] == STRONG_MODEL_ID
+    assert router.score(table)["has_table_marker"] and router.score("1.2 3.4 5% $6 x")["numeric_ratio"] == 0.8
+
+    def reply(request):
+        page = prompt_page(request)
+        page_index = int(page.split()[-1])
+        if request["modelId"] == SIMPLE_MODEL_ID:
+            time.sleep(0.01)
+            # The cheap model drops the element types on the "broken" page
+            if "broken" in page:
+                return json.dumps({"doc_id": "doc_1", "page_index": page_index, "elements": [{"text": "x"}]})
+        else:
+            time.sleep(0.05)
+        return page_structure_json("doc_1", page_index)
+
+    runtime = StubRuntime(reply)
+    client = make_client(runtime, router=router)
+    pages = [("Divider Page 1", "doc_1", 1), (table + " Page 2", "doc_1", 2), ("broken Page 3", "doc_1", 3)]
+    results = client.extract_pages(pages)
+
+    assert all(r["page_json"] and r["page_json"]["elements"][0]["type"] == "title" for r in results)
+    models = [(prompt_page(call["body"]).split()[-1], call["modelId"]) for call in runtime.calls]
+    assert sorted(models) == sorted([("1", SIMPLE_MODEL_ID), ("2", STRONG_MODEL_ID),
+                                     ("3", SIMPLE_MODEL_ID), ("3", STRONG_MODEL_ID)]), f"❌ Unexpected routing {models}"
+
+    routing = client.get_run_report()["routing"]
+    assert (routing["pages_simple"], routing["pages_strong"], routing["pages_escalated"]) == (1, 1, 1), routing
+    assert routing["estimated_cost_saved_usd"] is not None and routing["estimated_latency_saved_seconds"] is not None
+
+    # Without a router every page goes to the strong model
+    plain = make_client(StubRuntime())
+    plain.extract_pages(pages[:1])
+    assert plain.bedrock_runtime.calls[0]["modelId"] == STRONG_MODEL_ID
+    assert plain.get_run_report()["routing"] is None
+
+    print(f"✅ Routing saved ~{routing['estimated_latency_saved_seconds']}s, "
+          f"${routing['estimated_cost_saved_usd']}")
+
+
+def test_structured_output_uses_tool_schema():
+    """Test page analysis sends the schema as a forced tool call and reads the tool input back"""
+    print("🧪 Testing structured tool-use output...")
+
+    # The tool input leaves out the identifiers the prompt already gave
+    reply = lambda request: json.dumps({"page_role": "cover", "elements": [{"element_id": "e1", "type": "title"}]})
+    runtime = StubRuntime(reply)
+    client = make_client(runtime)
+    page = client.extract_page_structure("Acme Corp", "doc_2", 4)
+
+    body = runtime.calls[0]["body"]
+    assert body["tools"][0]["name"] == "record_page_structure"
+    assert body["tool_choice"] == {"type": "tool", "name": "record_page_structure"}
+    assert "Return a JSON object" not in body["messages"][0]["content"], "❌ JSON skeleton still in the prompt"
+    assert (page["doc_id"], page["page_index"], page["elements"][0]["type"]) == ("doc_2", 4, "title")
+
+    # Streamed tool input is parsed element by element too
+    streaming = make_client(StubRuntime(reply), streaming=True)
+    elements = []
+    assert streaming.stream_page_structure("Acme Corp", "doc_2", 4, on_element=elements.append) == page
+    assert elements == page["elements"]
+
+    # The legacy in-prompt skeleton is still available for comparison
+    legacy_runtime = StubRuntime(reply)
+    legacy = make_client(legacy_runtime, structured_output=False)
+    legacy.extract_page_structure("Acme Corp", "doc_2", 4)
+    legacy_body = legacy_runtime.calls[0]["body"]
+    assert "tools" not in legacy_body and "Return a JSON object" in legacy_body["messages"][0]["content"]
+    assert len(body["messages"][0]["content"]) < len(legacy_body["messages"][0]["content"]) / 2
+
+    print(f"✅ Page prompt shrank from {len(legacy_body['messages'][0]['content'])} "
+          f"to {len(body['messages'][0]['content'])} characters")
+
+
+def test_catalog_subset_shrinks_prompts():
+    """Test each page is offered only its candidate catalog elements while the system prompt stays cacheable"""
+    print("🧪 Testing per-page catalog subsetting...")
+
+    pages = [("SLIDE 1:\nAcme Corp\nCompany Profile 2024 Page 1", "doc_1", 1),
+             ("Contact us at support@acme.com or +44 20 7946 0958 Page 2", "doc_1", 2)]
+    full_runtime, subset_runtime = StubRuntime(), StubRuntime()
+    make_client(full_runtime, prompt_caching=False).extract_pages(pages)
+    client = make_client(subset_runtime, prompt_caching=False, catalog_top_k=12)
+    results = client.extract_pages(pages)
+    assert all(r["page_json"] for r in results)
+
+    first, second = (call["body"] for call in subset_runtime.calls)
+    assert first["system"] == second["system"], "❌ System prompt differs between pages"
+    assert "  - acknowledgements_text" not in first["system"], "❌ Full catalog still in the system prompt"
+    prompts = {prompt_page(body).split()[-1]: body["messages"][0]["content"] for body in (first, second)}
+    assert prompts["1"].startswith("CANDIDATE ELEMENT TYPES FROM MASTER CATALOG")
+    assert "cover_title" in prompts["1"] and "support_email" in prompts["2"]
+    assert "support_email" not in prompts["1"], "❌ Candidates were not chosen per page"
+
+    input_tokens = lambda runtime: sum(runtime._usage(call["body"], "")["input_tokens"] for call in runtime.calls)
+    assert input_tokens(subset_runtime) < input_tokens(full_runtime) * 0.85, "❌ Input tokens did not fall"
+
+    metrics = client.get_catalog_subset_metrics()
+    assert metrics["pages"] == 2 and metrics["avg_candidates"] <= 24 and metrics["token_reduction"] > 50
+
+    # A page asked again in prompt mode and continued still counts once
+    answer = page_structure_json("doc_1", 3)
+    runtime = StubRuntime(lambda request: (answer[:60], "max_tokens") if len(request["messages"]) == 1
+                          else answer[60:])
+    truncated_client = make_client(runtime, catalog_top_k=12)
+    truncated_client.extract_page_structure("Our Team Page 3", "doc_1", 3)
+    assert len(runtime.calls) == 3 and truncated_client.get_catalog_subset_metrics()["pages"] == 1
+
+    print(f"✅ {metrics['avg_candidates']} of {metrics['catalog_elements']} catalog elements per page, "
+          f"{metrics['token_reduction']}% fewer catalog tokens")
+
+
+def test_truncated_answers_are_continued_or_salvaged():
+    """Test answers cut off at max_tokens are continued from the partial output, and broken JSON is salvaged"""
+    print("🧪 Testing continuation and salvage...")
+
+    full = json.dumps({"doc_id": "doc_1", "page_index": 1, "page_role": "cover", "elements": [
+        {"element_id": f"e{i}", "type": "paragraph", "text": f"Paragraph {i}"} for i in range(1, 4)
+    ]})
+    cut = full.index('"Paragraph 3"')
+
+    def reply(request):
+        if len(request["messages"]) == 1:
+            return full[:cut] + "  ", "max_tokens"
+        prefill = request["messages"][1]["content"]
+        assert prefill == full[:cut].rstrip(), "❌ Continuation was not seeded with the partial answer"
+        return full[len(prefill):]
+
+    for options in ({"streaming": True}, {"structured_output": False}):
+        runtime = StubRuntime(reply)
+        client = make_client(runtime, **options)
+        streamed = []
+        if options.get("streaming"):
+            page_json = client.stream_page_structure("Acme Corp", "doc_1", 1, on_element=streamed.append)
+            assert [e["element_id"] for e in streamed] == ["e1", "e2", "e3"], f"❌ Streamed {streamed}"
+        else:
+            page_json = client.extract_page_structure("Acme Corp", "doc_1", 1)
+        assert [e["element_id"] for e in page_json["elements"]] == ["e1", "e2", "e3"]
+
+        assert len(runtime.calls) == 2 and "tools" not in runtime.calls[1]["body"]
+        operations = [call["operation"] for call in client.call_metrics.get_calls()]
+        assert operations[-1] == "page_continuation", f"❌ Unexpected operations {operations}"
+        metrics = client.get_recovery_metrics()
+        assert metrics["truncated_responses"] == 1 and metrics["continuations"] == 1
+        assert metrics["continued_pages"] == 1 and metrics["salvaged_pages"] == 0
+
+    # The default forced tool call cut off without partial input is asked again in prompt mode and continued
+    runtime = StubRuntime(reply)
+    client = make_client(runtime)
+    results = client.extract_pages([("Acme Corp", "doc_1", 1)])
+    assert results[0]["error"] is None, f"❌ {results[0]['error']}"
+    assert [e["element_id"] for e in results[0]["page_json"]["elements"]] == ["e1", "e2", "e3"]
+    assert ["tools" in call["body"] for call in runtime.calls] == [True, False, False]
+    assert client.get_recovery_metrics()["continuations"] == 1
+
+    # A page answer without elements is an error, not an empty page
+    client = make_client(StubRuntime(lambda request: json.dumps({"doc_id": "doc_1", "page_index": 1})))
+    results = client.extract_pages([("Acme Corp", "doc_1", 1)])
+    assert results[0]["page_json"] is None and "missing elements" in results[0]["error"]
+
+    # Without continuations the complete elements of the partial answer are kept
+    client = make_client(StubRuntime(reply), structured_output=False, max_continuations=0)
+    page_json = client.extract_page_structure("Acme Corp", "doc_1", 1)
+    assert [e["element_id"] for e in page_json["elements"]] == ["e1", "e2"]
+    assert page_json["page_role"] == "cover"
+
+    # Stray trailing commas are repaired rather than failing the page
+    client = make_client(StubRuntime(lambda request: full[:-2] + ",],}"), structured_output=False)
+    page_json = client.extract_page_structure("Acme Corp", "doc_1", 1)
+    assert len(page_json["elements"]) == 3
+    metrics = client.get_recovery_metrics()
+    assert metrics["salvaged_pages"] == 1 and metrics["salvaged_elements"] == 3
+
+    print("✅ Truncated answers continued, partial and comma-damaged JSON salvaged")
+
+
+def test_output_budget_sizes_max_tokens_per_page():
+    """Test max_tokens follows page size, calibrates on observed output and escalates on truncation"""
+    print("🧪 Testing per-page output budgets...")
+
+    runtime = StubRuntime()
+    budget = OutputBudget(min_samples=2)
+    client = make_client(runtime, output_budget=budget)
+    long_page = "Revenue grew across all regions. " * 300
+    client.extract_page_structure("Acme Corp", "doc_1", 1)
+    client.extract_page_structure(long_page, "doc_1", 2)
+    short_tokens, long_tokens = (call["body"]["max_tokens"] for call in runtime.calls)
+    assert short_tokens == budget.floor and budget.floor < long_tokens <= budget.ceiling, \
+        f"❌ Budgets {short_tokens}, {long_tokens} do not follow page size"
+    assert all(call["output_estimate"] for call in client.call_metrics.get_calls())
+
+    # The stub answers far shorter than the prior expects, so calibration lowers later budgets
+    assert budget.calibration_factor() < 1.0
+    client.extract_page_structure(long_page, "doc_1", 3)
+    assert runtime.calls[-1]["body"]["max_tokens"] < long_tokens, "❌ Calibration did not shrink the budget"
+
+    # Earlier usage records calibrate a fresh budget the same way
+    fresh = OutputBudget(min_samples=2)
+    fresh.calibrate(client.call_metrics.get_calls())
+    assert fresh.calibration_factor() == budget.calibration_factor()
+
+    # A cut-off tool call has nothing to continue from, so it is asked again with more room
+    def reply(request):
+        if request["max_tokens"] < 1000:
+            return page_structure_json()[:40], "max_tokens"
+        return page_structure_json()
+
+    runtime = StubRuntime(reply)
+    client = make_client(runtime, output_budget=OutputBudget())
+    page_json = client.extract_page_structure("Acme Corp", "doc_1", 1)
+    assert page_json["elements"][0]["type"] == "title"
+    assert [call["body"]["max_tokens"] for call in runtime.calls] == [512, 1024]
+
+    metrics = client.get_output_budget_metrics()
+    assert metrics["budgets"] == 1 and metrics["escalations"] == 1
+    assert metrics["reserved_tokens_saved"] == 4000 - 512
+
+    # A client sharing the budget reports its own run, not the budget's lifetime totals
+    other = make_client(StubRuntime(), output_budget=client.output_budget)
+    other.extract_page_structure("Acme Corp", "doc_1", 1)
+    assert client.output_budget.get_metrics()["budgets"] == 2
+    other_metrics = other.get_output_budget_metrics()
+    assert (other_metrics["budgets"], other_metrics["escalations"]) == (1, 0), f"❌ {other_metrics}"
+
+    print(f"✅ Budgets {short_tokens} and {long_tokens} tokens instead of 4000, truncation escalated to 1024")
+
+
+def test_hedged_requests_cut_tail_latency():
+    """Test a page running past the latency percentile is hedged and the faster attempt wins"""
+    print("🧪 Testing hedged requests...")
+
+    slow_calls = {7}
+    count = [0]
+    lock = threading.Lock()
+
+    def reply(request):
+        with lock:
+            count[0] += 1
+            call_number = count[0]
+        time.sleep(0.6 if call_number in slow_calls else 0.01)
+        return page_structure_json(page_index=int(prompt_page(request).split()[-1]))
+
+    hedger = RequestHedger(latency_percentile=75, max_hedge_ratio=0.2, min_samples=5, min_delay=0.05)
+    client = make_client(StubRuntime(reply), hedger=hedger)
+    pages = [(f"Slide text Page {i}", "doc_1", i) for i in range(1, 9)]
+    start = time.monotonic()
+    results = client.extract_pages(pages, max_concurrency=1)
+    elapsed = time.monotonic() - start
+
+    assert [r["page_json"]["page_index"] for r in results] == list(range(1, 9))
+    assert elapsed < 0.5, f"❌ The slow page was not hedged ({elapsed:.2f}s)"
+    hedge_calls = [c for c in client.call_metrics.get_calls() if c["hedge"]]
+    assert len(hedge_calls) == 1 and hedge_calls[0]["page_index"] == 7
+    assert client.get_run_report()["hedge_calls"] == 1
+
+    # The losing first attempt still finishes and reports how long the page would have taken
+    time.sleep(0.7)
+    metrics = client.get_hedging_metrics()
+    assert metrics["requests"] == 8 and metrics["hedges"] == 1 and metrics["hedge_wins"] == 1
+    assert metrics["hedge_rate"] == 12.5
+    assert metrics["unhedged_p99_seconds"] >= 0.6 > metrics["p99_seconds"]
+    assert metrics["p99_improvement"] > 50
+
+    # The budget caps hedges at max_hedge_ratio of all requests
+    slow_calls.update(range(count[0] + 1, count[0] + 20, 2))
+    client.extract_pages(pages, max_concurrency=1)
+    capped = client.get_hedging_metrics()
+    assert capped["hedges"] <= 0.2 * capped["requests"] and capped["budget_exhausted"] > 0
+
+    print(f"✅ Hedged {metrics['hedge_rate']}% of requests; p99 {metrics['unhedged_p99_seconds']}s "
+          f"→ {metrics['p99_seconds']}s")
+
+
+def test_region_pool_spreads_load_and_fails_over():
+    """Test calls are spread over regions within their limits and steered away from failing ones"""
+    print("🧪 Testing multi-region pool...")
+
+    def failing(code):
+        def reply(request):
+            raise ClientError({"Error": {"Code": code, "Message": code}}, "InvokeModel")
+        return reply
+
+    page_reply = lambda request: page_structure_json(page_index=int(prompt_page(request).split()[-1]))
+    runtimes = {
+        "eu-west-1": StubRuntime(page_reply, latency=0.02),
+        "eu-central-1": StubRuntime(page_reply, latency=0.02),
+        "us-east-1": StubRuntime(failing("ThrottlingException")),
+        "us-west-2": StubRuntime(failing("InternalServerException"))
+    }
+    pool = RegionPool([{"region": region} for region in runtimes], max_concurrency=2,
+                      client_factory=lambda spec, pool_size: runtimes[spec["region"]])
+    client = make_client(region_pool=pool)
+    pages = [(f"Slide text Page {i}", "doc_1", i) for i in range(1, 17)]
+    results = client.extract_pages(pages, max_concurrency=pool.max_concurrency)
+
+    assert [r["page_json"]["page_index"] for r in results] == list(range(1, 17)), "❌ Pages were lost"
+    for region in ("eu-west-1", "eu-central-1"):
+        assert runtimes[region].calls and runtimes[region].max_in_flight <= 2, f"❌ {region} limit broken"
+    assert runtimes["us-east-1"].calls[0]["modelId"].startswith("us.anthropic."), "❌ Profile not regional"
+
+    metrics = {region["region"]: region for region in client.get_region_metrics()}
+    assert metrics["us-west-2"]["cooling_down"] and metrics["us-west-2"]["errors"] >= 2
+    assert metrics["us-east-1"]["throttles"] >= 1 and metrics["us-east-1"]["window"] < 2
+    healthy_calls = metrics["eu-west-1"]["calls"] + metrics["eu-central-1"]["calls"]
+    assert healthy_calls >= 16 and metrics["us-west-2"]["calls"] < 6, f"❌ Traffic not shifted: {metrics}"
+    assert {c["region"] for c in client.call_metrics.get_calls()} == {"eu-west-1", "eu-central-1"}
+
+    # A pool whose regions ignore the client's endpoint_url would call real Bedrock
+    standin_url = "http://127.0.0.1:9"
+    standin_pool = RegionPool([{"region": region, "endpoint_url": standin_url}
+                               for region in ("eu-west-1", "us-east-1")])
+    assert {region["runtime"].meta.endpoint_url for region in standin_pool.regions} == {standin_url}
+    make_client(region_pool=standin_pool, endpoint_url=standin_url)
+    try:
+        make_client(region_pool=pool, endpoint_url=standin_url)
+        assert False, "❌ A region pool without the endpoint_url was accepted"
+    except ValueError:
+        pass
+
+    print(f"✅ {healthy_calls} calls on healthy regions; throttling and failing regions avoided")
+
+
+def test_circuit_breaker_falls_back_to_local_extraction():
+    """Test a burst of timeouts trips the breaker, later pages are extracted locally, and a probe closes it"""
+    print("🧪 Testing circuit breaker and heuristic fallback...")
+
+    healthy = {"value": False}
+
+    def reply(request):
+        if not healthy["value"]:
+            raise ReadTimeoutError(endpoint_url="https://bedrock-runtime.eu-west-1.amazonaws.com")
+        return page_structure_json(page_index=int(prompt_page(request).split()[-1]))
+
+    runtime = StubRuntime(reply)
+    client = make_client(runtime, circuit_breaker=CircuitBreaker(failure_threshold=3, reset_seconds=0.2))
+    pages = [(f"Acme Corp\n- Consulting\n- Engineering\nRegion | Revenue\nEMEA | 10\n"
+              f"Contact sales@acme.com, +44 20 7946 0958, www.acme.com\nPage {i}", "doc_1", i) for i in range(1, 13)]
+    results = client.extract_pages(pages, max_concurrency=1)
+
+    assert len(runtime.calls) == 3, f"❌ Bedrock kept being called: {len(runtime.calls)} calls"
+    # The two timeouts before the trip fail their pages; the one that trips it and all later pages fall back
+    assert [r["page_json"] is None for r in results[:3]] == [True, True, False]
+    assert all(r["page_json"]["extracted_by"] == "heuristic" for r in results[2:])
+    types = [e["type"] for e in results[2]["page_json"]["elements"]]
+    assert types == ["sections_h1", "bullet_points", "content_tables", "support_email", "contact_phone",
+                     "contact_website", "paragraphs"], f"❌ Unexpected elements {types}"
+    catalog = CatalogIntegration()
+    assert all(catalog.find_element_definition(t) for t in types), "❌ Fallback elements are not catalog-typed"
+    metrics = client.get_circuit_breaker_metrics()
+    assert metrics["state"] == "open" and metrics["trips"] == 1 and metrics["heuristic_pages"] == 10
+
+    # Once reset_seconds passed, one probe goes through and its success closes the circuit
+    healthy["value"] = True
+    time.sleep(0.25)
+    results = client.extract_pages(pages[:4], max_concurrency=1)
+    assert all("extracted_by" not in r["page_json"] for r in results), "❌ Circuit did not close"
+    assert client.get_circuit_breaker_metrics()["state"] == "closed"
+
+    print(f"✅ Breaker tripped after 3 timeouts; {metrics['heuristic_pages']} pages extracted locally")
+
+
+def test_identical_pages_share_one_call_in_flight():
+    """Test concurrent identical pages, across clients too, share one Bedrock call and each get the result"""
+    print("🧪 Testing single-flight coalescing...")
+
+    def reply(request):
+        doc_id, page_index = re.search(r'document "(.*?)", page (\d+)', request["messages"][0]["content"]).groups()
+        return page_structure_json(doc_id, int(page_index))
+
+    runtime = StubRuntime(reply, latency=0.2)
+    single_flight = SingleFlight()
+    clients = [make_client(runtime, single_flight=single_flight) for _ in range(2)]
+    boilerplate = "Disclaimer\nThis document is confidential."
+    pages = [(boilerplate, "doc_1", i) for i in range(1, 5)] + [("Agenda\n- Results", "doc_1", 5)]
+
+    results = [None, None]
+    threads = [threading.Thread(target=lambda n: results.__setitem__(n, clients[n].extract_pages(pages, 5)),
+                                args=(n,)) for n in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(runtime.calls) == 2, f"❌ Expected one call per distinct page, got {len(runtime.calls)}"
+    for client_results in results:
+        assert [(r["page_json"]["doc_id"], r["page_json"]["page_index"]) for r in client_results] == \
+            [("doc_1", i) for i in range(1, 6)], "❌ Shared results kept the leader's page identity"
+        assert all(r["page_json"]["elements"] == client_results[0]["page_json"]["elements"] for r in client_results)
+
+    metrics = clients[0].get_single_flight_metrics()
+    assert metrics["calls"] == 2 and metrics["coalesced"] == 8 and metrics["in_flight"] == 0, f"❌ {metrics}"
+
+    # Once the call finished, a repeat makes a call of its own
+    clients[0].extract_pages(pages[:1])
+    assert len(runtime.calls) == 3
+
+    # Slide numbers do not tell repeated slides apart, but a session's routing and answer format do
+    client = make_client(runtime)
+    key = client._page_flight_key("SLIDE 3:\n" + boilerplate)
+    assert key == client._page_flight_key("SLIDE 7:\n" + boilerplate) == client._page_flight_key(boilerplate)
+    assert client._page_flight_key("[Page 2 - No text extracted]") == \
+        client._page_flight_key("[Page 5 - No text extracted]")
+    for settings in ({"router": ModelRouter()}, {"structured_output": False}, {"streaming": True}):
+        assert make_client(runtime, **settings)._page_flight_key(boilerplate) != key, f"❌ {settings} shared a key"
+
+    print(f"✅ 10 page requests made 2 calls ({metrics['coalesce_rate']}% coalesced)")
+
+
+def test_contact_prepass_skips_or_hints_model_calls():
+    """Test contact-only pages skip Claude and other pages get the pre-pass findings as hints"""
+    print("🧪 Testing contact pre-pass...")
+
+    def reply(request):
+        page_index = int(re.search(r'document ".*?", page (\d+)', request["messages"][0]["content"]).group(1))
+        return page_structure_json(page_index=page_index)
+
+    runtime = StubRuntime(reply)
+    client = make_client(runtime, contact_prepass=True)
+    pages = [
+        ("Contact Us\nEmail: support@acme.com\nTel: +44 20 7946 0958\n221B Baker Street, London NW1 6XE\n"
+         "www.acme.com\nLast updated: 15 January 2024", "doc_1", 9),
+        ("Results\nRevenue grew in March 2024.\nQuestions? ir@acme.com", "doc_1", 2),
+        ("Agenda\n- Results\n- Outlook", "doc_1", 3)
+    ]
+    results = client.extract_pages(pages)
+
+    assert len(runtime.calls) == 2, f"❌ Contact page was sent to Claude: {len(runtime.calls)} calls"
+    contact_page = results[0]["page_json"]
+    assert contact_page["extracted_by"] == "prepass" and contact_page["page_role"] == "end_matter"
+    assert [(e["type"], e["pii_type"]) for e in contact_page["elements"]] == [
+        ("sections_h1", "NONE"), ("support_email", "EMAIL"), ("contact_phone", "PHONE"),
+        ("contact_address", "ADDRESS"), ("contact_website", "URL"), ("last_updated_date", "DATE")
+    ], f"❌ Unexpected elements {contact_page['elements']}"
+
+    prompts = [call["body"]["messages"][0]["content"] for call in runtime.calls]
+    hinted = next(prompt for prompt in prompts if "page 2" in prompt)
+    assert "CONTACT DETAILS ALREADY EXTRACTED" in hinted and "support_email (EMAIL): ir@acme.com" in hinted
+    assert "March 2024" not in hinted.split("ALREADY EXTRACTED")[1], "❌ A date in running text was hinted"
+    assert all("ALREADY EXTRACTED" not in prompt for prompt in prompts if "page 3" in prompt)
+    assert [e["type"] for e in results[1]["page_json"]["elements"]] == ["title", "support_email"]
+
+    metrics = client.get_prepass_metrics()
+    assert metrics == {"pages": 3, "covered_pages": 1, "hinted_pages": 1, "contacts": 6}, f"❌ {metrics}"
+
+    # Packed pages run the pre-pass first: covered pages stay out of the request, the rest carry hints
+    def packed_reply(request):
+        headers = re.findall(r'=== PAGE doc_id="([^"]+)" page_index=(\d+) ===', request["messages"][0]["content"])
+        return json.dumps({"pages": [json.loads(page_structure_json(doc_id, int(page_index)))
+                                     for doc_id, page_index in headers]})
+
+    runtime = StubRuntime(packed_reply)
+    client = make_client(runtime, contact_prepass=True)
+    results = client.extract_pages(pages, pack_token_budget=500)
+    assert len(runtime.calls) == 1, f"❌ Expected one packed call, got {len(runtime.calls)}"
+    packed_prompt = runtime.calls[0]["body"]["messages"][0]["content"]
+    assert "page_index=9" not in packed_prompt and "support_email (EMAIL): ir@acme.com" in packed_prompt
+    assert results[0]["page_json"]["extracted_by"] == "prepass"
+    assert [e["type"] for e in results[1]["page_json"]["elements"]] == ["title", "support_email"]
+    assert client.get_packing_stats() == {"packed_requests": 1, "packed_pages": 2, "fallback_pages": 0}
+    assert client.get_prepass_metrics() == metrics, f"❌ {client.get_prepass_metrics()}"
+
+    # Figures and reference numbers in running text are not phone numbers; prefixed or labelled ones are
+    figures = ("Revenue 2023: 12500000 USD\nEmployees: 1 250 000 worldwide\nInvoice ref 2024-001-7788\n"
+               "Orders are paid within 30 days.")
+    assert page_contacts(figures) == [], f"❌ Figures taken for phones: {page_contacts(figures)}"
+    phones = "Call our desk on 020 7946 0958 today.\nFrom abroad dial +44 20 7946 0959 instead."
+    assert [contact["value"] for contact in page_contacts(phones)] == ["020 7946 0958", "+44 20 7946 0959"]
+
+    print(f"✅ {metrics['covered_pages']} page answered locally, {metrics['hinted_pages']} sent with hints")
+
+
+if __name__ == "__main__":
+    test_response_cache_skips_repeat_calls()
+    test_response_cache_ttl_and_size_eviction()
+    test_extract_pages_concurrently_in_order()
+    test_throttled_calls_back_off_without_losing_pages()
+    test_prompt_caching_marks_system_prompt()
+    test_packed_pages_split_back_per_page()
+    test_streamed_elements_arrive_before_response_ends()
+    test_call_metrics_report_and_export()
+    test_router_sends_simple_pages_to_cheap_model()
+    test_structured_output_uses_tool_schema()
+    test_catalog_subset_shrinks_prompts()
+    test_truncated_answers_are_continued_or_salvaged()
+    test_output_budget_sizes_max_tokens_per_page()
+    test_hedged_requests_cut_tail_latency()
+    test_region_pool_spreads_load_and_fails_over()
+    test_circuit_breaker_falls_back_to_local_extraction()
+    test_identical_pages_share_one_call_in_flight()
+    test_contact_prepass_skips_or_hints_model_calls()
+    print("\n🎉 All Bedrock client tests passed!")
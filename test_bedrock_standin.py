@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the Bedrock Stand-in
+Runs BedrockClient through boto3 against the local bedrock-runtime stand-in server
+"""
+
+import os
+
+from bedrock_client import BedrockClient
+from bedrock_standin import BedrockStandIn, synthesize_page
+from rate_limiter import AdaptiveRateLimiter
+
+# boto3 signs every request, so any credentials will do for the stand-in
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "standin")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "standin")
+
+PAGES = [
+    ("Acme Corp\nCompany Profile 2024", "doc_1", 1),
+    ("Our Services\n- Consulting\n- Engineering\n- Support", "doc_1", 2),
+    ("Results\nRegion | Revenue\nEMEA | 10\nAPAC | 12\nContact sales@acme.com", "doc_1", 3)
+]
+
+
+def standin_client(standin: BedrockStandIn, **kwargs) -> BedrockClient:
+    """A BedrockClient pointed at the stand-in, backing off quickly"""
+    kwargs.setdefault("rate_limiter", AdaptiveRateLimiter(initial_window=4, max_window=4, base_delay=0.01))
+    return BedrockClient(endpoint_url=standin.endpoint_url, **kwargs)
+
+
+def test_invoke_and_stream_through_boto3():
+    """Test InvokeModel and the event-stream endpoint answer with deterministic page structures"""
+    print("🧪 Testing stand-in InvokeModel and streaming...")
+
+    with BedrockStandIn() as standin:
+        results = standin_client(standin).extract_pages(PAGES)
+        for (content, doc_id, page_index), result in zip(PAGES, results):
+            assert result["page_json"] == synthesize_page(content, doc_id, page_index), \
+                f"❌ Unexpected structure for page {page_index}: {result}"
+        assert [e["type"] for e in results[2]["page_json"]["elements"]] == ["heading", "table", "contact_information"]
+
+        # The legacy prompt and the streamed tool call yield the same answers
+        legacy = standin_client(standin, structured_output=False).extract_pages(PAGES)
+        streamed_client = standin_client(standin, streaming=True)
+        streamed = streamed_client.extract_pages(PAGES)
+        assert [r["page_json"] for r in legacy] == [r["page_json"] for r in results]
+        assert [r["page_json"] for r in streamed] == [r["page_json"] for r in results]
+        assert streamed_client.get_streaming_metrics()["streamed_pages"] == 3
+
+        # The system prompt is a cache point on the stand-in too
+        usage = streamed_client.get_usage_summary()
+        assert usage["cache_read_input_tokens"] > 0
+        assert standin.get_stats()["streamed"] == 3
+
+    print("✅ Stand-in answered InvokeModel and streamed requests identically")
+
+
+def test_injected_failures_are_survived():
+    """Test throttling, truncation and malformed JSON injected by the stand-in are retried, continued or salvaged"""
+    print("🧪 Testing stand-in failure injection...")
+
+    pages = [(f"Section {i}\nRevenue grew in region {i}.\n- Point A\n- Point B", "doc_1", i) for i in range(1, 13)]
+    with BedrockStandIn({"throttle_rate": 0.3, "seed": 7}) as standin:
+        client = standin_client(standin)
+        results = client.extract_pages(pages)
+        assert all(r["page_json"] for r in results), "❌ Throttled pages were lost"
+        assert standin.get_stats()["throttled"] > 0 and client.get_run_report()["retries"] > 0
+
+    with BedrockStandIn({"truncate_rate": 0.5, "seed": 3}) as standin:
+        client = standin_client(standin, structured_output=False)
+        results = client.extract_pages(pages)
+        assert all(r["page_json"]["elements"] for r in results)
+        assert standin.get_stats()["truncated"] > 0 and client.get_recovery_metrics()["continuations"] > 0
+
+    with BedrockStandIn({"malformed_rate": 1.0, "seed": 1}) as standin:
+        client = standin_client(standin, structured_output=False)
+        results = client.extract_pages(pages)
+        assert standin.get_stats()["malformed"] == len(pages)
+        assert client.get_recovery_metrics()["salvaged_pages"] > 0
+
+    # The same seed replays the same outcome
+    outcomes = []
+    for _ in range(2):
+        with BedrockStandIn({"throttle_rate": 0.3, "truncate_rate": 0.3, "seed": 11}) as standin:
+            client = standin_client(standin, max_concurrency=1, structured_output=False)
+            client.extract_pages(pages, max_concurrency=1)
+            outcomes.append(standin.get_stats())
+    assert outcomes[0] == outcomes[1], f"❌ Runs differ: {outcomes}"
+
+    print(f"✅ Injected failures survived; seeded runs replay identically ({outcomes[0]})")
+
+
+def test_latency_distribution_and_capacity():
+    """Test the configured latency shows up in the call metrics and excess concurrency is throttled"""
+    print("🧪 Testing stand-in latency and capacity...")
+
+    with BedrockStandIn({"latency": {"distribution": "uniform", "low": 0.05, "high": 0.1},
+                         "max_in_flight": 2}) as standin:
+        client = standin_client(standin, rate_limiter=AdaptiveRateLimiter(initial_window=6, max_window=6,
+                                                                          base_delay=0.01))
+        pages = [(f"Slide {i}\nText", "doc_1", i) for i in range(1, 9)]
+        results = client.extract_pages(pages, max_concurrency=6)
+        assert all(r["page_json"] for r in results)
+
+        report = client.get_run_report()
+        assert 0.05 <= report["latency_p50"] < 0.5, f"❌ Unexpected p50 {report['latency_p50']}"
+        assert standin.get_stats()["throttled"] > 0, "❌ Concurrency beyond max_in_flight was not throttled"
+        assert client.get_rate_limiter_metrics()["window"] < 6
+
+    print(f"✅ p50 latency {report['latency_p50']}s; window shrank to {client.get_rate_limiter_metrics()['window']}")
+
+
+def run_all_tests():
+    """Run all stand-in tests"""
+    print("🚀 Running Bedrock Stand-in Tests\n")
+    test_invoke_and_stream_through_boto3()
+    test_injected_failures_are_survived()
+    test_latency_distribution_and_capacity()
+    print("\n🎉 All stand-in tests passed!")
+
+
+if __name__ == "__main__":
+    run_all_tests()
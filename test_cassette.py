@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Cassettes
+Records BedrockClient responses from the local stand-in and replays them with no network
+"""
+
+import os
+import tempfile
+import time
+
+from bedrock_client import BedrockClient
+from bedrock_standin import BedrockStandIn
+from bench_pipeline import run_pipeline
+from cassette import Cassette, CassetteMissError
+from rate_limiter import AdaptiveRateLimiter
+from response_cache import ResponseCache
+
+# boto3 signs every request, so any credentials will do for the stand-in
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "standin")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "standin")
+
+PAGES = [
+    ("Acme Corp\nCompany Profile 2024", "doc_1", 1),
+    ("Our Services\n- Consulting\n- Engineering\n- Support", "doc_1", 2),
+    ("Results\nRegion | Revenue\nEMEA | 10\nAPAC | 12\nContact sales@acme.com", "doc_1", 3)
+]
+
+# Nothing listens here, so any call that is not replayed fails
+OFFLINE_ENDPOINT = "http://127.0.0.1:9"
+
+
+def record_cassette(path: str, pages=PAGES, **kwargs) -> list:
+    """Extract pages through the stand-in, recording every response to path"""
+    cassette = Cassette(path, mode="record")
+    with BedrockStandIn({"latency": {"distribution": "fixed", "median": 0.05}}) as standin:
+        client = BedrockClient(endpoint_url=standin.endpoint_url, cassette=cassette,
+                               rate_limiter=AdaptiveRateLimiter(base_delay=0.01), **kwargs)
+        results = client.extract_pages(pages)
+    cassette.save()
+    assert cassette.get_stats()["recorded"] == len(pages)
+    return results
+
+
+def offline_client(cassette: Cassette, **kwargs) -> BedrockClient:
+    """A BedrockClient that can only answer from the cassette"""
+    return BedrockClient(endpoint_url=OFFLINE_ENDPOINT, cassette=cassette, max_retries=0,
+                         rate_limiter=AdaptiveRateLimiter(base_delay=0.01), **kwargs)
+
+
+def test_record_and_replay():
+    """Test replayed answers match the recorded ones without touching the network"""
+    print("🧪 Testing cassette record and replay...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.jsonl.gz")
+        recorded = record_cassette(path)
+
+        cassette = Cassette(path)
+        client = offline_client(cassette)
+        replayed = client.extract_pages(PAGES)
+        assert [r["page_json"] for r in replayed] == [r["page_json"] for r in recorded], \
+            "❌ Replayed structures differ from the recorded ones"
+        assert cassette.get_stats()["replayed"] == len(PAGES)
+
+        # Replayed calls still count their recorded tokens
+        report = client.get_run_report()
+        assert report["replayed_calls"] == len(PAGES) and report["output_tokens"] > 0
+
+        # A request that was never recorded is a miss, not a network call
+        try:
+            cassette.play(client.model_id, {"messages": []})
+            assert False, "❌ Unrecorded request was answered"
+        except CassetteMissError:
+            pass
+        missed = offline_client(Cassette(path)).extract_pages([("Unseen page", "doc_9", 1)])
+        assert missed[0]["page_json"] is None
+
+        # Answers the response cache served while recording are on the cassette too
+        cache = ResponseCache(os.path.join(tmp, "responses.sqlite3"))
+        record_cassette(path, response_cache=cache)
+        cached_path = os.path.join(tmp, "cached.jsonl.gz")
+        record_cassette(cached_path, response_cache=cache)
+        cache.close()
+        assert offline_client(Cassette(cached_path)).extract_pages(PAGES) == recorded
+
+    print("✅ Cassette replayed every page identically with no network")
+
+
+def test_replay_latency_and_streaming():
+    """Test replay reproduces recorded latencies on request and feeds streaming parsers"""
+    print("🧪 Testing cassette latency and streaming replay...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.jsonl.gz")
+        recorded = record_cassette(path, streaming=True)
+
+        start = time.perf_counter()
+        offline_client(Cassette(path), streaming=True).extract_pages(PAGES, max_concurrency=1)
+        fast = time.perf_counter() - start
+
+        start = time.perf_counter()
+        client = offline_client(Cassette(path, replay_latency=True), streaming=True)
+        replayed = client.extract_pages(PAGES, max_concurrency=1)
+        slow = time.perf_counter() - start
+
+        assert slow >= 0.05 * len(PAGES) > fast, f"❌ Latency not reproduced: {slow:.3f}s vs {fast:.3f}s"
+        assert [r["page_json"] for r in replayed] == [r["page_json"] for r in recorded]
+        assert client.get_streaming_metrics()["streamed_pages"] == len(PAGES)
+
+    print(f"✅ Replay took {fast:.3f}s, {slow:.3f}s with recorded latencies")
+
+
+def test_offline_pipeline_benchmark():
+    """Test the pipeline benchmark runs extraction and template inference from a cassette"""
+    print("🧪 Testing offline pipeline benchmark...")
+
+    corpus = [{"doc_id": doc_id, "page_index": page_index, "page_content": content}
+              for content, doc_id, page_index in PAGES]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.jsonl.gz")
+        record_cassette(path)
+
+        result = run_pipeline(corpus, offline_client(Cassette(path)))
+        assert result["failed"] == 0 and result["template_pages"] == len(PAGES), f"❌ {result}"
+        assert result["cassette"]["replayed"] == len(PAGES) and result["cassette"]["misses"] == 0
+
+    print(f"✅ Offline pipeline ran in {result['total_seconds']:.3f}s")
+
+
+def run_all_tests():
+    """Run all cassette tests"""
+    print("🚀 Running Cassette Tests\n")
+    test_record_and_replay()
+    test_replay_latency_and_streaming()
+    test_offline_pipeline_benchmark()
+    print("\n🎉 All cassette tests passed!")
+
+
+if __name__ == "__main__":
+    run_all_tests()
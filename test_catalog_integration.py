@@ -332,6 +332,78 @@ def test_end_to_end_mock():
         traceback.print_exc()
         return False
 
+def test_prompt_rendering_cache():
+    """Test catalog prompt renderings are built once per catalog version"""
+    print("\n🧪 Testing Prompt Rendering Cache...")
+    
+    from catalog_integration import CatalogIntegration
+    
+    catalog = CatalogIntegration()
+    
+    renders = []
+    original_render = catalog._render_element_types
+    catalog._render_element_types = lambda: renders.append(1) or original_render()
+    
+    first = catalog.get_element_types_for_prompt()
+    second = catalog.get_element_types_for_prompt()
+    assert first is second, "❌ Prompt text was rebuilt for the same catalog version"
+    assert len(renders) == 1, f"❌ Expected 1 render, got {len(renders)}"
+    
+    # Reloading the catalog drops renderings of the old version
+    version = catalog.catalog_version
+    catalog.reload()
+    assert catalog.catalog_version == version, "❌ Unchanged catalog got a new version"
+    catalog.get_element_types_for_prompt()
+    assert len(renders) == 2, "❌ Reload did not invalidate cached renderings"
+    
+    print(f"✅ Prompt renderings cached for catalog version {catalog.catalog_version}")
+    
+    return True
+
+def test_catalog_subset_selection():
+    """Test per-page candidate selection keeps the elements each page needs"""
+    print("\n🧪 Testing Catalog Subset Selection...")
+    
+    from catalog_integration import CatalogIntegration
+    from catalog_index import tokenize
+    
+    catalog = CatalogIntegration()
+    selector = catalog.get_selector()
+    assert selector is catalog.get_selector(), "❌ Selector was rebuilt for the same catalog version"
+    
+    # Pages with the catalog elements a model should find on them
+    labelled_pages = [
+        ("SLIDE 1:\nAcme Corp\nCompany Profile\nMarch 2024\n", ['title', 'cover_title', 'cover_date']),
+        ("Contact Us\nsupport@acme.com\n+44 20 7946 0958\nwww.acme.com\n", 
+         ['support_email', 'contact_phone', 'contact_website']),
+        ("Table of Contents\n1. Introduction ..... 3\n2. Our Services ..... 5\n", ['table_of_contents_entries']),
+        ("Executive Summary\nAcme grew revenue 25% while expanding into new markets.\n",
+         ['executive_summary_text']),
+        ("Key Recommendations\n- Expand to Asia\n- Invest in the roadmap and action plan\n",
+         ['key_recommendations', 'action_plan', 'roadmap', 'bullet_points']),
+        ("Glossary\nAPI: Application programming interface\nSLA: Service level agreement\n", ['glossary_terms']),
+        ("Revenue by year\n\nTABLE:\nYear | Revenue\n2023 | 4.1m\n2024 | 5.3m\n", ['content_tables'])
+    ]
+    
+    for page, expected in labelled_pages:
+        candidates = selector.select(page)
+        missing = [field_id for field_id in expected if field_id not in candidates]
+        assert not missing, f"❌ {missing} not offered for page {page[:30]!r}"
+        assert len(candidates) <= len(selector.core_elements) + selector.top_k < len(catalog.element_registry) / 2
+    
+    # Cue vocabulary is tokenized like the index, so plural cues such as 'points' and 'steps' reach it
+    cue_terms = set(selector.query_terms("- Expand to Asia\n")) - set(tokenize("Expand to Asia"))
+    assert {'list', 'bullet', 'point', 'step'} == cue_terms, f"❌ Unexpected list cue terms {cue_terms}"
+    assert all(term in selector.index for term in cue_terms), "❌ A list cue term matches no catalog element"
+    
+    subset = catalog.get_element_subset_for_prompt(selector.select(labelled_pages[1][0]))
+    full = catalog.get_element_types_for_prompt()
+    assert "support_email: Support Email" in subset and len(subset) < len(full) / 2
+    
+    print(f"✅ Candidate lists kept every expected element ({len(subset)} vs {len(full)} prompt characters)")
+    
+    return True
+
 def run_all_tests():
     """Run all catalog integration tests"""
     print("🚀 Starting Catalog Integration Test Suite\n")
@@ -345,7 +417,9 @@ def run_all_tests():
         ("Bedrock Integration", test_bedrock_integration),
         ("Template Inference Integration", test_template_inference_integration),
         ("JSON Validation", test_json_validation),
-        ("End-to-End Mock", test_end_to_end_mock)
+        ("End-to-End Mock", test_end_to_end_mock),
+        ("Prompt Rendering Cache", test_prompt_rendering_cache),
+        ("Catalog Subset Selection", test_catalog_subset_selection)
     ]
     
     results = []
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Document Parsing
+Tests page extraction from PDF and PPTX uploads
+"""
+
+import io
+import mmap
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from parse_cache import ParseCache
+from parsing import DocumentParser, prefetch_pages
+from sample_documents import build_sample_pdf, build_sample_pptx, make_upload
+
+
+def test_pdf_pages_stream_in_order():
+    """Test iter_pages yields each PDF page in order"""
+    print("🧪 Testing PDF page streaming...")
+
+    texts = [f"Company Profile Page {i + 1}" for i in range(5)]
+    upload = make_upload(build_sample_pdf(texts), "profile.pdf")
+
+    parser = DocumentParser()
+    pages = parser.iter_pages(upload)
+
+    first = next(pages)
+    assert "Page 1" in first, f"❌ Unexpected first page: {first!r}"
+    rest = list(pages)
+    assert len(rest) == 4, f"❌ Expected 4 remaining pages, got {len(rest)}"
+    for i, page in enumerate(rest, start=2):
+        assert f"Page {i}" in page, f"❌ Page {i} out of order: {page!r}"
+
+    # parse_document still returns the full list
+    assert len(parser.parse_document(upload)) == 5
+
+    print("✅ PDF pages streamed in order")
+
+
+def test_pptx_pages_stream_in_order():
+    """Test iter_pages yields each PPTX slide in order"""
+    print("🧪 Testing PPTX slide streaming...")
+
+    upload = make_upload(build_sample_pptx(["Cover", "About Us", "Contact"]), "deck.pptx")
+
+    slides = list(DocumentParser().iter_pages(upload))
+    assert len(slides) == 3, f"❌ Expected 3 slides, got {len(slides)}"
+    assert slides[0].startswith("SLIDE 1:") and "Cover" in slides[0]
+    assert slides[2].startswith("SLIDE 3:") and "Contact" in slides[2]
+
+    print("✅ PPTX slides streamed in order")
+
+
+def test_parallel_pdf_extraction_preserves_order():
+    """Test process-pool PDF extraction returns the same pages in order"""
+    print("🧪 Testing parallel PDF extraction...")
+
+    texts = [f"Section {i + 1} revenue and headcount overview" for i in range(23)]
+    upload = make_upload(build_sample_pdf(texts), "large_profile.pdf")
+
+    sequential = DocumentParser().parse_document(upload)
+    parallel = DocumentParser(pdf_workers=3).parse_document(upload)
+
+    assert len(parallel) == 23, f"❌ Expected 23 pages, got {len(parallel)}"
+    assert parallel == sequential, "❌ Parallel extraction changed page text or order"
+
+    print("✅ Parallel PDF extraction matches sequential output")
+
+
+class _Pipe(io.RawIOBase):
+    """Non-seekable reader, like a socket or pipe"""
+
+    def __init__(self, f):
+        self._f = f
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._f.readinto(b)
+
+
+def test_zero_copy_inputs():
+    """Test paths, memoryviews, mmaps and non-seekable streams all parse"""
+    print("🧪 Testing zero-copy input types...")
+
+    texts = ["Cover Page", "Contact Us"]
+    pdf_bytes = build_sample_pdf(texts)
+    parser = DocumentParser()
+    expected = parser.parse_document(make_upload(pdf_bytes, "profile.pdf"))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "profile.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf_bytes)
+
+        assert parser.parse_document(path) == expected, "❌ File path input failed"
+
+        upload = make_upload(pdf_bytes, "profile.pdf")
+        view = upload.getbuffer()
+        assert parser.parse_document(view, file_name="profile.pdf") == expected, "❌ memoryview input failed"
+        view.release()
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # No file name: the type is sniffed from the PDF header
+            assert parser.parse_document(mapped) == expected, "❌ mmap input failed"
+
+        with open(path, "rb") as f:
+            assert parser.parse_document(_Pipe(f), file_name="profile.pdf") == expected, "❌ Non-seekable input failed"
+
+        with open(path, "rb") as f:
+            # Neither a name nor a seekable stream: the header is sniffed from the copy that is parsed
+            assert parser.parse_document(_Pipe(f)) == expected, "❌ Nameless non-seekable input failed"
+
+    pptx_view = memoryview(build_sample_pptx(["Cover"]))
+    slides = parser.parse_document(pptx_view, file_name="deck.pptx")
+    assert len(slides) == 1 and "Cover" in slides[0], "❌ PPTX memoryview input failed"
+
+    print("✅ All input types parsed without copying")
+
+
+_RSS_PROBE = """
+import io, mmap, resource, sys
+import PyPDF2
+from parsing import DocumentParser
+
+def peak_rss_kb():
+    # ru_maxrss survives exec from a large parent; VmHWM starts fresh
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+path, mode = sys.argv[1], sys.argv[2]
+source = open(path, 'rb')
+before = peak_rss_kb()
+
+if mode == 'legacy':
+    # Previous behaviour: read the whole upload, then wrap it in a new BytesIO
+    file_content = source.read()
+    reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    pages = [page.extract_text() for page in reader.pages]
+elif mode == 'mmap':
+    mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    pages = DocumentParser().parse_document(mapped, file_name='profile.pdf')
+else:
+    pages = DocumentParser().parse_document(source)
+
+after = peak_rss_kb()
+assert len(pages) == 3
+print(after - before)
+"""
+
+
+def _peak_rss_growth_kb(path: str, mode: str) -> int:
+    """Run one parse in a fresh interpreter and return its peak RSS growth"""
+    result = subprocess.run(
+        [sys.executable, "-c", _RSS_PROBE, path, mode],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+def test_peak_rss_large_upload():
+    """Compare peak RSS of read()+BytesIO against in-place parsing"""
+    print("🧪 Testing peak RSS on a large upload...")
+
+    padding_mb = 64
+    pdf_bytes = build_sample_pdf(["Cover", "About", "Contact"], padding_bytes=padding_mb * 1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "profile.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf_bytes)
+        del pdf_bytes
+
+        legacy_kb = _peak_rss_growth_kb(path, "legacy")
+        file_kb = _peak_rss_growth_kb(path, "file")
+        mmap_kb = _peak_rss_growth_kb(path, "mmap")
+
+    print(f"   Peak RSS growth: legacy {legacy_kb / 1024:.1f} MB, "
+          f"file object {file_kb / 1024:.1f} MB, mmap {mmap_kb / 1024:.1f} MB")
+
+    assert legacy_kb > padding_mb * 1024 * 0.9, "❌ Legacy probe did not load the upload"
+    assert file_kb < legacy_kb / 4, "❌ File input still duplicated the upload"
+    assert mmap_kb < legacy_kb / 4, "❌ mmap input still duplicated the upload"
+
+    print("✅ Large uploads are parsed without duplicating them in memory")
+
+
+def test_parse_cache_returns_repeat_uploads():
+    """Test a repeat upload is served from the parse cache"""
+    print("🧪 Testing parse cache...")
+
+    pdf_bytes = build_sample_pdf(["Cover Page", "Our Services", "Contact Us"])
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ParseCache(cache_dir)
+        parser = DocumentParser(cache=cache)
+
+        first = parser.parse_document(make_upload(pdf_bytes, "profile.pdf"))
+        assert cache.get_stats()["entries"] == 1, "❌ Parse was not cached"
+
+        # A repeat upload must not touch the PDF backend at all
+        parser._iter_pdf_pages = lambda uploaded_file: iter(())
+        start = time.perf_counter()
+        second = parser.parse_document(make_upload(pdf_bytes, "renamed.pdf"))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        assert second == first, "❌ Cached pages differ from the original parse"
+        assert cache.hits == 1, f"❌ Expected 1 cache hit, got {cache.hits}"
+
+        assert parser.invalidate_cache(make_upload(pdf_bytes, "profile.pdf")) == 1
+        assert cache.get_stats()["entries"] == 0, "❌ Invalidation left the entry behind"
+
+        # A non-seekable stream is hashed and parsed from one copy
+        del parser._iter_pdf_pages
+        piped = parser.parse_document(_Pipe(io.BytesIO(pdf_bytes)), file_name="profile.pdf")
+        assert piped == first, f"❌ Non-seekable input parsed to {piped!r} with the cache on"
+        assert cache.get_stats()["entries"] == 1
+
+    print(f"✅ Repeat upload served from cache in {elapsed_ms:.1f} ms")
+
+
+def test_parse_cache_lru_eviction():
+    """Test the size cap evicts the least recently used entries"""
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ParseCache(cache_dir, max_bytes=10 ** 9)
+        pages = [os.urandom(2000).hex()]  # Incompressible page text
+        for key in ("a", "b", "c"):
+            cache.put(key, pages)
+            time.sleep(0.01)
+        entry_size = cache.get_stats()["total_bytes"] // 3
+
+        assert cache.get("a") == pages  # "a" becomes most recently used
+        cache.max_bytes = entry_size * 2
+        cache.put("d", pages)
+
+        assert cache.get("b") is None, "❌ Least recently used entry was not evicted"
+        assert cache.get("c") is None, "❌ Cache still exceeds its size cap"
+        assert cache.get("a") == pages and cache.get("d") == pages
+
+    print("✅ Parse cache evicted least recently used entries")
+
+
+def test_prefetch_overlaps_extraction():
+    """Test prefetch_pages keeps extracting while the consumer is busy"""
+    print("🧪 Testing page prefetching...")
+
+    def slow_pages():
+        for i in range(4):
+            time.sleep(0.05)
+            yield f"page {i + 1}"
+
+    start = time.perf_counter()
+    consumed = []
+    for page in prefetch_pages(slow_pages()):
+        time.sleep(0.05)  # Simulate a model call per page
+        consumed.append(page)
+    elapsed = time.perf_counter() - start
+
+    assert consumed == ["page 1", "page 2", "page 3", "page 4"]
+    # Fully sequential would take ~0.4s; overlapped is ~0.25s
+    assert elapsed < 0.35, f"❌ Parsing and analysis did not overlap ({elapsed:.2f}s)"
+
+    print(f"✅ Prefetch overlapped parsing and analysis ({elapsed:.2f}s)")
+
+
+def test_prefetch_propagates_errors():
+    """Test errors raised while parsing surface in the consumer"""
+
+    def failing_pages():
+        yield "page 1"
+        raise ValueError("corrupt page")
+
+    pages = prefetch_pages(failing_pages())
+    assert next(pages) == "page 1"
+    try:
+        next(pages)
+        assert False, "❌ Expected parser error to propagate"
+    except ValueError as e:
+        assert "corrupt page" in str(e)
+
+    print("✅ Prefetch propagated parser errors")
+
+
+if __name__ == "__main__":
+    test_pdf_pages_stream_in_order()
+    test_pptx_pages_stream_in_order()
+    test_parallel_pdf_extraction_preserves_order()
+    test_zero_copy_inputs()
+    test_peak_rss_large_upload()
+    test_parse_cache_returns_repeat_uploads()
+    test_parse_cache_lru_eviction()
+    test_prefetch_overlaps_extraction()
+    test_prefetch_propagates_errors()
+    print("\n🎉 All parsing tests passed!")
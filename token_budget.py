@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Token Budget Module for Master Template System
+Per-page max_tokens sizing calibrated on observed output tokens
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Dict, Any, Iterable, Tuple
+
+from call_metrics import percentile
+
+# The fixed max_tokens page analysis reserved before budgets were sized per page
+DEFAULT_MAX_TOKENS = 4000
+
+
+class OutputBudget:
+    def __init__(self, floor: int = 512, ceiling: int = 8000, headroom: float = 1.25,
+                 calibration_percentile: float = 90, min_samples: int = 5, history: int = 200,
+                 base_tokens: int = 150, text_ratio: float = 1.3, row_tokens: int = 30):
+        """Predict the output tokens a page's structure needs and size max_tokens to fit
+
+        The uncalibrated estimate is base_tokens, plus text_ratio output tokens
+        per token of page text (the text is reproduced in the elements with
+        their metadata), plus row_tokens per table row. Once min_samples
+        completed page calls are observed, the estimate is scaled by the
+        calibration_percentile of observed-to-estimated output tokens over
+        the last history calls. Budgets get headroom on top and are clamped
+        to [floor, ceiling]; a truncated answer escalates towards ceiling.
+        """
+        self.floor = floor
+        self.ceiling = ceiling
+        self.headroom = headroom
+        self.calibration_percentile = calibration_percentile
+        self.min_samples = min_samples
+        self.base_tokens = base_tokens
+        self.text_ratio = text_ratio
+        self.row_tokens = row_tokens
+
+        self.ratios = deque(maxlen=history)
+        self.stats = {'budgets': 0, 'budget_tokens': 0, 'escalations': 0}
+        self._lock = threading.Lock()
+
+    def estimate(self, page_content: str) -> int:
+        """Uncalibrated output tokens for a page's structure"""
+        text_tokens = len(page_content) // 4 + 1
+        table_rows = sum(1 for line in page_content.splitlines() if " | " in line)
+        return int(self.base_tokens + self.text_ratio * text_tokens + self.row_tokens * table_rows)
+
+    def calibration_factor(self) -> float:
+        """Scale from estimated to observed output tokens; 1.0 until enough calls were observed"""
+        with self._lock:
+            ratios = list(self.ratios)
+        if len(ratios) < self.min_samples:
+            return 1.0
+        return percentile(ratios, self.calibration_percentile)
+
+    def budget(self, page_content: str) -> Tuple[int, int]:
+        """max_tokens for a page, and the uncalibrated estimate to record with its call"""
+        estimate = self.estimate(page_content)
+        max_tokens = math.ceil(estimate * self.calibration_factor() * self.headroom)
+        max_tokens = max(self.floor, min(self.ceiling, max_tokens))
+        with self._lock:
+            self.stats['budgets'] += 1
+            self.stats['budget_tokens'] += max_tokens
+        return max_tokens, estimate
+
+    def escalate(self, max_tokens: int) -> int:
+        """The next budget after an answer was cut off at max_tokens"""
+        with self._lock:
+            self.stats['escalations'] += 1
+        return min(self.ceiling, max(self.floor, max_tokens * 2))
+
+    def observe(self, call: Dict[str, Any]):
+        """Learn from a call record carrying output_estimate; truncated, failed and cached calls are skipped"""
+        estimate = call.get('output_estimate')
+        if not estimate or not call.get('output_tokens') or call.get('cached') or call.get('error'):
+            return
+        if call.get('stop_reason') == 'max_tokens':
+            return
+        with self._lock:
+            self.ratios.append(call['output_tokens'] / estimate)
+
+    def calibrate(self, calls: Iterable[Dict[str, Any]]):
+        """Learn from the output-token history of earlier call records (e.g. CallMetrics.get_calls())"""
+        for call in calls:
+            self.observe(call)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Budgets issued, their average, escalations, and tokens no longer reserved versus DEFAULT_MAX_TOKENS"""
+        with self._lock:
+            stats = dict(self.stats)
+            samples = len(self.ratios)
+        budgets = stats['budgets']
+        return {
+            'budgets': budgets,
+            'avg_max_tokens': round(stats['budget_tokens'] / budgets, 1) if budgets else None,
+            'escalations': stats['escalations'],
+            'samples': samples,
+            'calibration_factor': round(self.calibration_factor(), 3),
+            'reserved_tokens_saved': budgets * DEFAULT_MAX_TOKENS - stats['budget_tokens']
+        }